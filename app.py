@@ -1,81 +1,138 @@
 import json
+import os
+import resource
+import time
 from bson import ObjectId
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, request, jsonify, send_file
 from flask_cors import CORS
-from pymongo import MongoClient
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
-import os
-from dotenv import load_dotenv
+from firebase_admin import firestore, auth
+from werkzeug.local import LocalProxy
 from werkzeug.utils import secure_filename
 import csv
 from datetime import datetime, timezone
 
-# Import repositories
-from repositories.user_repository import UserRepository
-from repositories.diary_repository import DiaryRepository
-from repositories.activity_repository import ActivityRepository
-from repositories.log_repository import LogRepository
-from repositories.module_repository import ModuleRepository
-from repositories.category_repository import CategoryRepository
-from repositories.questionnaire_repository import QuestionnaireRepository
-from repositories.question_repository import QuestionRepository
-
-# Import services
-from services.user_service import UserService
-from services.auth_service import AuthService
-from services.activity_service import ActivityService
-from services.log_service import LogService
-from services.module_service import ModuleService
-from services.questionnaire_service import QuestionnaireService
-from services.question_service import QuestionService
-
-app = Flask(__name__)
-CORS(app, origins=["https://yourusername.pythonanywhere.com", "http://localhost:*"])
-
-# Load environment variables
-load_dotenv()
-mongo_uri = os.getenv("MONGO_URI")
-if not mongo_uri:
-    raise ValueError("MONGO_URI not set in environment variables")
-
-# Firebase setup
-firebase_cred_json = os.getenv("FIREBASE_CRED_JSON")
-if not firebase_cred_json:
-    raise ValueError("FIREBASE_CRED_JSON environment variable is not set")
-try:
-    firebase_cred_dict = json.loads(firebase_cred_json)
-except json.JSONDecodeError as e:
-    raise ValueError(f"Invalid FIREBASE_CRED_JSON format: {str(e)}")
-cred = credentials.Certificate(firebase_cred_dict)
-firebase_admin.initialize_app(cred)
-firestore_db = firestore.client()
-
-# Initialize MongoDB
-client = MongoClient(mongo_uri)
-mongo_db = client["dev_mobile"]
-
-# Initialize repositories
-user_repository = UserRepository(mongo_db, firestore_db)
-diary_repository = DiaryRepository(mongo_db)
-activity_repository = ActivityRepository(mongo_db)
-log_repository = LogRepository(mongo_db)
-module_repository = ModuleRepository(mongo_db)
-category_repository = CategoryRepository(mongo_db)
-questionnaire_repository = QuestionnaireRepository(mongo_db)
-question_repository = QuestionRepository(mongo_db)
-
-# Initialize services
-log_service = LogService(log_repository)
-user_service = UserService(user_repository, log_service)
-auth_service = AuthService()
-activity_service = ActivityService(user_repository, diary_repository, activity_repository, category_repository, log_service)
-module_service = ModuleService(module_repository)
-questionnaire_service = QuestionnaireService(user_repository, questionnaire_repository, question_repository, log_service)
-question_service = QuestionService(question_repository, log_service)
+from config import Config
+from container import ServiceContainer
+from json_provider import OrjsonProvider
+from services.provisioning_service import parse_roster
+from services.activity_ingest_service import QUEUED
+from http_cache import init_http_caching
+from rate_limit import init_rate_limiting
+from profiling import init_profiling
+from circuit_breaker import init_circuit_breakers
+from unit_of_work import init_unit_of_work
+
+api = Blueprint("api", __name__)
+
+
+def _from_container(name):
+    return LocalProxy(lambda: getattr(current_app.extensions["container"], name))
+
+
+# Repositories and services are resolved per process from the app's container
+firestore_db = _from_container("firestore_db")
+user_repository = _from_container("user_repository")
+activity_repository = _from_container("activity_repository")
+questionnaire_repository = _from_container("questionnaire_repository")
+question_repository = _from_container("question_repository")
+log_service = _from_container("log_service")
+user_service = _from_container("user_service")
+provisioning_service = _from_container("provisioning_service")
+deletion_service = _from_container("deletion_service")
+score_service = _from_container("score_service")
+auth_service = _from_container("auth_service")
+activity_service = _from_container("activity_service")
+activity_ingest_service = _from_container("activity_ingest_service")
+module_service = _from_container("module_service")
+questionnaire_service = _from_container("questionnaire_service")
+question_service = _from_container("question_service")
+sync_service = _from_container("sync_service")
+heatmap_service = _from_container("heatmap_service")
+search_service = _from_container("search_service")
+
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    app.config.from_object(Config)
+    if config is None:
+        config = Config.from_env()
+    if isinstance(config, dict):
+        app.config.update(config)
+    else:
+        app.config.from_object(config)
+
+    CORS(app, origins=app.config["CORS_ORIGINS"])
+    app.extensions["container"] = ServiceContainer(app.config)
+    app.extensions["created_at"] = time.monotonic()
+    app.register_blueprint(api)
+    # Registered first so a profile also covers the rate limiter and response compression
+    init_profiling(app)
+    init_rate_limiting(app)
+    init_http_caching(app)
+    init_circuit_breakers(app)
+    init_unit_of_work(app)
+    return app
+
+
+def _rss_kb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return None
+
+# ✅ Readiness : ouvre les connexions du worker et préchauffe les caches
+@api.route('/ready', methods=['GET'])
+def ready():
+    container = current_app.extensions["container"]
+    try:
+        timings = container.warm_up()
+    except Exception as e:
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    # Cold start: from create_app() to the first successful warm-up in this process
+    if "cold_start_ms" not in current_app.extensions:
+        current_app.extensions["cold_start_ms"] = round(
+            (time.monotonic() - current_app.extensions["created_at"]) * 1000, 1)
+    return jsonify({
+        "status": "ready",
+        "pid": os.getpid(),
+        "cold_start_ms": current_app.extensions["cold_start_ms"],
+        "warm_up": timings,
+        "rss_kb": _rss_kb(),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }), 200
+
+# 📈 Métriques du worker (format Prometheus)
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    body = current_app.extensions["container"].metrics.render()
+    return current_app.response_class(body, mimetype="text/plain; version=0.0.4")
+
+# 🔬 Profils de requêtes capturés par ce worker (en-tête X-Profile-Token requis)
+@api.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    profiler = current_app.extensions["container"].profiler
+    if not profiler.is_admin(request.headers):
+        return jsonify({"message": "Accès refusé"}), 403
+    try:
+        limit = int(request.args.get("limit", 50))
+    except ValueError:
+        return jsonify({"message": "limit invalide"}), 400
+    return jsonify(profiler.list_captures(limit)), 200
+
+@api.route('/admin/profiles/<capture_id>', methods=['GET'])
+def get_profile(capture_id):
+    profiler = current_app.extensions["container"].profiler
+    if not profiler.is_admin(request.headers):
+        return jsonify({"message": "Accès refusé"}), 403
+    path = profiler.capture_path(capture_id, request.args.get("format", "speedscope"))
+    if path is None or not os.path.exists(path):
+        return jsonify({"message": "Profil non trouvé"}), 404
+    return send_file(os.path.abspath(path), as_attachment=True)
 
 # 🔐 Route de connexion (manual login with Firestore)
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
     username = data.get("username")
@@ -87,7 +144,7 @@ def login():
     return jsonify(response_data), status
 
 # 🔐 Route de connexion Google
-@app.route('/google-login', methods=['POST'])
+@api.route('/google-login', methods=['POST'])
 def google_login():
     data = request.get_json()
     id_token = data.get("id_token")
@@ -104,14 +161,14 @@ def google_login():
         log_service.log_event("google_login_fail", f"Invalid token: {str(e)}", email)
         return jsonify({"message": "Invalid token", "error": str(e)}), 401
 
-@app.route('/update_user_info', methods=['POST'])
+@api.route('/update_user_info', methods=['POST'])
 def update_user_info():
     data = request.get_json()
     email = data.get("email")
     response, status = user_service.update_user_info(email, data)
     return jsonify(response), status
 
-@app.route('/change_password', methods=['POST'])
+@api.route('/change_password', methods=['POST'])
 def change_password():
     data = request.get_json()
     username = data.get("username")
@@ -126,7 +183,7 @@ def change_password():
     response, status = user_service.change_password(username, current_password, new_password)
     return jsonify(response), status
 
-@app.route('/forgot_password', methods=['POST'])
+@api.route('/forgot_password', methods=['POST'])
 def forgot_password():
     data = request.get_json()
     username = data.get("username")
@@ -134,7 +191,7 @@ def forgot_password():
     return jsonify(response), status
 
 # ➕ Ajouter un utilisateur
-@app.route('/add_user', methods=['POST'])
+@api.route('/add_user', methods=['POST'])
 def add_user():
     data = request.get_json()
     print(data)
@@ -189,28 +246,60 @@ def add_user():
         log_service.log_event("add_user_fail", f"Erreur serveur: {str(e)}", pseudonym)
         return jsonify({"message": "Erreur serveur", "error": str(e)}), 500
 
+# 👥 Import d'une promotion (CSV ou JSON) ; ?dry_run=true valide sans rien écrire
+@api.route('/bulk_add_users', methods=['POST'])
+def bulk_add_users():
+    try:
+        if 'file' in request.files:
+            file = request.files['file']
+            rows = parse_roster(file.read(), secure_filename(file.filename))
+        else:
+            data = request.get_json(silent=True) or {}
+            rows = data.get("users", []) if isinstance(data, dict) else data
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"message": "Fichier invalide", "error": str(e)}), 400
+
+    dry_run = request.args.get("dry_run", "false").lower() == "true"
+    response, status = provisioning_service.provision(rows, dry_run=dry_run)
+    return jsonify(response), status
+
 # 🗑️ Supprimer un utilisateur
-@app.route('/delete_user/<username>', methods=['DELETE'])
+@api.route('/delete_user/<username>', methods=['DELETE'])
 def delete_user(username):
-    response, status = user_service.delete_user(username)
+    response, status = deletion_service.delete_user(username)
     return jsonify(response), status
 
 # 🕒 Enregistrement d'une activité
-@app.route('/log_activity', methods=['POST'])
+@api.route('/log_activity', methods=['POST'])
 def log_activity():
     data = request.get_json()
-    response, status = activity_service.log_activity(data)
+    if current_app.config["ACTIVITY_INGEST_MODE"] == QUEUED:
+        response, status = activity_ingest_service.enqueue(data, request.headers.get("Idempotency-Key"))
+    else:
+        response, status = activity_service.log_activity(data)
+    return jsonify(response), status
+
+# 📅 Activités d'un étudiant sur une période, paginées
+@api.route('/activities', methods=['GET'])
+def get_activities():
+    response, status = activity_service.get_activities(request.args)
+    return jsonify(response), status
+
+# 🗓️ Heatmap jour x heure des minutes d'activité (étudiant ou promotion)
+@api.route('/heatmap', methods=['GET'])
+def get_heatmap():
+    response, status = heatmap_service.get_heatmap(request.args)
     return jsonify(response), status
 
 # 📚 Récupérer les modules
-@app.route('/modules', methods=['POST'])
+@api.route('/modules', methods=['POST'])
 def get_modules():
     data = request.get_json()
     response, status = module_service.get_modules(data)
     return jsonify(response), status
 
 # 👥 Voir tous les utilisateurs (Firestore)
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
 def get_users():
     try:
         users = user_repository.get_all_users()
@@ -220,30 +309,36 @@ def get_users():
         return jsonify({"message": "Erreur serveur", "details": str(e)}), 500
 
 # 📊 Admin : voir les étudiants et leurs activités
-@app.route('/admin/etudiants_activites', methods=['GET'])
+@api.route('/admin/etudiants_activites', methods=['GET'])
 def get_students_with_activities():
     response, status = user_service.get_students_with_activities(activity_repository)
     return jsonify(response), status
 
 # 🧾 Voir toutes les entrées du journal
-@app.route('/logs', methods=['GET'])
+@api.route('/logs', methods=['GET'])
 def get_logs():
     response, status = log_service.get_logs()
     return jsonify(response), status
 
-@app.route('/create_questionnaire', methods=['POST'])
+# 🔎 Recherche admin (?q=...&type=questionnaires|questions|logs, &event_type=..., &match=prefix|text, &page=...)
+@api.route('/search', methods=['GET'])
+def search():
+    response, status = search_service.search(request.args)
+    return jsonify(response), status
+
+@api.route('/create_questionnaire', methods=['POST'])
 def create_questionnaire():
     data = request.get_json()
     response, status = questionnaire_service.create_questionnaire(data)
     return jsonify(response), status
 
-@app.route('/update_questionnaire/<questionnaire_id>', methods=['PUT'])
+@api.route('/update_questionnaire/<questionnaire_id>', methods=['PUT'])
 def update_questionnaire(questionnaire_id):
     data = request.get_json()
     response, status = questionnaire_service.update_questionnaire(questionnaire_id, data)
     return jsonify(response), status
 
-@app.route('/toggle_questionnaire_status/<questionnaire_id>', methods=['PUT'])
+@api.route('/toggle_questionnaire_status/<questionnaire_id>', methods=['PUT'])
 def toggle_questionnaire_status(questionnaire_id):
     data = request.get_json()
     is_active = data.get("is_active", True)
@@ -251,25 +346,25 @@ def toggle_questionnaire_status(questionnaire_id):
     response, status = questionnaire_service.toggle_questionnaire_status(questionnaire_id, is_active)
     return jsonify(response), status
 
-@app.route('/duplicate_questionnaire/<questionnaire_id>', methods=['POST'])
+@api.route('/duplicate_questionnaire/<questionnaire_id>', methods=['POST'])
 def duplicate_questionnaire(questionnaire_id):
     data = request.get_json()
     response, status = questionnaire_service.duplicate_questionnaire(questionnaire_id, data)
     return jsonify(response), status
 
-@app.route('/add_question', methods=['POST'])
+@api.route('/add_question', methods=['POST'])
 def add_question():
     data = request.get_json()
     response, status = question_service.add_question(data)
     return jsonify(response), status
 
-@app.route('/questionnaires', methods=['POST'])
+@api.route('/questionnaires', methods=['POST'])
 def get_questionnaires():
     data = request.get_json()
     response, status = questionnaire_service.get_questionnaires(data)
     return jsonify(response), status
 
-@app.route('/answered_questionnaires', methods=['POST'])
+@api.route('/answered_questionnaires', methods=['POST'])
 def get_answered_questionnaires():
     data = request.get_json()
     user_id = data.get("mongo_user_id")
@@ -284,38 +379,64 @@ def get_answered_questionnaires():
         print(f"ERROR: Exception in get_answered_questionnaires: {str(e)}")
         return jsonify({"message": "Erreur serveur", "error": str(e)}), 500
 
-@app.route('/questionnaire/<questionnaire_id>', methods=['GET'])
+@api.route('/questionnaire/<questionnaire_id>', methods=['GET'])
 def get_questionnaire(questionnaire_id):
     response, status = questionnaire_service.get_questionnaire(questionnaire_id)
     return jsonify(response), status
 
-@app.route('/submit_questionnaire_response', methods=['POST'])
+@api.route('/submit_questionnaire_response', methods=['POST'])
 def submit_questionnaire_response():
     data = request.get_json()
     response, status = questionnaire_service.submit_questionnaire_response(data)
     return jsonify(response), status
 
-@app.route('/user_responses/<user_id>/<questionnaire_id>', methods=['GET'])
+# 🏆 Classement par filière ou par année (?filiere=... ou ?year=..., &limit=10, &mongo_user_id=... pour son rang)
+@api.route('/leaderboard', methods=['GET'])
+def get_leaderboard():
+    response, status = score_service.get_leaderboard(request.args)
+    return jsonify(response), status
+
+# 🎯 Scores d'un étudiant (total, par catégorie et par questionnaire)
+@api.route('/scores/<user_id>', methods=['GET'])
+def get_user_scores(user_id):
+    response, status = score_service.get_user_scores(user_id)
+    return jsonify(response), status
+
+# 🔄 Synchronisation incrémentale pour l'application mobile
+@api.route('/sync', methods=['POST'])
+def sync():
+    data = request.get_json()
+    response, status = sync_service.sync(data)
+    return jsonify(response), status
+
+@api.route('/user_responses/<user_id>/<questionnaire_id>', methods=['GET'])
 def get_user_responses(user_id, questionnaire_id):
     response, status = questionnaire_service.get_user_responses(user_id, questionnaire_id)
     return jsonify(response), status
 
 # 🗑️ Supprimer un questionnaire et ses données associées
-@app.route('/delete_questionnaire/<questionnaire_id>', methods=['DELETE'])
+@api.route('/delete_questionnaire/<questionnaire_id>', methods=['DELETE'])
 def delete_questionnaire(questionnaire_id):
     try:
-        if questionnaire_repository.delete_questionnaire(questionnaire_id):
-            log_service.log_event("delete_questionnaire", f"Questionnaire supprimé: {questionnaire_id}")
-            return jsonify({"message": "Questionnaire supprimé avec succès"}), 200
-        else:
-            log_service.log_event("delete_questionnaire_fail", f"Questionnaire non trouvé: {questionnaire_id}")
-            return jsonify({"message": "Questionnaire non trouvé"}), 404
+        response, status = deletion_service.delete_questionnaire(questionnaire_id)
+        return jsonify(response), status
     except Exception as e:
         log_service.log_event("delete_questionnaire_error", f"Erreur lors de la suppression du questionnaire {questionnaire_id}: {str(e)}")
         return jsonify({"message": "Erreur lors de la suppression du questionnaire", "error": str(e)}), 500
 
+# 🧹 Suivi des suppressions en cascade
+@api.route('/deletion_jobs', methods=['GET'])
+def get_deletion_jobs():
+    response, status = deletion_service.get_jobs(request.args.get("status"))
+    return jsonify(response), status
+
+@api.route('/deletion_jobs/<job_id>', methods=['GET'])
+def get_deletion_job(job_id):
+    response, status = deletion_service.get_job(job_id)
+    return jsonify(response), status
+
 # 📥 Route d'importation CSV
-@app.route('/upload_csv', methods=['POST'])
+@api.route('/upload_csv', methods=['POST'])
 def upload_csv():
     if 'file' not in request.files:
         return jsonify({"message": "Fichier manquant"}), 400
@@ -437,4 +558,4 @@ def upload_csv():
 
 # 🚀 Lancer l'app
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True)
+    create_app().run(host='0.0.0.0', debug=True)
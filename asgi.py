@@ -0,0 +1,194 @@
+import json
+import firebase_admin
+from firebase_admin import credentials, firestore_async
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.routing import Route
+
+from config import Config, analytics_read_preference, mongo_client_options
+from json_provider import dumps_bytes
+
+# Import repositories
+from repositories.async_user_repository import AsyncUserRepository
+from repositories.async_diary_repository import AsyncDiaryRepository
+from repositories.async_activity_repository import AsyncActivityRepository
+from repositories.async_log_repository import AsyncLogRepository
+from repositories.async_module_repository import AsyncModuleRepository
+from repositories.async_category_repository import AsyncCategoryRepository
+from repositories.async_questionnaire_repository import AsyncQuestionnaireRepository
+from repositories.async_question_repository import AsyncQuestionRepository
+from repositories.async_score_repository import AsyncScoreRepository
+
+# Import services
+from services.async_user_service import AsyncUserService
+from services.async_activity_service import AsyncActivityService
+from services.async_log_service import AsyncLogService
+from services.log_policy import LogPolicy
+from services.log_service import create_event_file_logger
+from services.async_module_service import AsyncModuleService
+from services.async_questionnaire_service import AsyncQuestionnaireService
+from services.async_score_service import AsyncScoreService
+
+# Load environment variables
+config = Config.from_env().to_dict()
+if not config["MONGO_URI"]:
+    raise ValueError("MONGO_URI not set in environment variables")
+# The async repositories only read the full document layout
+if config["DOCUMENT_ENCODING"] != "full":
+    raise ValueError("DOCUMENT_ENCODING must be 'full' for the ASGI app")
+# The write-behind queue and its drainer thread only exist in the Flask app
+if config["ACTIVITY_INGEST_MODE"] != "sync":
+    raise ValueError("ACTIVITY_INGEST_MODE must be 'sync' for the ASGI app")
+
+# Firebase setup
+firebase_cred_json = config["FIREBASE_CRED_JSON"]
+if not firebase_cred_json:
+    raise ValueError("FIREBASE_CRED_JSON environment variable is not set")
+try:
+    firebase_cred_dict = json.loads(firebase_cred_json)
+except json.JSONDecodeError as e:
+    raise ValueError(f"Invalid FIREBASE_CRED_JSON format: {str(e)}")
+cred = credentials.Certificate(firebase_cred_dict)
+firebase_admin.initialize_app(cred)
+firestore_db = firestore_async.client()
+
+# Initialize MongoDB (Motor binds to the running event loop on first use)
+client = AsyncIOMotorClient(config["MONGO_URI"], **mongo_client_options(config))
+mongo_db = client[config["MONGO_DB_NAME"]]
+
+# Initialize repositories
+user_repository = AsyncUserRepository(
+    mongo_db, firestore_db, analytics_read_preference=analytics_read_preference(config, "user_repository"))
+diary_repository = AsyncDiaryRepository(mongo_db)
+activity_repository = AsyncActivityRepository(mongo_db, storage_mode=config["ACTIVITY_STORAGE_MODE"])
+log_repository = AsyncLogRepository(
+    mongo_db, analytics_read_preference=analytics_read_preference(config, "log_repository"))
+module_repository = AsyncModuleRepository(mongo_db)
+category_repository = AsyncCategoryRepository(mongo_db)
+questionnaire_repository = AsyncQuestionnaireRepository(mongo_db)
+question_repository = AsyncQuestionRepository(mongo_db)
+score_repository = AsyncScoreRepository(mongo_db)
+
+# Initialize services
+log_service = AsyncLogService(
+    log_repository, LogPolicy.from_config(config),
+    create_event_file_logger(config["LOG_FILE_PATH"], config["LOG_FILE_MAX_BYTES"], config["LOG_FILE_BACKUP_COUNT"])
+)
+user_service = AsyncUserService(user_repository, log_service)
+activity_service = AsyncActivityService(user_repository, diary_repository, activity_repository, category_repository, log_service,
+                                        overlap_policy=config["ACTIVITY_OVERLAP_POLICY"])
+module_service = AsyncModuleService(module_repository)
+score_service = AsyncScoreService(score_repository, user_repository, None, log_service)
+questionnaire_service = AsyncQuestionnaireService(user_repository, questionnaire_repository, question_repository, log_service,
+                                                  score_service=score_service)
+
+
+class JSONResponse(StarletteJSONResponse):
+    def render(self, content):
+        return dumps_bytes(content)
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+# 🔐 Route de connexion (manual login with Firestore)
+async def login(request):
+    data = await _json_body(request)
+    response_data, error, status = await user_service.login(data.get("username"), data.get("password"))
+    if error:
+        return JSONResponse(error, status_code=status)
+    return JSONResponse(response_data, status_code=status)
+
+# 🕒 Enregistrement d'une activité
+async def log_activity(request):
+    data = await _json_body(request)
+    response, status = await activity_service.log_activity(data)
+    return JSONResponse(response, status_code=status)
+
+# 📅 Activités d'un étudiant sur une période, paginées
+async def get_activities(request):
+    response, status = await activity_service.get_activities(request.query_params)
+    return JSONResponse(response, status_code=status)
+
+# 📚 Récupérer les modules
+async def get_modules(request):
+    data = await _json_body(request)
+    response, status = await module_service.get_modules(data)
+    return JSONResponse(response, status_code=status)
+
+# 👥 Voir tous les utilisateurs (Firestore)
+async def get_users(request):
+    try:
+        users = await user_repository.get_all_users()
+        return JSONResponse(users, status_code=200)
+    except Exception as e:
+        await log_service.log_event("error", f"Erreur serveur /users: {e}")
+        return JSONResponse({"message": "Erreur serveur", "details": str(e)}, status_code=500)
+
+# 🧾 Voir toutes les entrées du journal
+async def get_logs(request):
+    response, status = await log_service.get_logs()
+    return JSONResponse(response, status_code=status)
+
+async def get_questionnaires(request):
+    data = await _json_body(request)
+    response, status = await questionnaire_service.get_questionnaires(data)
+    return JSONResponse(response, status_code=status)
+
+async def get_answered_questionnaires(request):
+    data = await _json_body(request)
+    user_id = data.get("mongo_user_id")
+
+    if not user_id:
+        return JSONResponse({"message": "mongo_user_id manquant"}, status_code=400)
+
+    response, status = await questionnaire_service.get_user_answered_questionnaires(user_id)
+    return JSONResponse(response, status_code=status)
+
+async def get_questionnaire(request):
+    response, status = await questionnaire_service.get_questionnaire(request.path_params["questionnaire_id"])
+    return JSONResponse(response, status_code=status)
+
+async def submit_questionnaire_response(request):
+    data = await _json_body(request)
+    response, status = await questionnaire_service.submit_questionnaire_response(data)
+    return JSONResponse(response, status_code=status)
+
+async def get_user_responses(request):
+    response, status = await questionnaire_service.get_user_responses(
+        request.path_params["user_id"], request.path_params["questionnaire_id"]
+    )
+    return JSONResponse(response, status_code=status)
+
+
+routes = [
+    Route('/login', login, methods=['POST']),
+    Route('/log_activity', log_activity, methods=['POST']),
+    Route('/activities', get_activities, methods=['GET']),
+    Route('/modules', get_modules, methods=['POST']),
+    Route('/users', get_users, methods=['GET']),
+    Route('/logs', get_logs, methods=['GET']),
+    Route('/questionnaires', get_questionnaires, methods=['POST']),
+    Route('/answered_questionnaires', get_answered_questionnaires, methods=['POST']),
+    Route('/questionnaire/{questionnaire_id}', get_questionnaire, methods=['GET']),
+    Route('/submit_questionnaire_response', submit_questionnaire_response, methods=['POST']),
+    Route('/user_responses/{user_id}/{questionnaire_id}', get_user_responses, methods=['GET']),
+]
+
+middleware = [
+    Middleware(CORSMiddleware, allow_origin_regex=r"https://yourusername\.pythonanywhere\.com|http://localhost(:\d+)?",
+               allow_methods=["*"], allow_headers=["*"]),
+    Middleware(GZipMiddleware, minimum_size=config["HTTP_COMPRESSION_MIN_BYTES"],
+               compresslevel=config["HTTP_GZIP_LEVEL"]),
+]
+
+app = Starlette(routes=routes, middleware=middleware)
+
+# 🚀 Lancer l'app : uvicorn asgi:app --host 0.0.0.0 --port 8000
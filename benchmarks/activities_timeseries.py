@@ -0,0 +1,89 @@
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from config import Config
+from container import ServiceContainer
+from repositories.activity_repository import ACTIVITY_SUMMARY_PROJECTION, TIMESERIES_OPTIONS, to_timeseries_doc
+
+ACTIVITY_NAMES = ["Révision", "Cours", "TD", "TP", "Projet", "Lecture", "Sport", "Pause"]
+
+
+def generate_activities(users, per_user, categories):
+    origin = datetime(2024, 9, 1)
+    for user_id in users:
+        start = origin
+        for _ in range(per_user):
+            start += timedelta(minutes=random.randint(30, 600))
+            duration = random.randint(10, 180) * 60
+            yield {
+                "user_id": user_id,
+                "diary_id": ObjectId(),
+                "activity": random.choice(ACTIVITY_NAMES),
+                "start_time": start,
+                "end_time": start + timedelta(seconds=duration),
+                "duration_seconds": duration,
+                "category_id": random.choice(categories),
+            }
+
+
+def storage_stats(db, name):
+    stats = db.command("collStats", name)
+    return {
+        "count": stats.get("count"),
+        "storage_kb": stats.get("storageSize", 0) // 1024,
+        "index_kb": stats.get("totalIndexSize", 0) // 1024,
+    }
+
+
+def time_range_queries(collection, user_field, users, queries):
+    timings = []
+    for _ in range(queries):
+        user_id = random.choice(users)
+        week_start = datetime(2024, 9, 1) + timedelta(days=7 * random.randint(0, 40))
+        started = time.perf_counter()
+        list(collection.find(
+            {user_field: user_id, "start_time": {"$gte": week_start, "$lt": week_start + timedelta(days=7)}},
+            ACTIVITY_SUMMARY_PROJECTION
+        ))
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {"p50_ms": round(statistics.median(timings), 2), "p95_ms": round(timings[int(len(timings) * 0.95)], 2)}
+
+
+# Usage: python -m benchmarks.activities_timeseries --users 500 --per-user 400
+# Writes into a scratch database (--db) which is dropped afterwards.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare classic vs time-series activity storage")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--per-user", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--db", default="activity_bench")
+    args = parser.parse_args()
+
+    container = ServiceContainer(Config.from_env().to_dict())
+    db = container.mongo_client[args.db]
+    db.drop_collection("classic")
+    db.drop_collection("timeseries")
+    db.create_collection("timeseries", timeseries=TIMESERIES_OPTIONS)
+    db["classic"].create_index([("user_id", 1), ("start_time", 1)])
+    db["timeseries"].create_index([("meta.user_id", 1), ("start_time", 1)])
+
+    users = [ObjectId() for _ in range(args.users)]
+    categories = [ObjectId() for _ in range(6)]
+    activities = list(generate_activities(users, args.per_user, categories))
+    for offset in range(0, len(activities), 5000):
+        chunk = activities[offset:offset + 5000]
+        db["classic"].insert_many([dict(a) for a in chunk])
+        db["timeseries"].insert_many([to_timeseries_doc(a) for a in chunk])
+
+    print("documents:", len(activities))
+    print("classic    ", storage_stats(db, "classic"),
+          time_range_queries(db["classic"], "user_id", users, args.queries))
+    print("timeseries ", storage_stats(db, "timeseries"),
+          time_range_queries(db["timeseries"], "meta.user_id", users, args.queries))
+    container.mongo_client.drop_database(args.db)
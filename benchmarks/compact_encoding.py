@@ -0,0 +1,120 @@
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import bson
+from bson import ObjectId
+
+from benchmarks.activities_timeseries import generate_activities
+from config import Config
+from container import ServiceContainer
+from models.compact import COMPACT, FULL
+from repositories.activity_repository import ActivityRepository
+from repositories.dictionary_repository import DictionaryRepository
+from repositories.questionnaire_repository import COMPACT_RESPONSE_SCHEMA, QuestionnaireRepository
+
+PAGE_SIZE = 50
+CACHE_BYTES = 256 * 1024 * 1024
+
+
+def generate_responses(users, per_user, questions_per_response):
+    origin = datetime(2024, 9, 1)
+    for user_id in users:
+        for index in range(per_user):
+            yield {
+                "questionnaire_id": ObjectId(),
+                "user_id": user_id,
+                "responses": [{
+                    "question_id": ObjectId(),
+                    "selected_proposition_id": ObjectId() if random.random() < 0.8 else None,
+                    "answer_text": None if random.random() < 0.8 else "Réponse libre",
+                    "is_correct": random.random() < 0.6,
+                } for _ in range(questions_per_response)],
+                "duration_seconds": random.randint(60, 1800),
+                "feedback": "",
+                "completed_at": origin + timedelta(days=index, seconds=random.randint(0, 86399)),
+            }
+
+
+def storage_stats(db, name):
+    stats = db.command("collStats", name)
+    return {
+        "avg_obj_bytes": stats.get("avgObjSize"),
+        "size_kb": stats.get("size", 0) // 1024,
+        "storage_kb": stats.get("storageSize", 0) // 1024,
+        "index_kb": stats.get("totalIndexSize", 0) // 1024,
+    }
+
+
+# Working set: how many documents a WiredTiger cache of CACHE_BYTES holds uncompressed
+def working_set(docs):
+    average = sum(len(bson.encode(doc)) for doc in docs) / len(docs)
+    return {"avg_bson_bytes": round(average, 1), "page_bytes": round(average * PAGE_SIZE),
+            "docs_per_cache": int(CACHE_BYTES // average)}
+
+
+def page_reads(repository, users, queries):
+    timings = []
+    for _ in range(queries):
+        week_start = datetime(2024, 9, 1) + timedelta(days=7 * random.randint(0, 40))
+        started = time.perf_counter()
+        repository.get_activities_page(random.choice(users), week_start, week_start + timedelta(days=7),
+                                       limit=PAGE_SIZE)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {"p50_ms": round(statistics.median(timings), 2), "p95_ms": round(timings[int(len(timings) * 0.95)], 2)}
+
+
+def load(db, encoding, activities, responses):
+    dictionary_repository = DictionaryRepository(db)
+    dictionary_repository.ensure_indexes()
+    activity_repository = ActivityRepository(db, encoding=encoding, dictionary_repository=dictionary_repository)
+    activity_repository.ensure_indexes()
+    questionnaire_repository = QuestionnaireRepository(db, response_encoding=encoding)
+    questionnaire_repository.ensure_indexes()
+
+    if encoding == FULL:
+        stored_activities, stored_responses = [dict(a) for a in activities], [dict(r) for r in responses]
+    else:
+        stored_activities = [activity_repository.compact_schema.encode_document(a) for a in activities]
+        stored_responses = [COMPACT_RESPONSE_SCHEMA.encode_document(r) for r in responses]
+    for offset in range(0, len(stored_activities), 5000):
+        db["activities"].insert_many(stored_activities[offset:offset + 5000])
+    for offset in range(0, len(stored_responses), 5000):
+        db["questionnaire_responses"].insert_many(stored_responses[offset:offset + 5000])
+    return activity_repository, stored_activities, stored_responses
+
+
+# Usage: python -m benchmarks.compact_encoding --users 500 --per-user 400
+# Writes each layout into its own scratch database (--db, --db_compact), dropped afterwards.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare full vs compact activity and response documents")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--per-user", type=int, default=500)
+    parser.add_argument("--responses-per-user", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--db", default="compact_bench")
+    args = parser.parse_args()
+
+    container = ServiceContainer(Config.from_env().to_dict())
+    users = [ObjectId() for _ in range(args.users)]
+    categories = [ObjectId() for _ in range(6)] + [None]
+    activities = [dict(a, _id=ObjectId()) for a in generate_activities(users, args.per_user, categories)]
+    responses = [dict(r, _id=ObjectId())
+                 for r in generate_responses(users, args.responses_per_user, args.questions)]
+    print("activities:", len(activities), "responses:", len(responses))
+
+    for encoding, db_name in ((FULL, args.db), (COMPACT, f"{args.db}_compact")):
+        container.mongo_client.drop_database(db_name)
+        db = container.mongo_client[db_name]
+        started = time.perf_counter()
+        repository, stored_activities, stored_responses = load(db, encoding, activities, responses)
+        load_seconds = round(time.perf_counter() - started, 1)
+        print(f"{encoding:8}", "load_s", load_seconds)
+        print("  activities", working_set(stored_activities), storage_stats(db, "activities"),
+              page_reads(repository, users, args.queries))
+        print("  responses ", working_set(stored_responses), storage_stats(db, "questionnaire_responses"))
+        container.mongo_client.drop_database(db_name)
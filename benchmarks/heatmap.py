@@ -0,0 +1,67 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from services.heatmap_service import heatmap_minutes, local_offsets
+
+
+def generate_rows(count, categories, origin=datetime(2024, 1, 1)):
+    rows = []
+    for _ in range(count):
+        start = origin + timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+        rows.append((start, start + timedelta(minutes=random.randint(5, 300)), random.randrange(categories)))
+    return rows
+
+
+# Per-activity loop: convert each interval to local time and walk it hour by hour
+def python_heatmap(rows, tz, categories):
+    grid = [[[0.0] * 24 for _ in range(7)] for _ in range(categories)]
+    for start, end, category in rows:
+        offset = start.replace(tzinfo=timezone.utc).astimezone(tz).utcoffset()
+        cursor, local_end = start + offset, end + offset
+        while cursor < local_end:
+            next_hour = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            piece_end = min(next_hour, local_end)
+            grid[category][cursor.weekday()][cursor.hour] += (piece_end - cursor).total_seconds() / 60
+            cursor = piece_end
+    return np.array(grid)
+
+
+def numpy_heatmap(rows, tz, categories):
+    starts = np.array([row[0] for row in rows], dtype="datetime64[s]").astype(np.int64)
+    ends = np.array([row[1] for row in rows], dtype="datetime64[s]").astype(np.int64)
+    category_index = np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows))
+    offsets = local_offsets(starts, tz)
+    return heatmap_minutes(starts + offsets, ends + offsets, category_index, categories)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-activity Python loop vs vectorised heatmap bucketing")
+    parser.add_argument("--activities", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--categories", type=int, default=6)
+    parser.add_argument("--timezone", default="Europe/Paris")
+    args = parser.parse_args()
+    random.seed(7)
+    tz = ZoneInfo(args.timezone)
+
+    for count in args.activities:
+        rows = generate_rows(count, args.categories)
+        expected, loop_ms = timed(python_heatmap, rows, tz, args.categories)
+        grid, numpy_ms = timed(numpy_heatmap, rows, tz, args.categories)
+        assert np.allclose(expected, grid), "vectorised grid differs from the reference loop"
+        print(f"{count:>8} activities   loop {loop_ms:>9.1f} ms   numpy {numpy_ms:>8.1f} ms   "
+              f"({loop_ms / numpy_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import copy
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from models.activity import Activity, ActivityIn
+from models.questionnaire import Question
+from models.response import SubmissionIn
+
+ACTIVITY_NAMES = ["Révision", "Cours", "TD", "TP", "Projet", "Lecture", "Sport", "Pause"]
+
+
+# The dict-based code the models replaced, kept here as the baseline
+def legacy_activity_doc(data, mongo_user_id, diary_id, category_id):
+    if not (all([data.get("username"), data.get("activity"), data.get("start_time"), data.get("end_time")])
+            and data.get("duration_seconds") is not None):
+        return None
+    return {
+        "user_id": ObjectId(mongo_user_id),
+        "diary_id": diary_id,
+        "activity": data.get("activity"),
+        "start_time": datetime.fromisoformat(data.get("start_time")),
+        "end_time": datetime.fromisoformat(data.get("end_time")),
+        "duration_seconds": data.get("duration_seconds"),
+        "category_id": ObjectId(category_id) if category_id else None,
+    }
+
+
+def legacy_grade(questions_by_id, data):
+    processed = []
+    for response in data.get("responses"):
+        question = questions_by_id.get(str(ObjectId(response["question_id"])))
+        if not question:
+            continue
+        is_correct = False
+        if question["type"] == "multiple_choice" and response.get("selected_proposition_id"):
+            selected = next((p for p in question["propositions"] if p["id"] == response["selected_proposition_id"]),
+                            None)
+            is_correct = selected["is_correct"] if selected else False
+        processed.append({
+            "question_id": ObjectId(response["question_id"]),
+            "selected_proposition_id": response.get("selected_proposition_id"),
+            "answer_text": response.get("answer_text"),
+            "is_correct": is_correct
+        })
+    return processed
+
+
+def model_activity_doc(data, mongo_user_id, diary_id, category_id):
+    return ActivityIn.from_json(data).to_document(mongo_user_id, diary_id, category_id)
+
+
+def model_grade(questions, data):
+    submission = SubmissionIn.from_json(data)
+    graded = []
+    for answer in submission.answers:
+        question = questions.get(answer.question_id)
+        if question is not None:
+            graded.append(question.grade(answer))
+    return graded
+
+
+def generate_activity_payloads(count):
+    start = datetime(2024, 9, 1)
+    for _ in range(count):
+        start += timedelta(minutes=random.randint(30, 600))
+        duration = random.randint(10, 180) * 60
+        yield {
+            "username": f"etudiant{random.randint(1, 500)}",
+            "activity": random.choice(ACTIVITY_NAMES),
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(seconds=duration)).isoformat(),
+            "duration_seconds": duration,
+            "category": "Cours",
+        }
+
+
+def generate_question_docs(count, propositions):
+    return [{
+        "_id": ObjectId(),
+        "text": f"Question {i} " + "x" * 120,
+        "type": "multiple_choice",
+        "order": i,
+        "points": 2,
+        "propositions": [{"id": f"p{j}", "text": "réponse " + "y" * 60, "is_correct": j == 0}
+                         for j in range(propositions)],
+    } for i in range(count)]
+
+
+def generate_submission(question_docs):
+    return {
+        "questionnaire_id": str(ObjectId()),
+        "mongo_user_id": str(ObjectId()),
+        "duration_seconds": 300,
+        "responses": [{"question_id": str(q["_id"]), "selected_proposition_id": random.choice(q["propositions"])["id"]}
+                      for q in question_docs],
+    }
+
+
+def generate_page_docs(count):
+    start = datetime(2024, 9, 1)
+    return [{"_id": ObjectId(), "activity": random.choice(ACTIVITY_NAMES), "start_time": start + timedelta(hours=i),
+             "end_time": start + timedelta(hours=i, minutes=45), "duration_seconds": 2700, "category_id": ObjectId()}
+            for i in range(count)]
+
+
+def cpu_us(fn, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(timings)
+
+
+# Peak memory of a single call: the transient objects a request allocates while decoding
+def allocated_bytes(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def retained_bytes(build):
+    tracemalloc.start()
+    rows = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return current
+
+
+def report(name, legacy, model, unit):
+    print(f"  {name:<34} legacy {legacy:>10.1f} {unit}   models {model:>10.1f} {unit}   ({model / legacy:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dict handling vs slotted request/response models")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--propositions", type=int, default=4)
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=15)
+    args = parser.parse_args()
+    random.seed(42)
+
+    user_id, diary_id, category_id = ObjectId(), ObjectId(), ObjectId()
+    payloads = list(generate_activity_payloads(args.requests))
+
+    def run(build):
+        return lambda: [build(p, user_id, diary_id, category_id) for p in payloads]
+
+    print(f"POST /log_activity decode + document ({args.requests} requests)")
+    report("CPU per request", cpu_us(run(legacy_activity_doc), args.runs) / args.requests,
+           cpu_us(run(model_activity_doc), args.runs) / args.requests, "us")
+    report("peak allocation per request",
+           float(allocated_bytes(lambda: legacy_activity_doc(payloads[0], user_id, diary_id, category_id))),
+           float(allocated_bytes(lambda: model_activity_doc(payloads[0], user_id, diary_id, category_id))), "B ")
+
+    question_docs = generate_question_docs(args.questions, args.propositions)
+    submission = generate_submission(question_docs)
+    # What each version fetched: whole documents vs the grading projection turned into Question objects
+    legacy_questions = {str(q["_id"]): q for q in question_docs}
+    grading_docs = [{"_id": q["_id"], "type": q["type"], "points": q["points"],
+                     "correct_ids": [p["id"] for p in q["propositions"] if p["is_correct"]]}
+                    for q in question_docs]
+
+    def model_submission():
+        questions = {doc["_id"]: Question.from_document(doc) for doc in grading_docs}
+        return model_grade(questions, submission)
+
+    def legacy_submission():
+        return legacy_grade(legacy_questions, submission)
+
+    print(f"POST /submit_questionnaire_response ({args.questions} answers)")
+    report("CPU per submission", cpu_us(legacy_submission, args.runs * 20),
+           cpu_us(model_submission, args.runs * 20), "us")
+    report("question data held while grading", float(retained_bytes(lambda: copy.deepcopy(question_docs))),
+           float(retained_bytes(lambda: [Question.from_document(q) for q in grading_docs])), "B ")
+
+    page_docs = generate_page_docs(args.page_size)
+    print(f"GET /activities page ({args.page_size} rows)")
+    report("bytes per row held", retained_bytes(lambda: [dict(d) for d in page_docs]) / args.page_size,
+           retained_bytes(lambda: [Activity.from_document(d) for d in page_docs]) / args.page_size, "B ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import random
+import statistics
+import time
+
+from bson import ObjectId
+
+from services.search_index import _InvertedIndex, CatalogSearchIndex, fold, tokenize
+
+WORDS = ("programmation python algorithme statistiques probabilités histoire géographie révolution "
+         "chimie physique biologie économie droit réseau base données sécurité analyse fonction "
+         "intégrale dérivée matrice graphe logique compilation mémoire processus système").split()
+
+
+def sentence(length):
+    return " ".join(random.choice(WORDS) for _ in range(length))
+
+
+def generate_catalog(count):
+    return [{"_id": ObjectId(), "title": sentence(4), "description": sentence(20), "is_active": True}
+            for _ in range(count)]
+
+
+# What an admin page does today: fetch everything, then filter it
+def scan(documents, query):
+    words = [fold(word) for word in query.split()]
+    return [document for document in documents
+            if all(word in fold(document["title"] + " " + document["description"]) for word in words)]
+
+
+def median_ms(fn, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inverted index vs scanning the catalog")
+    parser.add_argument("--questionnaires", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    random.seed(3)
+    queries = ["prog", "statistiques proba", "base données sécu"]
+
+    for count in args.questionnaires:
+        documents = generate_catalog(count)
+        build_ms = median_ms(lambda: _InvertedIndex(documents, CatalogSearchIndex.QUESTIONNAIRE_WEIGHTS), 3)
+        index = _InvertedIndex(documents, CatalogSearchIndex.QUESTIONNAIRE_WEIGHTS)
+        print(f"{count} questionnaires: index built in {build_ms:.1f} ms")
+        for query in queries:
+            scan_ms = median_ms(lambda: scan(documents, query), args.runs)
+            index_ms = median_ms(lambda: index.search(tokenize(query), True)[:20], args.runs)
+            print(f"  {query!r:<24} scan {scan_ms:>8.2f} ms   index {index_ms:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
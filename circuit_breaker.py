@@ -0,0 +1,259 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify
+from google.api_core.exceptions import DeadlineExceeded, RetryError, ServiceUnavailable
+from pymongo.command_cursor import CommandCursor
+from pymongo.cursor import Cursor
+from pymongo.errors import ConnectionFailure, ExecutionTimeout
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Errors that say the backend is slow or unreachable. Anything else (duplicate key, not found,
+# invalid query) means it answered, and counts as a success for the breaker.
+MONGO_FAILURES = (ConnectionFailure, ExecutionTimeout)
+FIRESTORE_FAILURES = (DeadlineExceeded, ServiceUnavailable, RetryError)
+
+
+class BackendUnavailable(Exception):
+    def __init__(self, backend, retry_after):
+        super().__init__(f"{backend} indisponible")
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+BACKEND_FAILURES = (BackendUnavailable,) + MONGO_FAILURES + FIRESTORE_FAILURES
+
+
+# Opens after `failure_threshold` consecutive backend failures: calls then raise BackendUnavailable
+# at once instead of waiting for their deadline. After reset_seconds one trial call goes through;
+# its outcome closes the circuit or opens it for another reset_seconds.
+class CircuitBreaker:
+    def __init__(self, name, failure_types, failure_threshold=5, reset_seconds=30, metrics=None):
+        self.name = name
+        self.failure_types = failure_types
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.metrics = metrics
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._trial_started_at = None
+        self._lock = threading.Lock()
+        if metrics is not None:
+            metrics.describe("circuit_breaker_state", "Breaker state per backend (0 closed, 1 half-open, 2 open)")
+            metrics.describe("circuit_breaker_failures_total", "Backend calls failed with a timeout or lost connection")
+            metrics.describe("circuit_breaker_rejected_total", "Calls failed fast while the breaker was open")
+            metrics.describe("circuit_breaker_opened_total", "Times the breaker opened")
+            metrics.set("circuit_breaker_state", STATE_VALUES[CLOSED], {"backend": name})
+
+    @property
+    def state(self):
+        return self._state
+
+    def _set_state(self, state):
+        self._state = state
+        if self.metrics is not None:
+            self.metrics.set("circuit_breaker_state", STATE_VALUES[state], {"backend": self.name})
+            if state == OPEN:
+                self.metrics.inc("circuit_breaker_opened_total", {"backend": self.name})
+
+    def allow(self):
+        if self._state == CLOSED:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._state == OPEN and now - self._opened_at >= self.reset_seconds:
+                self._set_state(HALF_OPEN)
+            # A trial whose outcome never came back (cursor left unread) is replaced after reset_seconds
+            if self._state == HALF_OPEN and (self._trial_started_at is None
+                                             or now - self._trial_started_at >= self.reset_seconds):
+                self._trial_started_at = now
+                return
+            if self._state == CLOSED:
+                return
+            retry_after = max(1, round(self.reset_seconds - (now - self._opened_at)))
+        if self.metrics is not None:
+            self.metrics.inc("circuit_breaker_rejected_total", {"backend": self.name})
+        raise BackendUnavailable(self.name, retry_after)
+
+    def record_success(self):
+        if self._state == CLOSED and not self._failures:
+            return
+        with self._lock:
+            self._failures = 0
+            self._trial_started_at = None
+            if self._state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_started_at = None
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+        if self.metrics is not None:
+            self.metrics.inc("circuit_breaker_failures_total", {"backend": self.name})
+
+    def call(self, fn, *args, **kwargs):
+        self.allow()
+        try:
+            result = fn(*args, **kwargs)
+        except self.failure_types:
+            self.record_failure()
+            raise
+        except Exception:
+            self.record_success()
+            raise
+        self.record_success()
+        return result
+
+
+# Last good result of each read, served when the backend fails or its breaker is open. Entries
+# older than max_age_seconds are not served: the error goes to the caller instead.
+class StaleCache:
+    def __init__(self, max_entries=20000, max_age_seconds=3600, metrics=None):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.metrics = metrics
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if metrics is not None:
+            metrics.describe("stale_cache_served_total", "Reads answered from the stale cache, by read")
+
+    def load(self, key, loader, *args):
+        try:
+            value = loader(*args)
+        except BACKEND_FAILURES:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.max_age_seconds:
+                raise
+            if self.metrics is not None:
+                self.metrics.inc("stale_cache_served_total", {"read": key[0]})
+            # Callers may annotate the documents they get back; the cached copy stays as loaded.
+            # Firestore snapshots are read-only and hold the client, so they are returned as is
+            return copy.deepcopy(entry[1]) if isinstance(entry[1], (dict, list, set)) else entry[1]
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def read_through(stale_cache, key, loader, *args):
+    return loader(*args) if stale_cache is None else stale_cache.load(key, loader, *args)
+
+
+# pymongo cursors run their query when first read: the breaker was checked when the cursor was
+# created, the outcome is recorded once it has been read
+class _GuardedCursor:
+    def __init__(self, cursor, breaker):
+        self._cursor = cursor
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            try:
+                result = attribute(*args, **kwargs)
+            except self._breaker.failure_types:
+                self._breaker.record_failure()
+                raise
+            # sort(), limit(), skip()... only change the query and return the cursor itself
+            if result is self._cursor:
+                return self
+            self._breaker.record_success()
+            return result
+        return call
+
+    def __iter__(self):
+        try:
+            yield from self._cursor
+        except self._breaker.failure_types:
+            self._breaker.record_failure()
+            raise
+        self._breaker.record_success()
+
+    def __next__(self):
+        try:
+            return next(self._cursor)
+        except self._breaker.failure_types:
+            self._breaker.record_failure()
+            raise
+
+
+# Collection wrapper checking the Mongo breaker before every operation. Repositories keep using
+# collections as before; mongo_db hands these out (see GuardedDatabase).
+class GuardedCollection:
+    # Long-lived streams are not subject to the breaker
+    UNGUARDED = frozenset(("watch",))
+
+    def __init__(self, collection, breaker):
+        self._collection = collection
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name == "database":
+            return GuardedDatabase(attribute, self._breaker)
+        if not callable(attribute) or name in self.UNGUARDED:
+            return attribute
+        if name == "with_options":
+            return lambda *args, **kwargs: GuardedCollection(attribute(*args, **kwargs), self._breaker)
+
+        def call(*args, **kwargs):
+            self._breaker.allow()
+            try:
+                result = attribute(*args, **kwargs)
+            except self._breaker.failure_types:
+                self._breaker.record_failure()
+                raise
+            except Exception:
+                self._breaker.record_success()
+                raise
+            if isinstance(result, (Cursor, CommandCursor)):
+                return _GuardedCursor(result, self._breaker)
+            self._breaker.record_success()
+            return result
+        return call
+
+    def __getitem__(self, name):
+        return GuardedCollection(self._collection[name], self._breaker)
+
+
+class GuardedDatabase:
+    def __init__(self, database, breaker):
+        self._database = database
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+    def __getitem__(self, name):
+        return GuardedCollection(self._database[name], self._breaker)
+
+
+def backend_unavailable(error):
+    response = jsonify({"message": "Service temporairement indisponible", "backend": error.backend})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def init_circuit_breakers(app):
+    app.register_error_handler(BackendUnavailable, backend_unavailable)
@@ -0,0 +1,296 @@
+import json
+import os
+from dotenv import load_dotenv
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+from http_cache import DEFAULT_CACHE_CONTROL
+from rate_limit import DEFAULT_RATE_LIMITS, MEMORY
+from unit_of_work import DEFAULT_UNIT_OF_WORK_ROUTES
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+class Config:
+    MONGO_URI = None
+    MONGO_DB_NAME = "dev_mobile"
+    MONGO_MAX_POOL_SIZE = 50
+    MONGO_MIN_POOL_SIZE = 0
+    MONGO_MAX_IDLE_TIME_MS = 60000
+    MONGO_CONNECT_TIMEOUT_MS = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+    MONGO_SOCKET_TIMEOUT_MS = 10000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = 2000
+    MONGO_APP_NAME = "activity-tracker-backend"
+    # Deadline of each Mongo operation, server selection and pool wait included; 0 disables
+    MONGO_TIMEOUT_MS = 5000
+    # Admin and analytics reads (see analytics_read_preference); writes and read-your-writes
+    # paths always use the primary. MONGO_READ_ROUTING overrides the mode per repository,
+    # e.g. {"log_repository": "primary"}. Staleness below 90s is rejected by the driver.
+    MONGO_ANALYTICS_READ_PREFERENCE = "secondaryPreferred"
+    MONGO_MAX_STALENESS_SECONDS = 90
+    MONGO_READ_ROUTING = {}
+
+    FIREBASE_CRED_JSON = None
+
+    CORS_ORIGINS = ["https://yourusername.pythonanywhere.com", "http://localhost:*"]
+
+    CATEGORY_CACHE_TTL_SECONDS = 300
+
+    # /sync tokens older than this trigger a full resync, since their tombstones may be gone
+    SYNC_TOMBSTONE_RETENTION_DAYS = 90
+
+    # In-process filière/year -> questionnaire index for student listings (services/questionnaire_index.py)
+    QUESTIONNAIRE_INDEX_ENABLED = True
+    QUESTIONNAIRE_INDEX_REFRESH_SECONDS = 5
+    QUESTIONNAIRE_INDEX_CHANGE_STREAM = False
+
+    # Response compression and conditional GET (http_cache.py); HTTP_CACHE_CONTROL maps URL rules
+    # to their Cache-Control header
+    HTTP_COMPRESSION_MIN_BYTES = 1024
+    HTTP_GZIP_LEVEL = 6
+    HTTP_BROTLI_QUALITY = 5
+    HTTP_ETAGS_ENABLED = True
+    HTTP_CACHE_CONTROL = DEFAULT_CACHE_CONTROL
+
+    # Token buckets per route and caller (rate_limit.py). "memory" limits each worker on its
+    # own; "mongo" shares the buckets between workers at the cost of one write per request
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_BACKEND = MEMORY
+    RATE_LIMITS = DEFAULT_RATE_LIMITS
+
+    # Bulk provisioning (/bulk_add_users): bcrypt worker processes (0 = one per CPU) and
+    # Firestore writes per batch (at most 500)
+    PROVISIONING_HASH_WORKERS = 0
+    PROVISIONING_BATCH_SIZE = 400
+
+    # Cascading deletes (services/deletion_service.py): dependents are purged in batches by a
+    # background worker; a job whose worker stops renewing its lease is picked up again
+    DELETION_BATCH_SIZE = 1000
+    DELETION_BATCH_PAUSE_MS = 50
+    DELETION_LEASE_SECONDS = 300
+
+    # Score ledger and in-process leaderboards per filière/year (services/leaderboard.py)
+    LEADERBOARD_REFRESH_SECONDS = 10
+    LEADERBOARD_MAX_SIZE = 100
+
+    # /log_activity ingestion: "sync" writes in the request; "queued" appends to a local SQLite
+    # queue and answers 202, a background worker then stores the activities
+    ACTIVITY_INGEST_MODE = "sync"
+    ACTIVITY_QUEUE_PATH = "var/activity_queue.sqlite3"
+    ACTIVITY_QUEUE_BATCH_SIZE = 100
+    ACTIVITY_QUEUE_MAX_BACKOFF_SECONDS = 300
+
+    # On-demand request profiling (profiling.py): requests sending PROFILING_TOKEN in the
+    # X-Profile-Token header, plus a PROFILING_SAMPLE_RATE fraction of all requests, are captured
+    # to PROFILING_DIR. With no token and a zero rate the hooks are not even registered
+    PROFILING_TOKEN = None
+    PROFILING_SAMPLE_RATE = 0.0
+    PROFILING_DIR = "var/profiles"
+    PROFILING_INTERVAL_MS = 5
+    PROFILING_TRACEMALLOC = True
+    PROFILING_MAX_CAPTURES = 50
+
+    # What /log_activity does with an activity overlapping one already stored for the user:
+    # "off", "flag" (store it with overlaps_with), "reject" (409) or "merge" (extend the stored
+    # one). Checked against a per-worker interval index (services/activity_overlap.py)
+    ACTIVITY_OVERLAP_POLICY = "flag"
+    ACTIVITY_OVERLAP_INDEX_USERS = 5000
+    ACTIVITY_OVERLAP_INDEX_TTL_SECONDS = 60
+
+    # Weekday x hour heatmaps (services/heatmap_service.py): bucketed in HEATMAP_TIMEZONE, over the
+    # last HEATMAP_DEFAULT_WEEKS unless a range is given; longer activities count for
+    # HEATMAP_MAX_ACTIVITY_HOURS at most
+    HEATMAP_TIMEZONE = "Europe/Paris"
+    HEATMAP_DEFAULT_WEEKS = 12
+    HEATMAP_MAX_ACTIVITY_HOURS = 24
+    HEATMAP_CACHE_SIZE = 256
+    HEATMAP_COHORT_TTL_SECONDS = 300
+
+    # Admin search (/search): the questionnaire/question index is rebuilt after local writes and at
+    # least every SEARCH_INDEX_REFRESH_SECONDS, which bounds how stale other workers can be
+    SEARCH_INDEX_REFRESH_SECONDS = 30
+    SEARCH_PAGE_SIZE = 20
+    SEARCH_MAX_PAGE_SIZE = 100
+
+    # Deadline of each Firestore call, transient-error retries included
+    FIRESTORE_TIMEOUT_SECONDS = 5
+    # Per-backend circuit breakers (circuit_breaker.py): open after CIRCUIT_BREAKER_FAILURE_THRESHOLD
+    # consecutive timeouts or connection errors, let one call through after CIRCUIT_BREAKER_RESET_SECONDS.
+    # Profile, questionnaire and reference reads then fall back to results at most
+    # STALE_CACHE_MAX_AGE_SECONDS old (0 disables the fallback)
+    CIRCUIT_BREAKERS_ENABLED = True
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5
+    CIRCUIT_BREAKER_RESET_SECONDS = 30
+    STALE_CACHE_MAX_ENTRIES = 20000
+    STALE_CACHE_MAX_AGE_SECONDS = 3600
+
+    # Firestore profiles are mirrored into users_objects.profile on every write and by
+    # tools/reconcile_profiles.py; once a reconcile has run, profile and cohort reads can use the
+    # mirror instead of Firestore
+    USER_PROFILE_MIRROR_READS = False
+
+    # Request units of work (unit_of_work.py): on these routes Mongo writes are queued and sent at
+    # the end of the request as one bulk_write per collection, inside a transaction when
+    # UNIT_OF_WORK_TRANSACTIONS is set and the deployment is a replica set or sharded cluster
+    UNIT_OF_WORK_ENABLED = True
+    UNIT_OF_WORK_ROUTES = DEFAULT_UNIT_OF_WORK_ROUTES
+    UNIT_OF_WORK_TRANSACTIONS = True
+
+    # "classic", "timeseries" or "dual" (see repositories/activity_repository.py)
+    ACTIVITY_STORAGE_MODE = "classic"
+    # Layout of activities and questionnaire responses: "full", "mixed" or "compact" (see
+    # models/compact.py). Switch to "mixed", run tools/migrate_compact.py, then to "compact".
+    # Compact activities require the classic storage mode.
+    DOCUMENT_ENCODING = "full"
+
+    # Logs older than LOG_RETENTION_DAYS are archived then removed from `logs`; the TTL
+    # index only fires after the extra grace period, as a backstop if archiving stops running
+    LOG_RETENTION_DAYS = 30
+    LOG_TTL_GRACE_DAYS = 7
+    LOG_ARCHIVE_DIR = "log_archive"
+    LOG_ARCHIVE_BATCH_SIZE = 5000
+
+    # Event routing (services/log_policy.py): AUDIT events always reach Mongo; others below
+    # LOG_MIN_LEVEL, outside their sample or over the per-user limit go to the local file
+    LOG_MIN_LEVEL = "INFO"
+    LOG_POLICY_OVERRIDES = {}
+    LOG_USER_RATE_LIMIT_PER_MINUTE = 30
+    LOG_FILE_PATH = "var/log/events.log"
+    LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+    LOG_FILE_BACKUP_COUNT = 5
+
+    @classmethod
+    def from_env(cls):
+        load_dotenv()
+        config = cls()
+        config.MONGO_URI = os.getenv("MONGO_URI")
+        config.MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", cls.MONGO_DB_NAME)
+        config.MONGO_MAX_POOL_SIZE = _env_int("MONGO_MAX_POOL_SIZE", cls.MONGO_MAX_POOL_SIZE)
+        config.MONGO_MIN_POOL_SIZE = _env_int("MONGO_MIN_POOL_SIZE", cls.MONGO_MIN_POOL_SIZE)
+        config.MONGO_MAX_IDLE_TIME_MS = _env_int("MONGO_MAX_IDLE_TIME_MS", cls.MONGO_MAX_IDLE_TIME_MS)
+        config.MONGO_CONNECT_TIMEOUT_MS = _env_int("MONGO_CONNECT_TIMEOUT_MS", cls.MONGO_CONNECT_TIMEOUT_MS)
+        config.MONGO_SERVER_SELECTION_TIMEOUT_MS = _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS",
+                                                            cls.MONGO_SERVER_SELECTION_TIMEOUT_MS)
+        config.MONGO_SOCKET_TIMEOUT_MS = _env_int("MONGO_SOCKET_TIMEOUT_MS", cls.MONGO_SOCKET_TIMEOUT_MS)
+        config.MONGO_WAIT_QUEUE_TIMEOUT_MS = _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", cls.MONGO_WAIT_QUEUE_TIMEOUT_MS)
+        config.MONGO_TIMEOUT_MS = _env_int("MONGO_TIMEOUT_MS", cls.MONGO_TIMEOUT_MS)
+        config.MONGO_ANALYTICS_READ_PREFERENCE = os.getenv("MONGO_ANALYTICS_READ_PREFERENCE",
+                                                           cls.MONGO_ANALYTICS_READ_PREFERENCE)
+        config.MONGO_MAX_STALENESS_SECONDS = _env_int("MONGO_MAX_STALENESS_SECONDS", cls.MONGO_MAX_STALENESS_SECONDS)
+        config.MONGO_READ_ROUTING = json.loads(os.getenv("MONGO_READ_ROUTING") or "{}")
+        config.FIREBASE_CRED_JSON = os.getenv("FIREBASE_CRED_JSON")
+        config.CATEGORY_CACHE_TTL_SECONDS = _env_int("CATEGORY_CACHE_TTL_SECONDS", cls.CATEGORY_CACHE_TTL_SECONDS)
+        config.SYNC_TOMBSTONE_RETENTION_DAYS = _env_int("SYNC_TOMBSTONE_RETENTION_DAYS",
+                                                        cls.SYNC_TOMBSTONE_RETENTION_DAYS)
+        config.QUESTIONNAIRE_INDEX_ENABLED = os.getenv("QUESTIONNAIRE_INDEX_ENABLED", "true").lower() == "true"
+        config.QUESTIONNAIRE_INDEX_REFRESH_SECONDS = _env_int("QUESTIONNAIRE_INDEX_REFRESH_SECONDS",
+                                                              cls.QUESTIONNAIRE_INDEX_REFRESH_SECONDS)
+        config.QUESTIONNAIRE_INDEX_CHANGE_STREAM = os.getenv("QUESTIONNAIRE_INDEX_CHANGE_STREAM",
+                                                             "false").lower() == "true"
+        config.HTTP_COMPRESSION_MIN_BYTES = _env_int("HTTP_COMPRESSION_MIN_BYTES", cls.HTTP_COMPRESSION_MIN_BYTES)
+        config.HTTP_GZIP_LEVEL = _env_int("HTTP_GZIP_LEVEL", cls.HTTP_GZIP_LEVEL)
+        config.HTTP_BROTLI_QUALITY = _env_int("HTTP_BROTLI_QUALITY", cls.HTTP_BROTLI_QUALITY)
+        config.HTTP_ETAGS_ENABLED = os.getenv("HTTP_ETAGS_ENABLED", "true").lower() == "true"
+        config.HTTP_CACHE_CONTROL = {**cls.HTTP_CACHE_CONTROL, **json.loads(os.getenv("HTTP_CACHE_CONTROL") or "{}")}
+        config.RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+        config.RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", cls.RATE_LIMIT_BACKEND)
+        config.RATE_LIMITS = {**cls.RATE_LIMITS, **json.loads(os.getenv("RATE_LIMITS") or "{}")}
+        config.PROVISIONING_HASH_WORKERS = _env_int("PROVISIONING_HASH_WORKERS", cls.PROVISIONING_HASH_WORKERS)
+        config.PROVISIONING_BATCH_SIZE = _env_int("PROVISIONING_BATCH_SIZE", cls.PROVISIONING_BATCH_SIZE)
+        config.DELETION_BATCH_SIZE = _env_int("DELETION_BATCH_SIZE", cls.DELETION_BATCH_SIZE)
+        config.DELETION_BATCH_PAUSE_MS = _env_int("DELETION_BATCH_PAUSE_MS", cls.DELETION_BATCH_PAUSE_MS)
+        config.DELETION_LEASE_SECONDS = _env_int("DELETION_LEASE_SECONDS", cls.DELETION_LEASE_SECONDS)
+        config.LEADERBOARD_REFRESH_SECONDS = _env_int("LEADERBOARD_REFRESH_SECONDS", cls.LEADERBOARD_REFRESH_SECONDS)
+        config.LEADERBOARD_MAX_SIZE = _env_int("LEADERBOARD_MAX_SIZE", cls.LEADERBOARD_MAX_SIZE)
+        config.ACTIVITY_INGEST_MODE = os.getenv("ACTIVITY_INGEST_MODE", cls.ACTIVITY_INGEST_MODE)
+        config.ACTIVITY_QUEUE_PATH = os.getenv("ACTIVITY_QUEUE_PATH", cls.ACTIVITY_QUEUE_PATH)
+        config.ACTIVITY_QUEUE_BATCH_SIZE = _env_int("ACTIVITY_QUEUE_BATCH_SIZE", cls.ACTIVITY_QUEUE_BATCH_SIZE)
+        config.ACTIVITY_QUEUE_MAX_BACKOFF_SECONDS = _env_int("ACTIVITY_QUEUE_MAX_BACKOFF_SECONDS",
+                                                             cls.ACTIVITY_QUEUE_MAX_BACKOFF_SECONDS)
+        config.PROFILING_TOKEN = os.getenv("PROFILING_TOKEN") or None
+        config.PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", cls.PROFILING_SAMPLE_RATE))
+        config.PROFILING_DIR = os.getenv("PROFILING_DIR", cls.PROFILING_DIR)
+        config.PROFILING_INTERVAL_MS = _env_int("PROFILING_INTERVAL_MS", cls.PROFILING_INTERVAL_MS)
+        config.PROFILING_TRACEMALLOC = os.getenv("PROFILING_TRACEMALLOC", "true").lower() == "true"
+        config.PROFILING_MAX_CAPTURES = _env_int("PROFILING_MAX_CAPTURES", cls.PROFILING_MAX_CAPTURES)
+        config.ACTIVITY_OVERLAP_POLICY = os.getenv("ACTIVITY_OVERLAP_POLICY", cls.ACTIVITY_OVERLAP_POLICY)
+        config.ACTIVITY_OVERLAP_INDEX_USERS = _env_int("ACTIVITY_OVERLAP_INDEX_USERS", cls.ACTIVITY_OVERLAP_INDEX_USERS)
+        config.ACTIVITY_OVERLAP_INDEX_TTL_SECONDS = _env_int("ACTIVITY_OVERLAP_INDEX_TTL_SECONDS",
+                                                             cls.ACTIVITY_OVERLAP_INDEX_TTL_SECONDS)
+        config.HEATMAP_TIMEZONE = os.getenv("HEATMAP_TIMEZONE", cls.HEATMAP_TIMEZONE)
+        config.HEATMAP_DEFAULT_WEEKS = _env_int("HEATMAP_DEFAULT_WEEKS", cls.HEATMAP_DEFAULT_WEEKS)
+        config.HEATMAP_MAX_ACTIVITY_HOURS = _env_int("HEATMAP_MAX_ACTIVITY_HOURS", cls.HEATMAP_MAX_ACTIVITY_HOURS)
+        config.HEATMAP_CACHE_SIZE = _env_int("HEATMAP_CACHE_SIZE", cls.HEATMAP_CACHE_SIZE)
+        config.HEATMAP_COHORT_TTL_SECONDS = _env_int("HEATMAP_COHORT_TTL_SECONDS", cls.HEATMAP_COHORT_TTL_SECONDS)
+        config.SEARCH_INDEX_REFRESH_SECONDS = _env_int("SEARCH_INDEX_REFRESH_SECONDS", cls.SEARCH_INDEX_REFRESH_SECONDS)
+        config.SEARCH_PAGE_SIZE = _env_int("SEARCH_PAGE_SIZE", cls.SEARCH_PAGE_SIZE)
+        config.SEARCH_MAX_PAGE_SIZE = _env_int("SEARCH_MAX_PAGE_SIZE", cls.SEARCH_MAX_PAGE_SIZE)
+        config.FIRESTORE_TIMEOUT_SECONDS = _env_int("FIRESTORE_TIMEOUT_SECONDS", cls.FIRESTORE_TIMEOUT_SECONDS)
+        config.CIRCUIT_BREAKERS_ENABLED = os.getenv("CIRCUIT_BREAKERS_ENABLED", "true").lower() == "true"
+        config.CIRCUIT_BREAKER_FAILURE_THRESHOLD = _env_int("CIRCUIT_BREAKER_FAILURE_THRESHOLD",
+                                                            cls.CIRCUIT_BREAKER_FAILURE_THRESHOLD)
+        config.CIRCUIT_BREAKER_RESET_SECONDS = _env_int("CIRCUIT_BREAKER_RESET_SECONDS",
+                                                        cls.CIRCUIT_BREAKER_RESET_SECONDS)
+        config.STALE_CACHE_MAX_ENTRIES = _env_int("STALE_CACHE_MAX_ENTRIES", cls.STALE_CACHE_MAX_ENTRIES)
+        config.STALE_CACHE_MAX_AGE_SECONDS = _env_int("STALE_CACHE_MAX_AGE_SECONDS", cls.STALE_CACHE_MAX_AGE_SECONDS)
+        config.ACTIVITY_STORAGE_MODE = os.getenv("ACTIVITY_STORAGE_MODE", cls.ACTIVITY_STORAGE_MODE)
+        config.DOCUMENT_ENCODING = os.getenv("DOCUMENT_ENCODING", cls.DOCUMENT_ENCODING)
+        config.LOG_RETENTION_DAYS = _env_int("LOG_RETENTION_DAYS", cls.LOG_RETENTION_DAYS)
+        config.LOG_TTL_GRACE_DAYS = _env_int("LOG_TTL_GRACE_DAYS", cls.LOG_TTL_GRACE_DAYS)
+        config.LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", cls.LOG_ARCHIVE_DIR)
+        config.LOG_ARCHIVE_BATCH_SIZE = _env_int("LOG_ARCHIVE_BATCH_SIZE", cls.LOG_ARCHIVE_BATCH_SIZE)
+        config.LOG_MIN_LEVEL = os.getenv("LOG_MIN_LEVEL", cls.LOG_MIN_LEVEL)
+        config.LOG_POLICY_OVERRIDES = json.loads(os.getenv("LOG_POLICY_OVERRIDES") or "{}")
+        config.LOG_USER_RATE_LIMIT_PER_MINUTE = _env_int("LOG_USER_RATE_LIMIT_PER_MINUTE",
+                                                         cls.LOG_USER_RATE_LIMIT_PER_MINUTE)
+        config.LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", cls.LOG_FILE_PATH)
+        config.LOG_FILE_MAX_BYTES = _env_int("LOG_FILE_MAX_BYTES", cls.LOG_FILE_MAX_BYTES)
+        config.LOG_FILE_BACKUP_COUNT = _env_int("LOG_FILE_BACKUP_COUNT", cls.LOG_FILE_BACKUP_COUNT)
+        config.USER_PROFILE_MIRROR_READS = os.getenv("USER_PROFILE_MIRROR_READS", "false").lower() == "true"
+        config.UNIT_OF_WORK_ENABLED = os.getenv("UNIT_OF_WORK_ENABLED", "true").lower() == "true"
+        config.UNIT_OF_WORK_TRANSACTIONS = os.getenv("UNIT_OF_WORK_TRANSACTIONS", "true").lower() == "true"
+        # Comma-separated route rules, e.g. "/log_activity,/create_questionnaire"
+        routes = os.getenv("UNIT_OF_WORK_ROUTES")
+        if routes is not None:
+            config.UNIT_OF_WORK_ROUTES = tuple(route.strip() for route in routes.split(",") if route.strip())
+        return config
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in dir(self) if key.isupper()}
+
+
+def mongo_client_options(config):
+    options = {
+        "maxPoolSize": config["MONGO_MAX_POOL_SIZE"],
+        "minPoolSize": config["MONGO_MIN_POOL_SIZE"],
+        "maxIdleTimeMS": config["MONGO_MAX_IDLE_TIME_MS"],
+        "connectTimeoutMS": config["MONGO_CONNECT_TIMEOUT_MS"],
+        "serverSelectionTimeoutMS": config["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+        "socketTimeoutMS": config["MONGO_SOCKET_TIMEOUT_MS"],
+        "waitQueueTimeoutMS": config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+        "appname": config["MONGO_APP_NAME"],
+    }
+    if config["MONGO_TIMEOUT_MS"]:
+        options["timeoutMS"] = config["MONGO_TIMEOUT_MS"]
+    return options
+
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def analytics_read_preference(config, repository_name):
+    mode = config["MONGO_READ_ROUTING"].get(repository_name, config["MONGO_ANALYTICS_READ_PREFERENCE"])
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference for {repository_name}: {mode}")
+    if mode == "primary":
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=config["MONGO_MAX_STALENESS_SECONDS"])
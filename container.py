@@ -0,0 +1,411 @@
+import json
+import os
+import threading
+import time
+from pymongo import MongoClient
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from circuit_breaker import FIRESTORE_FAILURES, MONGO_FAILURES, CircuitBreaker, GuardedDatabase, StaleCache
+from config import analytics_read_preference, mongo_client_options
+from metrics import MetricsRegistry
+from profiling import RequestProfiler
+from rate_limit import MONGO, MemoryBucketStore, RateLimiter
+from unit_of_work import UnitOfWork
+
+# Import repositories
+from repositories.user_repository import UserRepository
+from repositories.diary_repository import DiaryRepository
+from repositories.activity_repository import ActivityRepository
+from repositories.dictionary_repository import DictionaryRepository
+from repositories.log_repository import LogRepository
+from repositories.module_repository import ModuleRepository
+from repositories.category_repository import CategoryRepository
+from repositories.questionnaire_repository import QuestionnaireRepository
+from repositories.question_repository import QuestionRepository
+from repositories.tombstone_repository import TombstoneRepository
+from repositories.rate_limit_repository import RateLimitRepository
+from repositories.deletion_job_repository import DeletionJobRepository
+from repositories.score_repository import ScoreRepository
+from repositories.activity_queue_repository import ActivityQueueRepository
+
+# Import services
+from services.user_service import UserService
+from services.auth_service import AuthService
+from services.activity_service import ActivityService
+from services.log_service import LogService, create_event_file_logger
+from services.log_policy import LogPolicy
+from services.module_service import ModuleService
+from services.questionnaire_service import QuestionnaireService
+from services.question_service import QuestionService
+from services.log_retention_service import LogRetentionService
+from services.sync_service import SyncService
+from services.questionnaire_index import QuestionnaireTargetingIndex
+from services.provisioning_service import ProvisioningService
+from services.deletion_service import DeletionService
+from services.leaderboard import Leaderboards
+from services.score_service import ScoreService
+from services.activity_ingest_service import QUEUED, ActivityIngestService
+from services.activity_overlap import ActivityOverlapIndex
+from services.heatmap_service import HeatmapService
+from services.search_index import CatalogSearchIndex
+from services.search_service import SearchService
+from services.profile_mirror_service import ProfileMirrorService
+
+
+# Builds clients, repositories and services lazily, once per process.
+# MongoClient and the gRPC Firestore client are not fork-safe, so nothing is
+# created until first use and everything is dropped when the pid changes.
+class ServiceContainer:
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._instances = {}
+
+    def _get(self, name, factory):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Inherited through fork: the sockets belong to the parent, do not close them here
+                    self._instances = {}
+                    self._pid = os.getpid()
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = factory()
+                    self._instances[name] = instance
+        return instance
+
+    def _create_mongo_client(self):
+        mongo_uri = self.config.get("MONGO_URI")
+        if not mongo_uri:
+            raise ValueError("MONGO_URI not set in environment variables")
+        return MongoClient(mongo_uri, **mongo_client_options(self.config))
+
+    def _create_firestore_client(self):
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            firebase_cred_json = self.config.get("FIREBASE_CRED_JSON")
+            if not firebase_cred_json:
+                raise ValueError("FIREBASE_CRED_JSON environment variable is not set")
+            try:
+                firebase_cred_dict = json.loads(firebase_cred_json)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid FIREBASE_CRED_JSON format: {str(e)}")
+            firebase_admin.initialize_app(credentials.Certificate(firebase_cred_dict))
+        return firestore.client()
+
+    @property
+    def mongo_client(self):
+        return self._get("mongo_client", self._create_mongo_client)
+
+    def _create_mongo_db(self):
+        database = self.mongo_client[self.config["MONGO_DB_NAME"]]
+        # Every collection handed to repositories checks the Mongo breaker first
+        return GuardedDatabase(database, self.mongo_breaker) if self.mongo_breaker is not None else database
+
+    @property
+    def mongo_db(self):
+        return self._get("mongo_db", self._create_mongo_db)
+
+    @property
+    def firestore_db(self):
+        return self._get("firestore_db", self._create_firestore_client)
+
+    def _create_breaker(self, name, failure_types):
+        return CircuitBreaker(name, failure_types, failure_threshold=self.config["CIRCUIT_BREAKER_FAILURE_THRESHOLD"],
+                              reset_seconds=self.config["CIRCUIT_BREAKER_RESET_SECONDS"], metrics=self.metrics)
+
+    @property
+    def mongo_breaker(self):
+        if not self.config["CIRCUIT_BREAKERS_ENABLED"]:
+            return None
+        return self._get("mongo_breaker", lambda: self._create_breaker("mongo", MONGO_FAILURES))
+
+    @property
+    def firestore_breaker(self):
+        if not self.config["CIRCUIT_BREAKERS_ENABLED"]:
+            return None
+        return self._get("firestore_breaker", lambda: self._create_breaker("firestore", FIRESTORE_FAILURES))
+
+    @property
+    def stale_cache(self):
+        if not self.config["STALE_CACHE_MAX_AGE_SECONDS"]:
+            return None
+        return self._get("stale_cache", lambda: StaleCache(
+            max_entries=self.config["STALE_CACHE_MAX_ENTRIES"],
+            max_age_seconds=self.config["STALE_CACHE_MAX_AGE_SECONDS"], metrics=self.metrics))
+
+    # Repositories
+    @property
+    def user_repository(self):
+        return self._get("user_repository", lambda: UserRepository(
+            self.mongo_db, self.firestore_db,
+            analytics_read_preference=analytics_read_preference(self.config, "user_repository"),
+            firestore_breaker=self.firestore_breaker, firestore_timeout=self.config["FIRESTORE_TIMEOUT_SECONDS"],
+            stale_cache=self.stale_cache, profile_mirror_reads=self.config["USER_PROFILE_MIRROR_READS"]))
+
+    @property
+    def diary_repository(self):
+        return self._get("diary_repository", lambda: DiaryRepository(self.mongo_db))
+
+    @property
+    def activity_repository(self):
+        return self._get("activity_repository", lambda: ActivityRepository(
+            self.mongo_db, storage_mode=self.config["ACTIVITY_STORAGE_MODE"],
+            analytics_read_preference=analytics_read_preference(self.config, "activity_repository"),
+            encoding=self.config["DOCUMENT_ENCODING"], dictionary_repository=self.dictionary_repository))
+
+    @property
+    def dictionary_repository(self):
+        return self._get("dictionary_repository", lambda: DictionaryRepository(self.mongo_db))
+
+    @property
+    def log_repository(self):
+        return self._get("log_repository", lambda: LogRepository(
+            self.mongo_db, analytics_read_preference=analytics_read_preference(self.config, "log_repository")))
+
+    @property
+    def module_repository(self):
+        return self._get("module_repository", lambda: ModuleRepository(self.mongo_db, stale_cache=self.stale_cache))
+
+    @property
+    def category_repository(self):
+        return self._get("category_repository", lambda: CategoryRepository(
+            self.mongo_db, cache_ttl_seconds=self.config["CATEGORY_CACHE_TTL_SECONDS"], stale_cache=self.stale_cache))
+
+    @property
+    def questionnaire_repository(self):
+        return self._get("questionnaire_repository", lambda: QuestionnaireRepository(
+            self.mongo_db, tombstone_repository=self.tombstone_repository, stale_cache=self.stale_cache,
+            response_encoding=self.config["DOCUMENT_ENCODING"]))
+
+    @property
+    def question_repository(self):
+        return self._get("question_repository", lambda: QuestionRepository(self.mongo_db, stale_cache=self.stale_cache))
+
+    @property
+    def tombstone_repository(self):
+        return self._get("tombstone_repository", lambda: TombstoneRepository(self.mongo_db))
+
+    @property
+    def deletion_job_repository(self):
+        return self._get("deletion_job_repository", lambda: DeletionJobRepository(self.mongo_db))
+
+    @property
+    def score_repository(self):
+        return self._get("score_repository", lambda: ScoreRepository(self.mongo_db))
+
+    @property
+    def activity_queue_repository(self):
+        return self._get("activity_queue_repository", lambda: ActivityQueueRepository(
+            self.config["ACTIVITY_QUEUE_PATH"]))
+
+    @property
+    def rate_limit_repository(self):
+        return self._get("rate_limit_repository", lambda: RateLimitRepository(self.mongo_db))
+
+    @property
+    def metrics(self):
+        return self._get("metrics", MetricsRegistry)
+
+    # A new one per request (see unit_of_work.init_unit_of_work)
+    def unit_of_work(self):
+        return UnitOfWork(self.mongo_client, transactions=self.config["UNIT_OF_WORK_TRANSACTIONS"],
+                          metrics=self.metrics)
+
+    @property
+    def rate_limiter(self):
+        return self._get("rate_limiter", lambda: RateLimiter(
+            self.rate_limit_repository if self.config["RATE_LIMIT_BACKEND"] == MONGO else MemoryBucketStore(),
+            self.config["RATE_LIMITS"], metrics=self.metrics))
+
+    @property
+    def profiler(self):
+        return self._get("profiler", lambda: RequestProfiler(
+            self.config["PROFILING_DIR"], token=self.config["PROFILING_TOKEN"],
+            sample_rate=self.config["PROFILING_SAMPLE_RATE"], interval_ms=self.config["PROFILING_INTERVAL_MS"],
+            trace_allocations=self.config["PROFILING_TRACEMALLOC"],
+            max_captures=self.config["PROFILING_MAX_CAPTURES"], metrics=self.metrics))
+
+    # Services
+    @property
+    def log_service(self):
+        return self._get("log_service", lambda: LogService(
+            self.log_repository, LogPolicy.from_config(self.config),
+            create_event_file_logger(self.config["LOG_FILE_PATH"], self.config["LOG_FILE_MAX_BYTES"],
+                                     self.config["LOG_FILE_BACKUP_COUNT"])))
+
+    @property
+    def user_service(self):
+        return self._get("user_service", lambda: UserService(self.user_repository, self.log_service,
+                                                             profile_mirror=self.profile_mirror_service))
+
+    @property
+    def profile_mirror_service(self):
+        return self._get("profile_mirror_service", lambda: ProfileMirrorService(self.user_repository, self.log_service))
+
+    @property
+    def auth_service(self):
+        return self._get("auth_service", AuthService)
+
+    @property
+    def provisioning_service(self):
+        return self._get("provisioning_service", lambda: ProvisioningService(
+            self.user_repository, self.auth_service, self.log_service,
+            hash_workers=self.config["PROVISIONING_HASH_WORKERS"],
+            batch_size=self.config["PROVISIONING_BATCH_SIZE"], profile_mirror=self.profile_mirror_service))
+
+    @property
+    def deletion_service(self):
+        return self._get("deletion_service", lambda: DeletionService(
+            self.user_repository, self.questionnaire_repository, self.deletion_job_repository,
+            self.tombstone_repository, self.log_service, score_repository=self.score_repository,
+            batch_size=self.config["DELETION_BATCH_SIZE"],
+            batch_pause_ms=self.config["DELETION_BATCH_PAUSE_MS"],
+            lease_seconds=self.config["DELETION_LEASE_SECONDS"]))
+
+    @property
+    def activity_overlap_index(self):
+        return self._get("activity_overlap_index", lambda: ActivityOverlapIndex(
+            self.activity_repository, max_users=self.config["ACTIVITY_OVERLAP_INDEX_USERS"],
+            ttl_seconds=self.config["ACTIVITY_OVERLAP_INDEX_TTL_SECONDS"]))
+
+    @property
+    def activity_service(self):
+        return self._get("activity_service", lambda: ActivityService(
+            self.user_repository, self.diary_repository, self.activity_repository,
+            self.category_repository, self.log_service,
+            overlap_index=self.activity_overlap_index, overlap_policy=self.config["ACTIVITY_OVERLAP_POLICY"],
+            metrics=self.metrics))
+
+    @property
+    def heatmap_service(self):
+        return self._get("heatmap_service", lambda: HeatmapService(
+            self.activity_repository, self.category_repository, self.user_repository,
+            tz_name=self.config["HEATMAP_TIMEZONE"], default_weeks=self.config["HEATMAP_DEFAULT_WEEKS"],
+            max_activity_hours=self.config["HEATMAP_MAX_ACTIVITY_HOURS"], cache_size=self.config["HEATMAP_CACHE_SIZE"],
+            cohort_ttl_seconds=self.config["HEATMAP_COHORT_TTL_SECONDS"]))
+
+    @property
+    def activity_ingest_service(self):
+        return self._get("activity_ingest_service", lambda: ActivityIngestService(
+            self.activity_queue_repository, self.activity_service, metrics=self.metrics,
+            batch_size=self.config["ACTIVITY_QUEUE_BATCH_SIZE"],
+            max_backoff_seconds=self.config["ACTIVITY_QUEUE_MAX_BACKOFF_SECONDS"]))
+
+    @property
+    def module_service(self):
+        return self._get("module_service", lambda: ModuleService(self.module_repository))
+
+    @property
+    def questionnaire_service(self):
+        return self._get("questionnaire_service", lambda: QuestionnaireService(
+            self.user_repository, self.questionnaire_repository, self.question_repository, self.log_service,
+            questionnaire_index=self.questionnaire_index, score_service=self.score_service))
+
+    @property
+    def leaderboards(self):
+        return self._get("leaderboards", lambda: Leaderboards(
+            self.score_repository, tombstone_repository=self.tombstone_repository,
+            refresh_seconds=self.config["LEADERBOARD_REFRESH_SECONDS"]))
+
+    @property
+    def score_service(self):
+        return self._get("score_service", lambda: ScoreService(
+            self.score_repository, self.user_repository, self.leaderboards, self.log_service,
+            max_leaderboard_size=self.config["LEADERBOARD_MAX_SIZE"]))
+
+    @property
+    def questionnaire_index(self):
+        if not self.config["QUESTIONNAIRE_INDEX_ENABLED"]:
+            return None
+        return self._get("questionnaire_index", self._create_questionnaire_index)
+
+    def _create_questionnaire_index(self):
+        index = QuestionnaireTargetingIndex(
+            self.questionnaire_repository, self.tombstone_repository,
+            refresh_seconds=self.config["QUESTIONNAIRE_INDEX_REFRESH_SECONDS"],
+            use_change_stream=self.config["QUESTIONNAIRE_INDEX_CHANGE_STREAM"])
+        self.questionnaire_repository.add_change_listener(index.mark_stale)
+        return index
+
+    @property
+    def search_index(self):
+        return self._get("search_index", self._create_search_index)
+
+    def _create_search_index(self):
+        index = CatalogSearchIndex(self.questionnaire_repository, self.question_repository,
+                                   refresh_seconds=self.config["SEARCH_INDEX_REFRESH_SECONDS"])
+        self.questionnaire_repository.add_change_listener(index.mark_stale)
+        self.question_repository.add_change_listener(index.mark_stale)
+        return index
+
+    @property
+    def search_service(self):
+        return self._get("search_service", lambda: SearchService(
+            self.search_index, self.log_repository, page_size=self.config["SEARCH_PAGE_SIZE"],
+            max_page_size=self.config["SEARCH_MAX_PAGE_SIZE"]))
+
+    @property
+    def question_service(self):
+        return self._get("question_service", lambda: QuestionService(self.question_repository, self.log_service))
+
+    @property
+    def log_retention_service(self):
+        return self._get("log_retention_service", lambda: LogRetentionService(
+            self.log_repository, self.config["LOG_ARCHIVE_DIR"], self.config["LOG_RETENTION_DAYS"],
+            self.config["LOG_ARCHIVE_BATCH_SIZE"]))
+
+    @property
+    def sync_service(self):
+        return self._get("sync_service", lambda: SyncService(
+            self.user_repository, self.questionnaire_repository, self.question_repository,
+            self.category_repository, self.module_repository, self.tombstone_repository, self.log_service,
+            self.config["SYNC_TOMBSTONE_RETENTION_DAYS"], questionnaire_index=self.questionnaire_index))
+
+    def ensure_indexes(self):
+        log_ttl_days = self.config["LOG_RETENTION_DAYS"] + self.config["LOG_TTL_GRACE_DAYS"]
+        self.log_repository.ensure_indexes(ttl_seconds=log_ttl_days * 86400 if self.config["LOG_RETENTION_DAYS"] else None)
+        self.activity_repository.ensure_indexes()
+        self.dictionary_repository.ensure_indexes()
+        self.user_repository.ensure_indexes()
+        self.questionnaire_repository.ensure_indexes()
+        self.question_repository.ensure_indexes()
+        self.tombstone_repository.ensure_indexes(ttl_seconds=self.config["SYNC_TOMBSTONE_RETENTION_DAYS"] * 86400)
+        self.rate_limit_repository.ensure_indexes()
+        self.deletion_job_repository.ensure_indexes()
+        self.score_repository.ensure_indexes()
+
+    # Opens connections and fills reference-data caches; returns timings in ms
+    def warm_up(self):
+        timings = {}
+        started = time.perf_counter()
+        self.mongo_client.admin.command("ping")
+        timings["mongo_ping_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        self.firestore_db
+        timings["firestore_client_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        self.category_repository.get_category_map()
+        timings["category_cache_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        if self.config["ACTIVITY_INGEST_MODE"] == QUEUED:
+            # Entries left by a previous process start draining without waiting for new traffic
+            self.activity_ingest_service.ensure_worker()
+
+        if self.questionnaire_index is not None:
+            started = time.perf_counter()
+            self.questionnaire_index.warm_up()
+            timings["questionnaire_index_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        self.search_index.warm_up()
+        timings["search_index_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return timings
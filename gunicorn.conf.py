@@ -0,0 +1,40 @@
+import multiprocessing
+import os
+import resource
+import time
+
+# Production profile: pre-forked gthread workers sharing a preloaded app.
+# Clients are created lazily after fork (see container.ServiceContainer).
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Keep MONGO_MAX_POOL_SIZE >= threads so request threads never wait on the pool
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+accesslog = "-"
+
+_boot_started = time.monotonic()
+
+
+def _rss_kb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return None
+
+
+def when_ready(server):
+    server.log.info("master ready in %.1f ms, rss=%s kB",
+                    (time.monotonic() - _boot_started) * 1000, _rss_kb())
+
+
+def post_worker_init(worker):
+    worker.log.info("worker %s initialised %.1f ms after master boot, rss=%s kB, max_rss=%s kB",
+                    worker.pid, (time.monotonic() - _boot_started) * 1000, _rss_kb(),
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
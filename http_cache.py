@@ -0,0 +1,80 @@
+import gzip
+import hashlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+# Admin views are revalidated on every load (a 304 costs a few bytes); questionnaire
+# content changes rarely enough to be reused for a minute without asking
+DEFAULT_CACHE_CONTROL = {
+    "/users": "private, no-cache",
+    "/logs": "private, no-cache",
+    "/admin/etudiants_activites": "private, no-cache",
+    "/activities": "private, no-cache",
+    "/heatmap": "private, no-cache",
+    "/search": "private, no-cache",
+    "/questionnaire/<questionnaire_id>": "private, max-age=60",
+}
+
+
+def _etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _choose_encoding():
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress(body, encoding, config):
+    if encoding == "br":
+        return brotli.compress(body, quality=config["HTTP_BROTLI_QUALITY"])
+    return gzip.compress(body, compresslevel=config["HTTP_GZIP_LEVEL"], mtime=0)
+
+
+def _not_modified(response):
+    not_modified = current_app.response_class(status=304)
+    for header in ("ETag", "Cache-Control", "Vary"):
+        if header in response.headers:
+            not_modified.headers[header] = response.headers[header]
+    return not_modified
+
+
+def apply_http_caching(response):
+    config = current_app.config
+    if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+
+    if request.url_rule is not None and response.status_code == 200:
+        cache_control = config["HTTP_CACHE_CONTROL"].get(request.url_rule.rule)
+        if cache_control and "Cache-Control" not in response.headers:
+            response.headers["Cache-Control"] = cache_control
+
+    body = response.get_data()
+    compressible = (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+    encoding = None
+    if compressible and len(body) >= config["HTTP_COMPRESSION_MIN_BYTES"]:
+        encoding = _choose_encoding()
+        response.vary.add("Accept-Encoding")
+
+    if request.method in ("GET", "HEAD") and response.status_code == 200 and config["HTTP_ETAGS_ENABLED"]:
+        # Strong validator of the representation actually sent: each content-coding gets its own tag
+        etag = _etag(body) + (f"-{encoding}" if encoding else "")
+        response.set_etag(etag)
+        if request.if_none_match.contains(etag):
+            return _not_modified(response)
+
+    if encoding:
+        response.set_data(_compress(body, encoding, config))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_http_caching(app):
+    app.after_request(apply_http_caching)
@@ -0,0 +1,53 @@
+import threading
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(label_key):
+    if not label_key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in label_key) + "}"
+
+
+# Per-process counters and gauges, exposed in Prometheus text format on /metrics.
+# With several workers, each one reports its own values (pid label on the scrape side).
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, labels=None):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def value(self, name, labels=None):
+        key = (name, _label_key(labels))
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def render(self):
+        with self._lock:
+            series = [(name, label_key, value, "counter") for (name, label_key), value in self._counters.items()]
+            series += [(name, label_key, value, "gauge") for (name, label_key), value in self._gauges.items()]
+        lines = []
+        described = set()
+        for name, label_key, value, kind in sorted(series, key=lambda s: (s[0], s[1])):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_format_labels(label_key)} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from datetime import datetime
+from bson.objectid import ObjectId
+
+from models.fields import (ModelError, json_object, naive_utc, object_id, optional_str, required_datetime,
+                           required_number, required_str)
+
+
+# Body of POST /log_activity, validated in one pass
+@dataclass(slots=True)
+class ActivityIn:
+    username: str
+    activity: str
+    start_time: datetime
+    end_time: datetime
+    duration_seconds: float
+    category: str = None
+
+    @classmethod
+    def from_json(cls, data):
+        data = json_object(data)
+        activity = cls(
+            required_str(data, "username"),
+            required_str(data, "activity"),
+            naive_utc(required_datetime(data, "start_time")),
+            naive_utc(required_datetime(data, "end_time")),
+            required_number(data, "duration_seconds"),
+            optional_str(data, "category")
+        )
+        if activity.end_time < activity.start_time:
+            raise ModelError("end_time", "antérieure à start_time")
+        return activity
+
+    def to_document(self, mongo_user_id, diary_id, category_id, activity_id=None):
+        doc = {
+            "user_id": object_id(mongo_user_id, "mongo_user_id"),
+            "diary_id": diary_id,
+            "activity": self.activity,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_seconds": self.duration_seconds,
+            "category_id": object_id(category_id, "category_id") if category_id else None,
+        }
+        if activity_id is not None:
+            doc["_id"] = activity_id
+        return doc
+
+
+# Row of GET /activities
+@dataclass(slots=True)
+class Activity:
+    _id: ObjectId
+    activity: str
+    start_time: datetime
+    end_time: datetime
+    duration_seconds: float
+    category_id: ObjectId = None
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(doc["_id"], doc.get("activity"), doc.get("start_time"), doc.get("end_time"),
+                   doc.get("duration_seconds"), doc.get("category_id"))
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone
+
+# How activities and responses are laid out on disk (DOCUMENT_ENCODING)
+FULL = "full"
+# Writes compact, reads both layouts while tools/migrate_compact.py rewrites old documents
+MIXED = "mixed"
+COMPACT = "compact"
+ENCODINGS = (FULL, MIXED, COMPACT)
+
+EPOCH = datetime(1970, 1, 1)
+LOGICAL_OPERATORS = ("$or", "$and", "$nor")
+LIST_OPERATORS = ("$in", "$nin", "$all")
+
+
+# Naive UTC datetime -> seconds since the epoch: an int (4 bytes until 2038) for whole seconds,
+# a float keeping Mongo's millisecond precision otherwise
+def encode_time(value):
+    if not isinstance(value, datetime):
+        return value
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - EPOCH
+    milliseconds = (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+    return milliseconds // 1000 if milliseconds % 1000 == 0 else milliseconds / 1000
+
+
+def decode_time(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return EPOCH + timedelta(milliseconds=round(value * 1000))
+    return value
+
+
+def _projected(projection, path):
+    if projection is None:
+        return True
+    included = [key for key, value in projection.items() if value and key != "_id"]
+    if not included:
+        return projection.get(path, 1) != 0
+    return any(path == key or path.startswith(key + ".") for key in included)
+
+
+# Long field name <-> short key mapping for one document shape. `encoders` convert values on
+# write, `query_encoders` inside filters (they must not create anything), `decoders` on read.
+# Fields equal to their default are left out and put back on read; `nested` maps an array
+# field to the schema of its elements; `dropped` fields are not stored at all.
+class CompactSchema:
+    def __init__(self, fields, encoders=None, query_encoders=None, decoders=None, defaults=None, nested=None,
+                 dropped=()):
+        self.fields = fields
+        self.long_names = {short: long for long, short in fields.items()}
+        self.encoders = encoders or {}
+        self.query_encoders = query_encoders if query_encoders is not None else self.encoders
+        self.decoders = decoders or {}
+        self.defaults = defaults or {}
+        self.nested = nested or {}
+        self.dropped = frozenset(dropped)
+
+    def encode_document(self, doc):
+        encoded = {}
+        for key, value in doc.items():
+            if key in self.dropped or (key in self.defaults and value == self.defaults[key]):
+                continue
+            if key in self.nested and isinstance(value, list):
+                value = [self.nested[key].encode_document(item) for item in value]
+            elif key in self.encoders:
+                value = self.encoders[key](value)
+            encoded[self.fields.get(key, key)] = value
+        return encoded
+
+    # Documents still in the full layout come back unchanged: only short keys are decoded
+    def decode_document(self, doc, projection=None, prefix=""):
+        decoded = {}
+        for key, value in doc.items():
+            long_name = self.long_names.get(key)
+            if long_name is None:
+                decoded[key] = value
+                continue
+            if long_name in self.nested and isinstance(value, list):
+                value = [self.nested[long_name].decode_document(item, projection, f"{prefix}{long_name}.")
+                         for item in value]
+            elif long_name in self.decoders:
+                value = self.decoders[long_name](value)
+            decoded[long_name] = value
+        if any(short in doc for short in self.long_names):
+            for key, default in self.defaults.items():
+                if key not in decoded and _projected(projection, prefix + key):
+                    decoded[key] = default
+        return decoded
+
+    def encode_path(self, path):
+        head, _, rest = path.partition(".")
+        short = self.fields.get(head, head)
+        if not rest:
+            return short
+        if head in self.nested:
+            return f"{short}.{self.nested[head].encode_path(rest)}"
+        return f"{short}.{rest}"
+
+    def _schema_for(self, path):
+        schema = self
+        *parents, field = path.split(".")
+        for parent in parents:
+            schema = schema.nested.get(parent)
+            if schema is None:
+                return None, field
+        return schema, field
+
+    def _encode_condition(self, path, condition):
+        schema, field = self._schema_for(path)
+        encoder = schema.query_encoders.get(field) if schema is not None else None
+        if encoder is None:
+            return condition
+        if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+            return {operator: [encoder(item) for item in operand] if operator in LIST_OPERATORS else encoder(operand)
+                    for operator, operand in condition.items()}
+        return encoder(condition)
+
+    def encode_query(self, query):
+        encoded = {}
+        for key, value in query.items():
+            if key in LOGICAL_OPERATORS:
+                encoded[key] = [self.encode_query(clause) for clause in value]
+            elif key.startswith("$"):
+                encoded[key] = value
+            else:
+                encoded[self.encode_path(key)] = self._encode_condition(key, value)
+        return encoded
+
+    def encode_projection(self, projection):
+        encoded = {}
+        for key, value in projection.items():
+            if isinstance(value, str) and value.startswith("$"):
+                value = "$" + self.encode_path(value[1:])
+            encoded[self.encode_path(key)] = value
+        return encoded
+
+    def encode_sort(self, sort):
+        return [(self.encode_path(field), direction) for field, direction in sort]
+
+    def encode_update(self, update):
+        encoded = {}
+        for operator, changes in update.items():
+            if operator == "$set":
+                encoded[operator] = {self.encode_path(key): self._encode_set(key, value) for key, value in changes.items()}
+            else:
+                encoded[operator] = {self.encode_path(key): value for key, value in changes.items()}
+        return encoded
+
+    def _encode_set(self, path, value):
+        schema, field = self._schema_for(path)
+        encoder = schema.encoders.get(field) if schema is not None else None
+        return encoder(value) if encoder is not None else value
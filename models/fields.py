@@ -0,0 +1,100 @@
+from datetime import datetime, timezone
+from bson.objectid import ObjectId
+
+
+# Raised by the from_json decoders; the message names the first offending field
+class ModelError(ValueError):
+    def __init__(self, field, reason="champ manquant"):
+        super().__init__(f"{field}: {reason}")
+        self.field = field
+
+
+def json_object(data):
+    if not isinstance(data, dict):
+        raise ModelError("body", "objet JSON attendu")
+    return data
+
+
+def required_str(data, field):
+    value = data.get(field)
+    if not value:
+        raise ModelError(field)
+    if not isinstance(value, str):
+        raise ModelError(field, "texte attendu")
+    return value
+
+
+def optional_str(data, field, default=None):
+    value = data.get(field)
+    if value is None or value == "":
+        return default
+    if not isinstance(value, str):
+        raise ModelError(field, "texte attendu")
+    return value
+
+
+def required_number(data, field):
+    value = data.get(field)
+    if value is None:
+        raise ModelError(field)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ModelError(field, "nombre attendu")
+    return value
+
+
+def optional_number(data, field, default=None):
+    return default if data.get(field) is None else required_number(data, field)
+
+
+def required_datetime(data, field):
+    value = required_str(data, field)
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ModelError(field, "date ISO 8601 attendue")
+
+
+def naive_utc(value):
+    # Mongo hands back naive UTC datetimes; payloads may carry an offset
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def object_id(value, field):
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except Exception:
+        raise ModelError(field, "identifiant invalide")
+
+
+def required_object_id(data, field):
+    value = data.get(field)
+    if not value:
+        raise ModelError(field)
+    return object_id(value, field)
+
+
+def optional_object_id(data, field):
+    value = data.get(field)
+    return object_id(value, field) if value else None
+
+
+def required_list(data, field):
+    value = data.get(field)
+    if not value:
+        raise ModelError(field)
+    if not isinstance(value, list):
+        raise ModelError(field, "liste attendue")
+    return value
+
+
+def optional_list(data, field):
+    value = data.get(field)
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ModelError(field, "liste attendue")
+    return value
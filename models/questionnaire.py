@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from bson.objectid import ObjectId
+
+from models.fields import (ModelError, json_object, object_id, optional_list, optional_number, optional_object_id,
+                           optional_str, required_list, required_str)
+
+
+@dataclass(slots=True)
+class QuestionIn:
+    text: str
+    type: str
+    propositions: list
+    order: int = 1
+    points: float = 1
+
+    @classmethod
+    def from_json(cls, data, index=0):
+        if not isinstance(data, dict):
+            raise ModelError(f"questions[{index}]", "objet attendu")
+        return cls(
+            required_str(data, "text"),
+            required_str(data, "type"),
+            optional_list(data, "propositions"),
+            optional_number(data, "order", 1),
+            optional_number(data, "points", 1)
+        )
+
+    def to_document(self, questionnaire_id, now):
+        return {
+            "questionnaire_id": object_id(questionnaire_id, "questionnaire_id"),
+            "text": self.text,
+            "type": self.type,
+            "propositions": self.propositions,
+            "order": self.order,
+            "points": self.points,
+            "created_at": now
+        }
+
+
+# Body of questionnaire creation and update
+@dataclass(slots=True)
+class QuestionnaireIn:
+    title: str
+    description: str
+    category: str
+    activity_id: ObjectId
+    filieres: list
+    years: list
+    questions: list
+
+    @classmethod
+    def from_json(cls, data):
+        data = json_object(data)
+        return cls(
+            required_str(data, "title"),
+            optional_str(data, "description", ""),
+            optional_str(data, "category", "Autre"),
+            optional_object_id(data, "activity_id"),
+            required_list(data, "filieres"),
+            required_list(data, "years"),
+            [QuestionIn.from_json(q, i) for i, q in enumerate(optional_list(data, "questions"))]
+        )
+
+    def to_document(self, now):
+        return {
+            "title": self.title,
+            "description": self.description,
+            "category": self.category,
+            "activity_id": self.activity_id,
+            "filieres": self.filieres,
+            "years": self.years,
+            "updated_at": now
+        }
+
+
+# Only what grading needs: the ids of the correct propositions, as projected by GRADING_PROJECTION
+# (repositories/question_repository.py)
+@dataclass(slots=True)
+class Question:
+    _id: ObjectId
+    type: str
+    points: float
+    correct_ids: tuple
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(doc["_id"], doc.get("type"), doc.get("points") or 0, tuple(doc.get("correct_ids") or ()))
+
+    def grade(self, answer):
+        is_correct = False
+        if self.type == "multiple_choice" and answer.selected_proposition_id:
+            is_correct = answer.selected_proposition_id in self.correct_ids
+        return {
+            "question_id": self._id,
+            "selected_proposition_id": answer.selected_proposition_id,
+            "answer_text": answer.answer_text,
+            "is_correct": is_correct
+        }
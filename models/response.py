@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from datetime import datetime
+from bson.objectid import ObjectId
+
+from models.fields import (ModelError, json_object, optional_number, optional_str, required_list,
+                           required_object_id)
+
+# Proposition ids are scalars; anything else could never match and is not hashable
+PROPOSITION_ID_TYPES = (str, int, float)
+
+
+@dataclass(slots=True)
+class AnswerIn:
+    question_id: ObjectId
+    selected_proposition_id: object = None
+    answer_text: str = None
+
+    @classmethod
+    def from_json(cls, data, index=0):
+        if not isinstance(data, dict):
+            raise ModelError(f"responses[{index}]", "objet attendu")
+        selected_proposition_id = data.get("selected_proposition_id")
+        if selected_proposition_id is not None and not isinstance(selected_proposition_id, PROPOSITION_ID_TYPES):
+            raise ModelError(f"responses[{index}].selected_proposition_id", "identifiant attendu")
+        return cls(required_object_id(data, "question_id"), selected_proposition_id, data.get("answer_text"))
+
+
+# Body of POST /submit_questionnaire_response
+@dataclass(slots=True)
+class SubmissionIn:
+    questionnaire_id: ObjectId
+    user_id: ObjectId
+    answers: list
+    duration_seconds: float = None
+    feedback: str = ""
+
+    @classmethod
+    def from_json(cls, data):
+        data = json_object(data)
+        return cls(
+            required_object_id(data, "questionnaire_id"),
+            required_object_id(data, "mongo_user_id"),
+            [AnswerIn.from_json(r, i) for i, r in enumerate(required_list(data, "responses"))],
+            optional_number(data, "duration_seconds"),
+            optional_str(data, "feedback", "")
+        )
+
+    def question_ids(self):
+        return [answer.question_id for answer in self.answers]
+
+    def to_document(self, graded_answers):
+        return {
+            "questionnaire_id": self.questionnaire_id,
+            "user_id": self.user_id,
+            "responses": graded_answers,
+            "duration_seconds": self.duration_seconds,
+            "feedback": self.feedback,
+            "completed_at": datetime.utcnow()
+        }
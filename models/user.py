@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+# Firestore profile fields copied to users_objects.profile (never the password or login tokens)
+PROFILE_FIELDS = ("role", "email_address", "gender", "studies", "year", "semester", "age", "created_at")
+
+
+def user_targets(user_data):
+    studies = user_data.get("studies", "")
+    user_filieres = [f.strip() for f in studies.split(",") if f.strip()] if isinstance(studies, str) else []
+
+    user_year = user_data.get("year", "")
+    user_years = [str(user_year)] if user_year else []
+    return user_filieres, user_years
+
+
+# Mirror of a Firestore profile as stored in Mongo, with the targeting fields cohort queries filter on
+def profile_mirror(user_data):
+    profile = {field: user_data[field] for field in PROFILE_FIELDS if field in user_data}
+    created_at = profile.pop("created_at", None)
+    # Not set yet while it is the SERVER_TIMESTAMP sentinel; the next reconcile fills it in
+    if isinstance(created_at, datetime):
+        # Stored as Mongo gives it back (naive UTC, milliseconds) so reconciling compares equal
+        if created_at.tzinfo:
+            created_at = created_at.astimezone(timezone.utc)
+        profile["created_at"] = datetime(created_at.year, created_at.month, created_at.day, created_at.hour,
+                                         created_at.minute, created_at.second, created_at.microsecond // 1000 * 1000)
+    profile["filieres"], profile["years"] = user_targets(user_data)
+    return profile
+
+
+# Firestore profile reduced to what targeting and scoring read
+@dataclass(slots=True)
+class UserProfile:
+    pseudonym: str
+    role: str
+    filieres: list
+    years: list
+
+    @classmethod
+    def from_firestore(cls, user_data):
+        filieres, years = user_targets(user_data)
+        return cls(user_data.get("pseudonym"), user_data.get("role", "student"), filieres, years)
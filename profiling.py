@@ -0,0 +1,263 @@
+import glob
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, g, request
+
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+TOP_ALLOCATIONS = 10
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# Statistical profile of one request: a helper thread reads the request thread's stack
+# every `interval` seconds, so the request itself runs uninstrumented.
+class _Capture:
+    def __init__(self, capture_id, route, interval, trace_allocations):
+        self.capture_id = capture_id
+        self.route = route
+        self.interval = interval
+        self.trace_allocations = trace_allocations
+        self.thread_id = threading.get_ident()
+        self.stacks = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._owns_tracemalloc = False
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+
+    def start(self):
+        if self.trace_allocations:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self._sampler.start()
+
+    def _sample(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks.append(tuple(stack))
+            self.weights.append((now - last) * 1000)
+            last = now
+
+    def stop(self, status):
+        self._stop.set()
+        self._sampler.join()
+        result = {
+            "id": self.capture_id,
+            "route": self.route,
+            "method": request.method,
+            "path": request.path,
+            "status": status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "interval_ms": self.interval * 1000,
+            "samples": len(self.stacks),
+            "pid": os.getpid(),
+        }
+        if self.trace_allocations:
+            _, peak = tracemalloc.get_traced_memory()
+            result["memory_peak_kb"] = round((peak - self.memory_start) / 1024, 1)
+            # Allocations still alive when the request ends (the peak itself is only a number)
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)])
+            statistics = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+            result["live_allocations"] = [
+                {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in statistics
+            ]
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+        return result
+
+    def collapsed(self):
+        counts = {}
+        for stack, weight in zip(self.stacks, self.weights):
+            counts[stack] = counts.get(stack, 0) + weight
+        # Weights are in microseconds so flame graph tools keep integer counts
+        return "".join(f"{';'.join(stack)} {round(weight * 1000)}\n" for stack, weight in counts.items())
+
+    def speedscope(self, meta):
+        frame_index = {}
+        samples = []
+        for stack in self.stacks:
+            samples.append([frame_index.setdefault(name, len(frame_index)) for name in stack])
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": f"{meta['method']} {meta['path']}",
+            "exporter": "activity-tracker-backend",
+            "shared": {"frames": [{"name": name} for name in frame_index]},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{meta['method']} {meta['path']} ({meta['status']})",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": meta["duration_ms"],
+                "samples": samples,
+                "weights": [round(weight, 3) for weight in self.weights],
+            }],
+        }
+
+
+# Captures profiles for requests carrying the admin token header or falling in the sampled
+# fraction. One capture runs at a time per worker: tracemalloc is process-wide, and a second
+# request profiled concurrently would only add noise.
+class RequestProfiler:
+    def __init__(self, directory, token=None, sample_rate=0.0, interval_ms=5, trace_allocations=True,
+                 max_captures=50, metrics=None):
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.trace_allocations = trace_allocations
+        self.max_captures = max_captures
+        self.metrics = metrics
+        self._busy = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if metrics is not None:
+            metrics.describe("profiles_captured_total", "Request profiles written, by trigger")
+
+    def is_admin(self, headers):
+        supplied = headers.get(PROFILE_HEADER)
+        return bool(self.token and supplied and hmac.compare_digest(supplied, self.token))
+
+    def trigger(self, headers):
+        if self.is_admin(headers):
+            return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def start(self, route, trigger):
+        if not self._busy.acquire(blocking=False):
+            return None
+        capture = _Capture(f"{int(time.time())}-{uuid.uuid4().hex[:8]}", route, self.interval,
+                           self.trace_allocations)
+        capture.trigger = trigger
+        try:
+            capture.start()
+        except Exception:
+            self._busy.release()
+            raise
+        return capture
+
+    def finish(self, capture, status):
+        try:
+            meta = capture.stop(status)
+            meta["trigger"] = capture.trigger
+            base = os.path.join(self.directory, capture.capture_id)
+            with open(base + ".collapsed", "w", encoding="utf-8") as collapsed_file:
+                collapsed_file.write(capture.collapsed())
+            with open(base + ".speedscope.json", "w", encoding="utf-8") as speedscope_file:
+                json.dump(capture.speedscope(meta), speedscope_file)
+            # Written last: a capture is listed only once its files are complete
+            with open(base + ".meta.json", "w", encoding="utf-8") as meta_file:
+                json.dump(meta, meta_file, ensure_ascii=False)
+        finally:
+            self._busy.release()
+        if self.metrics is not None:
+            self.metrics.inc("profiles_captured_total", {"trigger": capture.trigger})
+        self._prune()
+        return meta
+
+    # Capture ids start with their timestamp, so names sort newest first
+    def _meta_files(self):
+        return sorted(glob.glob(os.path.join(self.directory, "*.meta.json")), reverse=True)
+
+    def _prune(self):
+        for meta_path in self._meta_files()[self.max_captures:]:
+            base = meta_path[:-len(".meta.json")]
+            for suffix in (".meta.json", ".collapsed", ".speedscope.json"):
+                try:
+                    os.remove(base + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def list_captures(self, limit=50):
+        captures = []
+        for meta_path in self._meta_files()[:limit]:
+            try:
+                with open(meta_path, encoding="utf-8") as meta_file:
+                    meta = json.load(meta_file)
+            except (OSError, ValueError):
+                continue
+            meta.pop("live_allocations", None)
+            captures.append(meta)
+        return captures
+
+    # Returns the file path of a capture, or None. The id must name an existing capture, so the
+    # endpoint cannot be used to read arbitrary files
+    def capture_path(self, capture_id, fmt):
+        suffix = {"collapsed": ".collapsed", "speedscope": ".speedscope.json", "meta": ".meta.json"}.get(fmt)
+        path = os.path.join(self.directory, capture_id + ".meta.json")
+        if suffix is None or os.path.basename(capture_id) != capture_id or not os.path.exists(path):
+            return None
+        return os.path.join(self.directory, capture_id + suffix)
+
+
+def start_profiling():
+    if request.url_rule is None or request.url_rule.rule.startswith("/admin/profiles"):
+        return None
+    profiler = current_app.extensions["container"].profiler
+    trigger = profiler.trigger(request.headers)
+    if trigger:
+        capture = profiler.start(request.url_rule.rule, trigger)
+        if capture is not None:
+            g.profile_capture = capture
+    return None
+
+
+def tag_profiled_response(response):
+    capture = g.get("profile_capture")
+    if capture is not None:
+        response.headers[PROFILE_ID_HEADER] = capture.capture_id
+        g.profile_status = response.status_code
+    return response
+
+
+def finish_profiling(error=None):
+    capture = g.pop("profile_capture", None)
+    if capture is None:
+        return
+    try:
+        current_app.extensions["container"].profiler.finish(capture, g.get("profile_status", 500))
+    except Exception as e:
+        print(f"DEBUG: Writing profile {capture.capture_id} failed: {str(e)}")
+
+
+def profiling_enabled(config):
+    return bool(config["PROFILING_TOKEN"] or config["PROFILING_SAMPLE_RATE"] > 0)
+
+
+# Nothing is registered when profiling is off, so disabled requests pay nothing
+def init_profiling(app):
+    if profiling_enabled(app.config):
+        app.before_request(start_profiling)
+        app.after_request(tag_profiled_response)
+        app.teardown_request(finish_profiling)
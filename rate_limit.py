@@ -0,0 +1,115 @@
+import math
+import threading
+import time
+
+from flask import current_app, jsonify, request
+
+MEMORY = "memory"
+MONGO = "mongo"
+
+# capacity = burst size, refill_per_second = sustained rate. `key` is the JSON body field
+# identifying the caller; requests without it are keyed by client address.
+DEFAULT_RATE_LIMITS = {
+    "/login": {"capacity": 5, "refill_per_second": 5 / 60, "key": "username"},
+    "/google-login": {"capacity": 5, "refill_per_second": 5 / 60},
+    "/forgot_password": {"capacity": 3, "refill_per_second": 3 / 600, "key": "username"},
+    "/log_activity": {"capacity": 30, "refill_per_second": 1, "key": "username"},
+    "/submit_questionnaire_response": {"capacity": 10, "refill_per_second": 10 / 60, "key": "mongo_user_id"},
+    "/sync": {"capacity": 10, "refill_per_second": 10 / 60, "key": "mongo_user_id"},
+}
+
+
+class MemoryBucketStore:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        # Drop buckets idle long enough to be full again; they carry no state
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[2] < bucket[3]
+        }
+
+    def take(self, key, capacity, refill_per_second):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, refill_per_second, capacity)
+        return allowed, tokens
+
+
+class RateLimiter:
+    def __init__(self, store, limits, metrics=None):
+        self.store = store
+        self.limits = limits
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.describe("rate_limit_requests_total", "Requests checked by the rate limiter, by route and outcome")
+            metrics.describe("rate_limit_backend_errors_total", "Limiter backend failures (requests let through)")
+
+    def _count(self, name, route, outcome=None):
+        if self.metrics is not None:
+            labels = {"route": route}
+            if outcome:
+                labels["outcome"] = outcome
+            self.metrics.inc(name, labels)
+
+    # Returns None when the request may proceed, else the number of seconds to wait
+    def check(self, route, identity):
+        limit = self.limits.get(route)
+        if limit is None:
+            return None
+        try:
+            allowed, tokens = self.store.take(f"{route}:{identity}", limit["capacity"], limit["refill_per_second"])
+        except Exception as e:
+            # Fail open: a limiter outage must not take the API down with it
+            print(f"DEBUG: Rate limiter backend error: {str(e)}")
+            self._count("rate_limit_backend_errors_total", route)
+            return None
+        if allowed:
+            self._count("rate_limit_requests_total", route, "allowed")
+            return None
+        self._count("rate_limit_requests_total", route, "rejected")
+        return max(1, math.ceil((1 - tokens) / limit["refill_per_second"]))
+
+
+def _identity(limit):
+    key_field = limit.get("key")
+    if key_field:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and data.get(key_field):
+            return f"{key_field}={data[key_field]}"
+    return f"addr={request.remote_addr}"
+
+
+def enforce_rate_limit():
+    if request.url_rule is None or request.method == "OPTIONS":
+        return None
+    route = request.url_rule.rule
+    limiter = current_app.extensions["container"].rate_limiter
+    limit = limiter.limits.get(route)
+    if limit is None:
+        return None
+    retry_after = limiter.check(route, _identity(limit))
+    if retry_after is None:
+        return None
+    response = jsonify({"message": "Trop de requêtes, réessayez plus tard", "retry_after": retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def init_rate_limiting(app):
+    if app.config["RATE_LIMIT_ENABLED"]:
+        app.before_request(enforce_rate_limit)
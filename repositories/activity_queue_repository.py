@@ -0,0 +1,112 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+DEAD = "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS activity_queue_ready ON activity_queue (state, next_attempt_at);
+"""
+
+
+# Local durable queue for /log_activity in queued mode. SQLite in WAL mode with
+# synchronous=FULL: an enqueue returns once the row is fsynced, and several worker
+# processes on the same host can share the file.
+class ActivityQueueRepository:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=FULL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    # Returns False when the key is already queued (client retry), True otherwise
+    def enqueue(self, idempotency_key, payload):
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO activity_queue (idempotency_key, payload, created_at) VALUES (?, ?, ?)",
+            (idempotency_key, json.dumps(payload, ensure_ascii=False), time.time())
+        )
+        return cursor.rowcount == 1
+
+    # Leases up to `limit` ready rows so concurrent drainers never take the same one
+    def claim_batch(self, limit, lease_seconds):
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                "SELECT id, idempotency_key, payload, attempts FROM activity_queue "
+                "WHERE state = ? AND next_attempt_at <= ? AND lease_until <= ? ORDER BY id LIMIT ?",
+                (PENDING, now, now, limit)
+            ).fetchall()
+            if rows:
+                connection.executemany("UPDATE activity_queue SET lease_until = ? WHERE id = ?",
+                                       [(now + lease_seconds, row[0]) for row in rows])
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return [{"id": row[0], "idempotency_key": row[1], "payload": json.loads(row[2]), "attempts": row[3]}
+                for row in rows]
+
+    def delete(self, entry_ids):
+        if entry_ids:
+            self._connection().executemany("DELETE FROM activity_queue WHERE id = ?", [(i,) for i in entry_ids])
+
+    def retry_later(self, entry_id, delay_seconds, error):
+        self._connection().execute(
+            "UPDATE activity_queue SET attempts = attempts + 1, next_attempt_at = ?, lease_until = 0, "
+            "last_error = ? WHERE id = ?",
+            (time.time() + delay_seconds, error, entry_id)
+        )
+
+    def mark_dead(self, entry_id, error):
+        self._connection().execute(
+            "UPDATE activity_queue SET state = ?, attempts = attempts + 1, lease_until = 0, last_error = ? "
+            "WHERE id = ?",
+            (DEAD, error, entry_id)
+        )
+
+    def requeue_dead(self):
+        return self._connection().execute(
+            "UPDATE activity_queue SET state = ?, next_attempt_at = 0 WHERE state = ?", (PENDING, DEAD)
+        ).rowcount
+
+    def stats(self):
+        rows = self._connection().execute(
+            "SELECT state, COUNT(*), MIN(created_at) FROM activity_queue GROUP BY state").fetchall()
+        return {state: {"count": count, "oldest_age_seconds": round(time.time() - oldest, 1)}
+                for state, count, oldest in rows}
+
+    def get_dead(self, limit=100):
+        rows = self._connection().execute(
+            "SELECT idempotency_key, payload, attempts, last_error FROM activity_queue WHERE state = ? "
+            "ORDER BY id LIMIT ?", (DEAD, limit)).fetchall()
+        return [{"idempotency_key": key, "payload": json.loads(payload), "attempts": attempts, "error": error}
+                for key, payload, attempts, error in rows]
@@ -1,21 +1,320 @@
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+
+import unit_of_work
+from models.activity import Activity
+from models.compact import COMPACT, ENCODINGS, FULL, MIXED, CompactSchema, decode_time, encode_time
+
+CLASSIC = "classic"
+TIMESERIES = "timeseries"
+# Writes go to the time-series collection, reads merge both while a migration is running
+DUAL = "dual"
+STORAGE_MODES = (CLASSIC, TIMESERIES, DUAL)
+
+TIMESERIES_COLLECTION = "activities_ts"
+TIMESERIES_OPTIONS = {"timeField": "start_time", "metaField": "meta", "granularity": "hours"}
+META_FIELDS = ("user_id", "category_id")
+
+# Shape returned to the API; serialised as-is by the JSON provider
+ACTIVITY_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "activity": 1,
+    "start_time": 1,
+    "end_time": 1,
+    "duration": "$duration_seconds"
+}
+
+
+ACTIVITY_PAGE_PROJECTION = {
+    "activity": 1,
+    "start_time": 1,
+    "end_time": 1,
+    "duration_seconds": 1,
+    "category_id": 1
+}
+ACTIVITY_PAGE_SORT = [("start_time", ASCENDING), ("_id", ASCENDING)]
+
+# Compact layout (models/compact.py). user_id keeps its name: cascades, sweeps and watermarks
+# filter on it. diary_id is never read back and is not stored.
+COMPACT_ACTIVITY_FIELDS = {
+    "activity": "a",
+    "start_time": "s",
+    "end_time": "e",
+    "duration_seconds": "d",
+    "category_id": "c",
+    "overlaps_with": "o",
+    "merged_from": "m",
+}
+ACTIVITY_NAMES = "activity"
+CATEGORIES = "category"
+
+
+def activity_range_query(user_id, start, end, category_id=None, after=None):
+    query = {"user_id": user_id, "start_time": {"$gte": start, "$lt": end}}
+    if category_id is not None:
+        query["category_id"] = category_id
+    if after is not None:
+        # Keyset pagination: resume strictly after the last (start_time, _id) of the previous page
+        after_start, after_id = after
+        query["$or"] = [
+            {"start_time": {"$gt": after_start}},
+            {"start_time": after_start, "_id": {"$gt": after_id}}
+        ]
+    return query
+
+
+def to_timeseries_doc(activity_doc):
+    doc = {key: value for key, value in activity_doc.items() if key not in META_FIELDS}
+    doc["meta"] = {field: activity_doc.get(field) for field in META_FIELDS}
+    return doc
+
+
+def to_timeseries_filter(query):
+    return {f"meta.{key}" if key in META_FIELDS else key: value for key, value in query.items()}
+
+
+# Meta fields are read back under their top-level name, as in the classic layout
+def to_timeseries_projection(projection):
+    return {key: f"$meta.{key}" if key in META_FIELDS and value == 1 else value for key, value in projection.items()}
+
+
+def merge_dual_reads(timeseries_docs, classic_docs, projection, sort=None):
+    # Migrated documents keep their _id, so the same activity can sit in both collections
+    seen_ids = {doc["_id"] for doc in timeseries_docs}
+    merged = timeseries_docs + [doc for doc in classic_docs if doc["_id"] not in seen_ids]
+    if sort and classic_docs:
+        for field, direction in reversed(sort):
+            merged.sort(key=lambda doc: doc.get(field), reverse=direction < 0)
+    if projection.get("_id") == 0:
+        for doc in merged:
+            del doc["_id"]
+    return merged
+
+
+def _with_id(projection):
+    return {**projection, "_id": 1}
+
+
+# Activity names and category ids are stored as dictionary codes
+def compact_activity_schema(dictionary_repository):
+    def category_filter(category_id):
+        code = dictionary_repository.find_code(CATEGORIES, category_id)
+        # A category never stored matches no activity
+        return -1 if code is None else code
+
+    return CompactSchema(
+        COMPACT_ACTIVITY_FIELDS,
+        encoders={
+            "activity": lambda name: dictionary_repository.code(ACTIVITY_NAMES, name),
+            "start_time": encode_time,
+            "end_time": encode_time,
+            "category_id": lambda category_id: dictionary_repository.code(CATEGORIES, category_id),
+        },
+        query_encoders={"start_time": encode_time, "end_time": encode_time, "category_id": category_filter},
+        decoders={
+            "activity": lambda code: dictionary_repository.value(ACTIVITY_NAMES, code),
+            "start_time": decode_time,
+            "end_time": decode_time,
+            "category_id": lambda code: dictionary_repository.value(CATEGORIES, code),
+        },
+        defaults={"category_id": None},
+        dropped=("diary_id",),
+    )
+
 
 class ActivityRepository:
-    def __init__(self, mongo_db):
+    def __init__(self, mongo_db, storage_mode=CLASSIC, analytics_read_preference=None, encoding=FULL,
+                 dictionary_repository=None):
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown activity storage mode: {storage_mode}")
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown document encoding: {encoding}")
+        # Time-series buckets are already stored column-wise and compressed
+        if encoding != FULL and storage_mode != CLASSIC:
+            raise ValueError("The compact encoding requires the classic storage mode")
+        self.storage_mode = storage_mode
+        self.encoding = encoding
+        self.compact_schema = compact_activity_schema(dictionary_repository) if encoding != FULL else None
         self.activities_collection = mongo_db["activities"]
+        self.timeseries_collection = mongo_db[TIMESERIES_COLLECTION]
+        # (classic, time-series) pairs: student reads see their own writes, admin reports may lag
+        self.primary_collections = (self.activities_collection, self.timeseries_collection)
+        self.analytics_collections = tuple(
+            collection.with_options(read_preference=analytics_read_preference)
+            for collection in self.primary_collections
+        ) if analytics_read_preference else self.primary_collections
+        # Per-user version, bumped on every activity write: the data watermark of cached aggregates
+        self.watermarks_collection = mongo_db["activity_watermarks"]
+
+    def ensure_timeseries_collection(self):
+        try:
+            self.activities_collection.database.create_collection(TIMESERIES_COLLECTION, timeseries=TIMESERIES_OPTIONS)
+        except CollectionInvalid:
+            pass
+
+    def ensure_indexes(self):
+        for start, end in self._time_fields():
+            self.activities_collection.create_index([("user_id", ASCENDING), (start, ASCENDING), ("_id", ASCENDING)])
+            # Warms the per-user overlap index (services/activity_overlap.py)
+            self.activities_collection.create_index([("user_id", ASCENDING), (start, ASCENDING), (end, ASCENDING)])
+        if self.storage_mode != CLASSIC:
+            self.ensure_timeseries_collection()
+            self.timeseries_collection.create_index([("meta.user_id", ASCENDING), ("start_time", ASCENDING)])
+
+    # (start, end) field names of the layouts present in `activities`
+    def _time_fields(self):
+        fields = []
+        if self.encoding != COMPACT:
+            fields.append(("start_time", "end_time"))
+        if self.encoding != FULL:
+            fields.append((COMPACT_ACTIVITY_FIELDS["start_time"], COMPACT_ACTIVITY_FIELDS["end_time"]))
+        return fields
+
+    def _stored(self, activity_doc):
+        if self.storage_mode != CLASSIC:
+            return to_timeseries_doc(activity_doc)
+        return activity_doc if self.encoding == FULL else self.compact_schema.encode_document(activity_doc)
+
+    # Returns False when an activity with the same preset _id (idempotent replay) already exists.
+    # `replay` says the _id comes from an idempotency key; a fresh _id cannot already be stored.
+    def log_activity(self, activity_doc, replay=False):
+        if self.storage_mode == CLASSIC and unit_of_work.current() is None:
+            try:
+                self.activities_collection.insert_one(self._stored(activity_doc))
+            except DuplicateKeyError:
+                return False
+        else:
+            # Time-series collections do not enforce _id uniqueness: look the replay up first.
+            # In classic mode a queued duplicate fails on the unique _id index at flush.
+            if replay and self.storage_mode != CLASSIC and self.timeseries_collection.find_one(
+                    self._replay_lookup(activity_doc), {"_id": 1}):
+                return False
+            collection = self.activities_collection if self.storage_mode == CLASSIC else self.timeseries_collection
+            # MongoDB refuses time-series writes inside a multi-document transaction
+            unit_of_work.insert(collection, self._stored(activity_doc),
+                                transactional=self.storage_mode == CLASSIC)
+        self.bump_watermark(activity_doc["user_id"])
+        return True
+
+    # Time-series collections have no _id index: narrow the lookup to the (meta.user_id, start_time) one
+    @staticmethod
+    def _replay_lookup(activity_doc):
+        return {"meta.user_id": activity_doc["user_id"], "start_time": activity_doc["start_time"],
+                "_id": activity_doc["_id"]}
+
+    def bump_watermark(self, user_id):
+        unit_of_work.update(self.watermarks_collection, {"_id": user_id}, {"$inc": {"version": 1}}, upsert=True)
+
+    def get_watermarks(self, user_ids):
+        return {doc["_id"]: doc["version"]
+                for doc in self.watermarks_collection.find({"_id": {"$in": list(user_ids)}})}
+
+    def _find(self, query, projection, sort=None, limit=0, analytics=False):
+        activities_collection, timeseries_collection = \
+            self.analytics_collections if analytics else self.primary_collections
+        if self.storage_mode == CLASSIC:
+            return self._find_classic(activities_collection, query, projection, sort, limit)
 
-    def log_activity(self, activity_doc):
-        self.activities_collection.insert_one(activity_doc)
+        cursor = timeseries_collection.find(to_timeseries_filter(query), to_timeseries_projection(_with_id(projection)),
+                                            limit=limit)
+        timeseries_docs = list(cursor.sort(sort) if sort else cursor)
+        classic_docs = []
+        if self.storage_mode == DUAL:
+            cursor = activities_collection.find(query, _with_id(projection), limit=limit)
+            classic_docs = list(cursor.sort(sort) if sort else cursor)
+        docs = merge_dual_reads(timeseries_docs, classic_docs, projection, sort)
+        return docs[:limit] if limit else docs
 
+    def _find_classic(self, collection, query, projection, sort, limit):
+        if self.encoding == FULL:
+            cursor = collection.find(query, projection, limit=limit)
+            return list(cursor.sort(sort) if sort else cursor)
+
+        schema = self.compact_schema
+        compact_query = schema.encode_query(query)
+        full_docs = []
+        if self.encoding == MIXED:
+            # Both layouts share the collection: each query is narrowed to its own
+            cursor = collection.find({"$and": [query, {"start_time": {"$exists": True}}]}, _with_id(projection),
+                                     limit=limit)
+            full_docs = list(cursor.sort(sort) if sort else cursor)
+            compact_query = {"$and": [compact_query, {COMPACT_ACTIVITY_FIELDS["start_time"]: {"$exists": True}}]}
+        cursor = collection.find(compact_query, schema.encode_projection(_with_id(projection)), limit=limit)
+        compact_docs = [schema.decode_document(doc, projection)
+                        for doc in (cursor.sort(schema.encode_sort(sort)) if sort else cursor)]
+        docs = merge_dual_reads(compact_docs, full_docs, projection, sort)
+        return docs[:limit] if limit else docs
+
+    # Queued in the request's unit of work like inserts, so a failed flush leaves nothing half-done
+    def _update_activity(self, activity_id, update):
+        if self.encoding == FULL:
+            unit_of_work.update(self.activities_collection, {"_id": activity_id}, update)
+        elif self.encoding == COMPACT:
+            unit_of_work.update(self.activities_collection, {"_id": activity_id},
+                                self.compact_schema.encode_update(update))
+        else:
+            unit_of_work.bulk_write(self.activities_collection, [
+                UpdateOne({"_id": activity_id, "start_time": {"$exists": True}}, update),
+                UpdateOne({"_id": activity_id, COMPACT_ACTIVITY_FIELDS["start_time"]: {"$exists": True}},
+                          self.compact_schema.encode_update(update)),
+            ])
+
+    # (start, end, _id) of every activity of a user, for overlap detection
+    def get_intervals(self, user_id):
+        docs = self._find({"user_id": user_id}, {"start_time": 1, "end_time": 1})
+        return [(doc["start_time"], doc["end_time"], doc["_id"]) for doc in docs
+                if doc.get("start_time") and doc.get("end_time")]
+
+    def get_activity_user_ids(self):
+        user_ids = set()
+        if self.storage_mode != TIMESERIES:
+            user_ids.update(self.activities_collection.distinct("user_id"))
+        if self.storage_mode != CLASSIC:
+            user_ids.update(self.timeseries_collection.distinct("meta.user_id"))
+        return user_ids
+
+    # Time-series measurements cannot have their time field rewritten, so merging and flagging
+    # existing activities is only available in classic mode
+    def merge_activities(self, user_id, keep_id, start, end, remove_ids):
+        if self.storage_mode != CLASSIC:
+            raise ValueError("Merging activities requires the classic storage mode")
+        self._update_activity(keep_id, {
+            "$set": {"start_time": start, "end_time": end,
+                     "duration_seconds": int((end - start).total_seconds())},
+            "$addToSet": {"merged_from": {"$each": list(remove_ids)}}
+        })
+        if remove_ids:
+            unit_of_work.delete(self.activities_collection, {"_id": {"$in": list(remove_ids)}})
+        self.bump_watermark(user_id)
+
+    def flag_overlaps(self, activity_id, overlapping_ids):
+        if self.storage_mode != CLASSIC:
+            raise ValueError("Flagging activities requires the classic storage mode")
+        self._update_activity(activity_id, {"$set": {"overlaps_with": list(overlapping_ids)}})
+
+    # Start, end and category of the activities of `user_ids` touching [start, end), for heatmaps.
+    # Activities are looked up from max_span before `start` so one that began earlier still counts.
+    def get_heatmap_rows(self, user_ids, start, end, max_span, analytics=False):
+        query = {"user_id": {"$in": list(user_ids)}, "start_time": {"$gte": start - max_span, "$lt": end}}
+        docs = self._find(query, {"_id": 0, "start_time": 1, "end_time": 1, "category_id": 1}, analytics=analytics)
+        return [(doc["start_time"], doc["end_time"], doc.get("category_id"))
+                for doc in docs if doc.get("start_time") and doc.get("end_time")]
+
+    # Admin report (/admin/etudiants_activites)
     def get_activities_by_user(self, user_id):
-        activities = list(self.activities_collection.find({"user_id": user_id}))
-        print(activities)
-        print(("-----------------------------------"))
-        return [
-            {
-                "activity": act.get("activity"),
-                "start_time": act.get("start_time").isoformat(),
-                "end_time": act.get("end_time").isoformat(),
-                "duration": act.get("duration_seconds")
-            }
-            for act in activities
-        ]
\ No newline at end of file
+        return self._find({"user_id": user_id}, ACTIVITY_SUMMARY_PROJECTION, analytics=True)
+
+    # Same report for many users at once: {user_id: [activity summary]}
+    def get_activities_by_users(self, user_ids):
+        docs = self._find({"user_id": {"$in": list(user_ids)}}, {**ACTIVITY_SUMMARY_PROJECTION, "user_id": 1},
+                          analytics=True)
+        activities = {}
+        for doc in docs:
+            activities.setdefault(doc.pop("user_id"), []).append(doc)
+        return activities
+
+    # Returns up to `limit` activities plus whether another page follows
+    def get_activities_page(self, user_id, start, end, category_id=None, after=None, limit=50):
+        docs = self._find(activity_range_query(user_id, start, end, category_id, after),
+                          ACTIVITY_PAGE_PROJECTION, sort=ACTIVITY_PAGE_SORT, limit=limit + 1)
+        return [Activity.from_document(doc) for doc in docs[:limit]], len(docs) > limit
@@ -0,0 +1,101 @@
+import asyncio
+from models.activity import Activity
+from repositories.activity_repository import (
+    ACTIVITY_PAGE_PROJECTION, ACTIVITY_PAGE_SORT, ACTIVITY_SUMMARY_PROJECTION, CLASSIC, DUAL, STORAGE_MODES,
+    TIMESERIES_COLLECTION, activity_range_query, merge_dual_reads, to_timeseries_doc, to_timeseries_filter,
+    to_timeseries_projection
+)
+
+class AsyncActivityRepository:
+    def __init__(self, mongo_db, storage_mode=CLASSIC):
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown activity storage mode: {storage_mode}")
+        self.storage_mode = storage_mode
+        self.activities_collection = mongo_db["activities"]
+        self.timeseries_collection = mongo_db[TIMESERIES_COLLECTION]
+        self.watermarks_collection = mongo_db["activity_watermarks"]
+
+    async def log_activity(self, activity_doc):
+        if self.storage_mode == CLASSIC:
+            await self.activities_collection.insert_one(activity_doc)
+        else:
+            await self.timeseries_collection.insert_one(to_timeseries_doc(activity_doc))
+        # Same heatmap watermark as ActivityRepository
+        await self.bump_watermark(activity_doc["user_id"])
+
+    async def bump_watermark(self, user_id):
+        await self.watermarks_collection.update_one({"_id": user_id}, {"$inc": {"version": 1}}, upsert=True)
+
+    # (start, end, _id) of the user's activities overlapping [start, end), straight from the
+    # {user_id, start_time, end_time} index: the ASGI app keeps no in-memory overlap index
+    async def get_overlapping_intervals(self, user_id, start, end):
+        query = {"user_id": user_id, "start_time": {"$lt": end}, "end_time": {"$gt": start}}
+        projection = {"start_time": 1, "end_time": 1}
+        if self.storage_mode == CLASSIC:
+            docs = await self.activities_collection.find(query, projection).to_list(length=None)
+        else:
+            timeseries_reads = self.timeseries_collection.find(
+                to_timeseries_filter(query), projection
+            ).to_list(length=None)
+            if self.storage_mode == DUAL:
+                timeseries_docs, classic_docs = await asyncio.gather(
+                    timeseries_reads,
+                    self.activities_collection.find(query, projection).to_list(length=None)
+                )
+            else:
+                timeseries_docs, classic_docs = await timeseries_reads, []
+            docs = merge_dual_reads(timeseries_docs, classic_docs, projection)
+        return [(doc["start_time"], doc["end_time"], doc["_id"]) for doc in docs]
+
+    # Same merge as ActivityRepository.merge_activities, full document layout only
+    async def merge_activities(self, user_id, keep_id, start, end, remove_ids):
+        if self.storage_mode != CLASSIC:
+            raise ValueError("Merging activities requires the classic storage mode")
+        await self.activities_collection.update_one({"_id": keep_id}, {
+            "$set": {"start_time": start, "end_time": end, "duration_seconds": int((end - start).total_seconds())},
+            "$addToSet": {"merged_from": {"$each": list(remove_ids)}}
+        })
+        if remove_ids:
+            await self.activities_collection.delete_many({"_id": {"$in": list(remove_ids)}})
+        await self.bump_watermark(user_id)
+
+    async def get_activities_by_user(self, user_id):
+        if self.storage_mode == CLASSIC:
+            return await self.activities_collection.find(
+                {"user_id": user_id}, ACTIVITY_SUMMARY_PROJECTION
+            ).to_list(length=None)
+
+        projection = {**ACTIVITY_SUMMARY_PROJECTION, "_id": 1}
+        timeseries_reads = self.timeseries_collection.find(
+            to_timeseries_filter({"user_id": user_id}), projection
+        ).to_list(length=None)
+        if self.storage_mode == DUAL:
+            timeseries_docs, classic_docs = await asyncio.gather(
+                timeseries_reads,
+                self.activities_collection.find({"user_id": user_id}, projection).to_list(length=None)
+            )
+        else:
+            timeseries_docs, classic_docs = await timeseries_reads, []
+        return merge_dual_reads(timeseries_docs, classic_docs, ACTIVITY_SUMMARY_PROJECTION)
+
+    async def get_activities_page(self, user_id, start, end, category_id=None, after=None, limit=50):
+        query = activity_range_query(user_id, start, end, category_id, after)
+        if self.storage_mode == CLASSIC:
+            docs = await self.activities_collection.find(
+                query, ACTIVITY_PAGE_PROJECTION, limit=limit + 1
+            ).sort(ACTIVITY_PAGE_SORT).to_list(length=None)
+        else:
+            timeseries_reads = self.timeseries_collection.find(
+                to_timeseries_filter(query), to_timeseries_projection(ACTIVITY_PAGE_PROJECTION), limit=limit + 1
+            ).sort(ACTIVITY_PAGE_SORT).to_list(length=None)
+            if self.storage_mode == DUAL:
+                timeseries_docs, classic_docs = await asyncio.gather(
+                    timeseries_reads,
+                    self.activities_collection.find(
+                        query, ACTIVITY_PAGE_PROJECTION, limit=limit + 1
+                    ).sort(ACTIVITY_PAGE_SORT).to_list(length=None)
+                )
+            else:
+                timeseries_docs, classic_docs = await timeseries_reads, []
+            docs = merge_dual_reads(timeseries_docs, classic_docs, ACTIVITY_PAGE_PROJECTION, ACTIVITY_PAGE_SORT)
+        return [Activity.from_document(doc) for doc in docs[:limit]], len(docs) > limit
@@ -0,0 +1,8 @@
+
+class AsyncCategoryRepository:
+    def __init__(self, mongo_db):
+        self.categories_collection = mongo_db["categories"]
+
+    async def get_category_map(self):
+        categories = await self.categories_collection.find().to_list(length=None)
+        return {category["name"]: category["_id"] for category in categories}
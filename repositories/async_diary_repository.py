@@ -0,0 +1,23 @@
+from bson.objectid import ObjectId
+from datetime import datetime
+
+class AsyncDiaryRepository:
+    def __init__(self, mongo_db):
+        self.diaries_collection = mongo_db["diaries"]
+
+    async def find_open_diary(self, user_id):
+        return await self.diaries_collection.find_one({
+            "user_id": ObjectId(user_id),
+            "open": True
+        })
+
+    async def create_diary(self, user_id):
+        new_diary = {
+            "user_id": ObjectId(user_id),
+            "open": True,
+            "creation_date": datetime.utcnow(),
+            "duration_time": 0,
+            "activities": []
+        }
+        result = await self.diaries_collection.insert_one(new_diary)
+        return result.inserted_id
@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+
+class AsyncLogRepository:
+    def __init__(self, mongo_db, analytics_read_preference=None):
+        self.logs_collection = mongo_db["logs"]
+        self.analytics_logs_collection = self.logs_collection.with_options(
+            read_preference=analytics_read_preference) if analytics_read_preference else self.logs_collection
+
+    async def log_event(self, event_type, message, user=None, severity="INFO"):
+        log = {
+            "timestamp": datetime.now(timezone.utc),
+            "event_type": event_type,
+            "severity": severity,
+            "message": message,
+            "user": user
+        }
+        await self.logs_collection.insert_one(log)
+
+    async def get_logs(self):
+        return await self.analytics_logs_collection.find().sort("timestamp", -1).to_list(length=None)
@@ -0,0 +1,10 @@
+
+class AsyncModuleRepository:
+    def __init__(self, mongo_db):
+        self.modules_collection = mongo_db["modules"]
+
+    async def get_modules(self, year, studies, semester):
+        return await self.modules_collection.find(
+            {"year": year, "studies": studies, "semester": semester},
+            {"_id": 0, "name": 1}
+        ).to_list(length=None)
@@ -0,0 +1,16 @@
+from bson.objectid import ObjectId
+from models.questionnaire import Question
+from repositories.question_repository import GRADING_PROJECTION, QUESTION_PROJECTION
+
+class AsyncQuestionRepository:
+    def __init__(self, mongo_db):
+        self.questions_collection = mongo_db["questions"]
+
+    async def get_questions_by_questionnaire(self, questionnaire_id):
+        return await self.questions_collection.find(
+            {"questionnaire_id": ObjectId(questionnaire_id)}, QUESTION_PROJECTION
+        ).sort("order", 1).to_list(length=None)
+
+    async def get_questions_for_grading(self, question_ids):
+        cursor = self.questions_collection.find({"_id": {"$in": list(question_ids)}}, GRADING_PROJECTION)
+        return {doc["_id"]: Question.from_document(doc) async for doc in cursor}
@@ -0,0 +1,88 @@
+import asyncio
+from bson.objectid import ObjectId
+from repositories.questionnaire_repository import (
+    QUESTIONNAIRE_SUMMARY_PROJECTION, RESPONSE_PROJECTION, targeting_query
+)
+
+class AsyncQuestionnaireRepository:
+    def __init__(self, mongo_db):
+        self.questionnaires_collection = mongo_db["questionnaires"]
+        self.questionnaire_responses_collection = mongo_db["questionnaire_responses"]
+
+    async def _answered_questionnaire_ids(self, user_id):
+        try:
+            cursor = self.questionnaire_responses_collection.find(
+                {"user_id": ObjectId(user_id)}, {"_id": 0, "questionnaire_id": 1}
+            )
+            return {response["questionnaire_id"] async for response in cursor}
+        except Exception as e:
+            print(f"DEBUG: Error fetching answered questionnaires for user {user_id}: {str(e)}")
+            return set()
+
+    async def get_questionnaires(self, user_id=None, user_filieres=None, user_years=None, fetch_all=False):
+        query = {}
+        if not fetch_all and user_filieres and user_years:
+            query.update(targeting_query(user_filieres, user_years))
+
+        cursor = self.questionnaires_collection.find(query, QUESTIONNAIRE_SUMMARY_PROJECTION)
+        if user_id:
+            questionnaires, answered_questionnaire_ids = await asyncio.gather(
+                cursor.to_list(length=None),
+                self._answered_questionnaire_ids(user_id)
+            )
+        else:
+            questionnaires = await cursor.to_list(length=None)
+            answered_questionnaire_ids = set()
+
+        for q in questionnaires:
+            q["is_answered"] = q["_id"] in answered_questionnaire_ids if user_id else False
+        return questionnaires
+
+    async def get_questionnaire_by_id(self, questionnaire_id):
+        try:
+            return await self.questionnaires_collection.find_one({"_id": ObjectId(questionnaire_id)})
+        except Exception as e:
+            print(f"DEBUG: Error fetching questionnaire {questionnaire_id}: {str(e)}")
+            return None
+
+    async def get_questionnaires_by_ids(self, questionnaire_ids):
+        try:
+            valid_ids = []
+            for q_id in questionnaire_ids:
+                try:
+                    valid_ids.append(ObjectId(q_id))
+                except Exception as e:
+                    print(f"DEBUG: Invalid questionnaire_id {q_id}: {str(e)}")
+                    continue
+
+            if not valid_ids:
+                return []
+
+            return await self.questionnaires_collection.find(
+                {"_id": {"$in": valid_ids}}, QUESTIONNAIRE_SUMMARY_PROJECTION
+            ).to_list(length=None)
+        except Exception as e:
+            print(f"DEBUG: Error fetching questionnaires by IDs: {str(e)}")
+            return []
+
+    async def submit_response(self, response_doc):
+        await self.questionnaire_responses_collection.insert_one(response_doc)
+
+    async def get_user_responses(self, user_id, questionnaire_id):
+        try:
+            return await self.questionnaire_responses_collection.find_one({
+                "user_id": ObjectId(user_id),
+                "questionnaire_id": ObjectId(questionnaire_id)
+            }, RESPONSE_PROJECTION)
+        except Exception as e:
+            print(f"DEBUG: Error fetching user responses for user {user_id}, questionnaire {questionnaire_id}: {str(e)}")
+            return None
+
+    async def get_user_answered_questionnaires(self, user_id):
+        try:
+            return await self.questionnaire_responses_collection.find(
+                {"user_id": ObjectId(user_id)}, {"_id": 0, "questionnaire_id": 1, "completed_at": 1}
+            ).to_list(length=None)
+        except Exception as e:
+            print(f"DEBUG: Error fetching answered questionnaires for user {user_id}: {str(e)}")
+            return []
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+
+from repositories.score_repository import USER_SCORE_PROJECTION
+
+
+class AsyncScoreRepository:
+    def __init__(self, mongo_db):
+        self.ledger_collection = mongo_db["score_ledger"]
+        self.user_scores_collection = mongo_db["user_scores"]
+
+    async def record_entry(self, user_id, questionnaire_id, category, points, max_points):
+        return await self.ledger_collection.find_one_and_update(
+            {"user_id": user_id, "questionnaire_id": questionnaire_id},
+            {"$set": {"category": category, "points": points, "max_points": max_points,
+                      "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            projection={"_id": 0, "points": 1, "category": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def apply_delta(self, user_id, category_deltas, pseudonym, filieres, years):
+        inc = {"total": sum(category_deltas.values())}
+        inc.update({f"by_category.{category}": delta for category, delta in category_deltas.items()})
+        return await self.user_scores_collection.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": inc, "$set": {"pseudonym": pseudonym, "filieres": filieres, "years": years,
+                                   "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            projection=USER_SCORE_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def get_user_score(self, user_id):
+        return await self.user_scores_collection.find_one({"_id": user_id})
@@ -0,0 +1,51 @@
+from bson.objectid import ObjectId
+
+class AsyncUserRepository:
+    def __init__(self, mongo_db, firestore_db, analytics_read_preference=None):
+        self.mongo_users_collection = mongo_db["users_objects"]
+        self.analytics_mongo_users_collection = self.mongo_users_collection.with_options(
+            read_preference=analytics_read_preference) if analytics_read_preference else self.mongo_users_collection
+        self.users_collection = firestore_db.collection("users_test")
+
+    async def find_user_by_pseudonym(self, pseudonym):
+        user_query = await self.users_collection.where("pseudonym", "==", pseudonym).limit(1).get()
+        return next(iter(user_query), None)
+
+    async def find_mongo_user_by_pseudonym(self, pseudonym):
+        return await self.mongo_users_collection.find_one({"pseudonym": pseudonym})
+
+    async def find_mongo_user_by_id(self, user_id):
+        return await self.mongo_users_collection.find_one({"_id": ObjectId(user_id)})
+
+    async def sync_user_to_mongo(self, pseudonym):
+        existing_user = await self.find_mongo_user_by_pseudonym(pseudonym)
+        if not existing_user:
+            result = await self.mongo_users_collection.insert_one({"pseudonym": pseudonym})
+            return result.inserted_id
+        return existing_user["_id"]
+
+    async def get_all_users(self):
+        firestore_users = [u.to_dict() async for u in self.users_collection.stream()]
+        pseudonyms = [u.get("pseudonym") for u in firestore_users]
+        cursor = self.analytics_mongo_users_collection.find({"pseudonym": {"$in": pseudonyms}}, {"pseudonym": 1})
+        mongo_ids = {m["pseudonym"]: m["_id"] async for m in cursor}
+
+        users = []
+        for u_dict in firestore_users:
+            mongo_user_id = mongo_ids.get(u_dict.get("pseudonym"))
+            user = {
+                "pseudonym": u_dict.get("pseudonym", ""),
+                "role": u_dict.get("role", ""),
+                "email_address": u_dict.get("email_address", ""),
+                "gender": u_dict.get("gender", ""),
+                "mongo_user_id": str(mongo_user_id) if mongo_user_id else None
+            }
+            if u_dict.get("role") == "student":
+                user.update({
+                    "year": u_dict.get("year", ""),
+                    "studies": u_dict.get("studies", ""),
+                    "semester": u_dict.get("semester", ""),
+                    "age": u_dict.get("age", "")
+                })
+            users.append(user)
+        return users
@@ -1,8 +1,25 @@
+import threading
+import time
+
+from circuit_breaker import read_through
 
 class CategoryRepository:
-    def __init__(self, mongo_db):
+    def __init__(self, mongo_db, cache_ttl_seconds=0, stale_cache=None):
         self.categories_collection = mongo_db["categories"]
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self._cache = None
+        self._cache_expires_at = 0
+        self._lock = threading.Lock()
+        self.stale_cache = stale_cache
 
     def get_category_map(self):
-        categories = self.categories_collection.find()
-        return {category["name"]: category["_id"] for category in categories}
\ No newline at end of file
+        if self.cache_ttl_seconds and self._cache is not None and time.monotonic() < self._cache_expires_at:
+            return self._cache
+        category_map = read_through(self.stale_cache, ("categories",), self._load_category_map)
+        with self._lock:
+            self._cache = category_map
+            self._cache_expires_at = time.monotonic() + self.cache_ttl_seconds
+        return category_map
+
+    def _load_category_map(self):
+        return {category["name"]: category["_id"] for category in self.categories_collection.find()}
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (PENDING, RUNNING)
+
+# Never-leased jobs sort before any real lease expiry
+_NO_LEASE = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class DeletionJobRepository:
+    def __init__(self, mongo_db):
+        self.mongo_db = mongo_db
+        self.jobs_collection = mongo_db["deletion_jobs"]
+
+    def ensure_indexes(self):
+        self.jobs_collection.create_index([("status", ASCENDING), ("lease_until", ASCENDING)])
+        self.jobs_collection.create_index([("entity", ASCENDING), ("entity_id", ASCENDING)])
+
+    def create_job(self, entity, entity_id, steps, origin="request"):
+        now = datetime.now(timezone.utc)
+        job = {
+            "entity": entity,
+            "entity_id": entity_id,
+            "origin": origin,
+            "status": PENDING,
+            "steps": steps,
+            "progress": {step["collection"]: 0 for step in steps},
+            "attempts": 0,
+            "lease_until": _NO_LEASE,
+            "created_at": now,
+            "updated_at": now
+        }
+        job["_id"] = self.jobs_collection.insert_one(job).inserted_id
+        return job
+
+    def has_active_job(self, entity, entity_id):
+        return self.jobs_collection.count_documents(
+            {"entity": entity, "entity_id": entity_id, "status": {"$in": list(ACTIVE_STATUSES)}}, limit=1) > 0
+
+    # Takes the oldest pending job, or a running one whose worker stopped renewing its lease
+    def claim_next_job(self, lease_seconds):
+        now = datetime.now(timezone.utc)
+        return self.jobs_collection.find_one_and_update(
+            {"status": {"$in": list(ACTIVE_STATUSES)}, "lease_until": {"$lt": now}},
+            {"$set": {"status": RUNNING, "lease_until": now + timedelta(seconds=lease_seconds), "updated_at": now},
+             "$inc": {"attempts": 1}},
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def record_progress(self, job_id, collection, deleted, lease_seconds):
+        now = datetime.now(timezone.utc)
+        self.jobs_collection.update_one(
+            {"_id": job_id},
+            {"$inc": {f"progress.{collection}": deleted},
+             "$set": {"lease_until": now + timedelta(seconds=lease_seconds), "updated_at": now}}
+        )
+
+    def finish_job(self, job_id, status, error=None):
+        now = datetime.now(timezone.utc)
+        update = {"status": status, "lease_until": _NO_LEASE, "updated_at": now, "finished_at": now}
+        if error:
+            update["error"] = error
+        self.jobs_collection.update_one({"_id": job_id}, {"$set": update})
+
+    def get_job(self, job_id):
+        return self.jobs_collection.find_one({"_id": job_id}, {"steps": 0, "lease_until": 0})
+
+    def get_jobs(self, status=None, limit=50):
+        query = {"status": status} if status else {}
+        return list(self.jobs_collection.find(query, {"steps": 0, "lease_until": 0})
+                    .sort("created_at", DESCENDING).limit(limit))
+
+    # Deletes up to batch_size matching documents; returns them (_id plus `fields`) for tombstones
+    def delete_batch(self, collection, query, batch_size, fields=()):
+        target = self.mongo_db[collection]
+        docs = list(target.find(query, {"_id": 1, **{field: 1 for field in fields}}).limit(batch_size))
+        if docs:
+            target.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        return docs
+
+    # Time-series collections before MongoDB 7 only accept deletes filtered on the metaField
+    def delete_all(self, collection, query):
+        return self.mongo_db[collection].delete_many(query).deleted_count
+
+    def distinct_references(self, collection, field):
+        cursor = self.mongo_db[collection].aggregate(
+            [{"$match": {field: {"$ne": None}}}, {"$group": {"_id": f"${field}"}}], allowDiskUse=True)
+        return {doc["_id"] for doc in cursor}
+
+    def existing_ids(self, collection, ids, batch_size=10000):
+        ids = list(ids)
+        found = set()
+        for start in range(0, len(ids), batch_size):
+            found.update(doc["_id"] for doc in self.mongo_db[collection].find(
+                {"_id": {"$in": ids[start:start + batch_size]}}, {"_id": 1}))
+        return found
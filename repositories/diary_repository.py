@@ -1,6 +1,8 @@
 from bson.objectid import ObjectId
 from datetime import datetime
 
+import unit_of_work
+
 class DiaryRepository:
     def __init__(self, mongo_db):
         self.diaries_collection = mongo_db["diaries"]
@@ -19,8 +21,7 @@ class DiaryRepository:
             "duration_time": 0,
             "activities": []
         }
-        result = self.diaries_collection.insert_one(new_diary)
-        return result.inserted_id
+        return unit_of_work.insert(self.diaries_collection, new_diary)
 
     def get_diaries_by_user(self, user_id):
         return list(self.diaries_collection.find({"user_id": ObjectId(user_id)}))
\ No newline at end of file
@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+# Small integer codes standing for repeated values (activity names, category ids) in compact
+# documents. Codes are allocated once per (kind, value) and never reused or changed.
+class DictionaryRepository:
+    def __init__(self, mongo_db, cache_size=50000):
+        self.dictionary_collection = mongo_db["compact_dictionary"]
+        self.sequences_collection = mongo_db["compact_sequences"]
+        self.cache_size = cache_size
+        self._codes = OrderedDict()
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ensure_indexes(self):
+        self.dictionary_collection.create_index([("kind", ASCENDING), ("value", ASCENDING)], unique=True)
+        self.dictionary_collection.create_index([("kind", ASCENDING), ("code", ASCENDING)], unique=True)
+
+    def _remember(self, kind, value, code):
+        with self._lock:
+            for cache, key, item in ((self._codes, (kind, value), code), (self._values, (kind, code), value)):
+                cache[key] = item
+                cache.move_to_end(key)
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+
+    # Code of an existing value, None if it was never stored (used in filters)
+    def find_code(self, kind, value):
+        code = self._codes.get((kind, value))
+        if code is None:
+            entry = self.dictionary_collection.find_one({"kind": kind, "value": value}, {"code": 1})
+            if entry is None:
+                return None
+            code = entry["code"]
+            self._remember(kind, value, code)
+        return code
+
+    def code(self, kind, value):
+        code = self.find_code(kind, value)
+        if code is not None:
+            return code
+        sequence = self.sequences_collection.find_one_and_update(
+            {"_id": kind}, {"$inc": {"next": 1}}, upsert=True, return_document=ReturnDocument.AFTER)
+        try:
+            self.dictionary_collection.insert_one({"kind": kind, "value": value, "code": sequence["next"]})
+            code = sequence["next"]
+        except DuplicateKeyError:
+            # Allocated concurrently by another worker: its code wins, ours stays unused
+            code = self.dictionary_collection.find_one({"kind": kind, "value": value}, {"code": 1})["code"]
+        self._remember(kind, value, code)
+        return code
+
+    def value(self, kind, code):
+        key = (kind, code)
+        if key in self._values:
+            return self._values[key]
+        entry = self.dictionary_collection.find_one({"kind": kind, "code": code}, {"value": 1})
+        if entry is None:
+            return None
+        self._remember(kind, entry["value"], code)
+        return entry["value"]
@@ -1,21 +1,60 @@
 from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+
+import unit_of_work
 
 class LogRepository:
-    def __init__(self, mongo_db):
+    def __init__(self, mongo_db, analytics_read_preference=None):
         self.logs_collection = mongo_db["logs"]
+        # Admin listings tolerate replication lag; archiving reads then deletes, so it stays on the primary
+        self.analytics_logs_collection = self.logs_collection.with_options(
+            read_preference=analytics_read_preference) if analytics_read_preference else self.logs_collection
+
+    def ensure_indexes(self, ttl_seconds=None):
+        try:
+            if ttl_seconds:
+                self.logs_collection.create_index([("timestamp", ASCENDING)], name="timestamp_ttl",
+                                                  expireAfterSeconds=ttl_seconds)
+            else:
+                self.logs_collection.create_index([("timestamp", ASCENDING)], name="timestamp_ttl")
+        except OperationFailure:
+            # The index already exists with other options: update the expiry in place
+            self.logs_collection.database.command(
+                "collMod", self.logs_collection.name,
+                index={"name": "timestamp_ttl", "expireAfterSeconds": ttl_seconds or 2147483647}
+            )
+        self.logs_collection.create_index([("event_type", ASCENDING), ("timestamp", DESCENDING)])
+        # Messages are French: stemmed so "supprimé" also finds "suppression", diacritics ignored
+        self.logs_collection.create_index([("message", TEXT)], name="message_text", default_language="french")
 
-    def log_event(self, event_type, message, user=None):
+    def log_event(self, event_type, message, user=None, severity="INFO"):
         log = {
             "timestamp": datetime.now(timezone.utc),
             "event_type": event_type,
+            "severity": severity,
             "message": message,
             "user": user
         }
-        self.logs_collection.insert_one(log)
+        unit_of_work.insert(self.logs_collection, log)
 
     def get_logs(self):
-        logs = list(self.logs_collection.find().sort("timestamp", -1))
-        for log in logs:
-            log["_id"] = str(log["_id"])
-            log["timestamp"] = log["timestamp"].isoformat()
-        return logs
\ No newline at end of file
+        return list(self.analytics_logs_collection.find().sort("timestamp", -1))
+
+    # Ranked by text score when `query` is given, newest first otherwise. One extra row is read
+    # so callers can tell whether another page exists without counting every match.
+    def search_logs(self, query=None, event_type=None, skip=0, limit=20):
+        filters = {"event_type": event_type} if event_type else {}
+        if query:
+            filters["$text"] = {"$search": query}
+            cursor = self.analytics_logs_collection.find(filters, {"score": {"$meta": "textScore"}}).sort(
+                [("score", {"$meta": "textScore"}), ("timestamp", DESCENDING)])
+        else:
+            cursor = self.analytics_logs_collection.find(filters).sort("timestamp", DESCENDING)
+        return list(cursor.skip(skip).limit(limit + 1))
+
+    def find_logs_before(self, cutoff, batch_size):
+        return self.logs_collection.find({"timestamp": {"$lt": cutoff}}).sort("timestamp", 1).batch_size(batch_size)
+
+    def delete_logs_by_ids(self, log_ids):
+        return self.logs_collection.delete_many({"_id": {"$in": log_ids}}).deleted_count
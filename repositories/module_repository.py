@@ -1,9 +1,16 @@
 
+from circuit_breaker import read_through
+
 class ModuleRepository:
-    def __init__(self, mongo_db):
+    def __init__(self, mongo_db, stale_cache=None):
         self.modules_collection = mongo_db["modules"]
+        self.stale_cache = stale_cache
 
     def get_modules(self, year, studies, semester):
+        return read_through(self.stale_cache, ("modules", year, studies, semester), self._get_modules, year, studies,
+                            semester)
+
+    def _get_modules(self, year, studies, semester):
         return list(self.modules_collection.find(
             {"year": year, "studies": studies, "semester": semester},
             {"_id": 0, "name": 1}
@@ -1,26 +1,75 @@
+from datetime import datetime
 from bson.objectid import ObjectId
+from pymongo import ASCENDING
+
+import unit_of_work
+from circuit_breaker import read_through
+from models.questionnaire import Question
+
+QUESTION_PROJECTION = {
+    "text": 1,
+    "type": 1,
+    "propositions": 1,
+    "points": {"$ifNull": ["$points", 0]},
+    "order": 1
+}
+
+# The server reduces propositions to the ids of the correct ones (models.questionnaire.Question)
+GRADING_PROJECTION = {
+    "type": 1,
+    "points": 1,
+    "correct_ids": {"$map": {
+        "input": {"$filter": {"input": {"$ifNull": ["$propositions", []]}, "as": "p", "cond": "$$p.is_correct"}},
+        "as": "p",
+        "in": "$$p.id"
+    }}
+}
+
+SEARCH_PROJECTION = {"questionnaire_id": 1, "text": 1, "type": 1, "order": 1}
 
 class QuestionRepository:
-    def __init__(self, mongo_db):
+    def __init__(self, mongo_db, stale_cache=None):
         self.questions_collection = mongo_db["questions"]
+        self.stale_cache = stale_cache
+        self._change_listeners = []
+
+    # Callbacks run after every question write made through this process
+    def add_change_listener(self, listener):
+        self._change_listeners.append(listener)
+
+    def ensure_indexes(self):
+        self.questions_collection.create_index([("questionnaire_id", ASCENDING), ("order", ASCENDING)])
+        self.questions_collection.create_index([("updated_at", ASCENDING)])
 
     def add_question(self, question):
-        result = self.questions_collection.insert_one(question)
-        return result.inserted_id
+        question.setdefault("updated_at", question.get("created_at") or datetime.utcnow())
+        question_id = unit_of_work.insert(self.questions_collection, question)
+        for listener in self._change_listeners:
+            unit_of_work.after_write(listener)
+        return question_id
 
     def get_questions_by_questionnaire(self, questionnaire_id):
-        questions = self.questions_collection.find({"questionnaire_id": ObjectId(questionnaire_id)}).sort("order", 1)
-        return [
-            {
-                "_id": str(q["_id"]),
-                "text": q["text"],
-                "type": q["type"],
-                "propositions": q["propositions"],
-                "points":q.get("points", 0),
-                "order": q["order"]
-            }
-            for q in questions
-        ]
+        return read_through(self.stale_cache, ("questions", questionnaire_id), self._get_questions_by_questionnaire,
+                            questionnaire_id)
+
+    def _get_questions_by_questionnaire(self, questionnaire_id):
+        return list(self.questions_collection.find(
+            {"questionnaire_id": ObjectId(questionnaire_id)}, QUESTION_PROJECTION
+        ).sort("order", 1))
+
+    def get_questions_for_sync(self, questionnaire_ids, since=None):
+        query = {"questionnaire_id": {"$in": list(questionnaire_ids)}}
+        if since is not None:
+            query["updated_at"] = {"$gt": since}
+        return list(self.questions_collection.find(query, {**QUESTION_PROJECTION, "questionnaire_id": 1}))
+
+    def get_questions_for_search(self):
+        return list(self.questions_collection.find({}, SEARCH_PROJECTION))
 
     def get_question_by_id(self, question_id):
-        return self.questions_collection.find_one({"_id": ObjectId(question_id)})
\ No newline at end of file
+        return self.questions_collection.find_one({"_id": ObjectId(question_id)})
+
+    # One round trip for a whole submission, keyed by ObjectId
+    def get_questions_for_grading(self, question_ids):
+        cursor = self.questions_collection.find({"_id": {"$in": list(question_ids)}}, GRADING_PROJECTION)
+        return {doc["_id"]: Question.from_document(doc) for doc in cursor}
\ No newline at end of file
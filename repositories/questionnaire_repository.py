@@ -1,14 +1,96 @@
 from bson.objectid import ObjectId
+from pymongo import ASCENDING
+
+import unit_of_work
+from circuit_breaker import read_through
+from models.compact import COMPACT, ENCODINGS, FULL, CompactSchema, decode_time, encode_time
+
+# Listing shape; documents are serialised as-is by the JSON provider
+QUESTIONNAIRE_SUMMARY_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "category": 1,
+    "filieres": 1,
+    "years": 1,
+    "created_at": 1,
+    "is_active": 1
+}
+
+RESPONSE_PROJECTION = {
+    "questionnaire_id": 1,
+    "user_id": 1,
+    "responses.question_id": 1,
+    "responses.selected_proposition_id": 1,
+    "responses.answer_text": 1,
+    "responses.is_correct": 1,
+    "duration_seconds": 1,
+    "feedback": 1,
+    "completed_at": 1
+}
+
+# Compact layout of questionnaire_responses (models/compact.py); ids keep their names
+COMPACT_RESPONSE_SCHEMA = CompactSchema(
+    {"responses": "r", "duration_seconds": "d", "feedback": "f", "completed_at": "c"},
+    encoders={"completed_at": encode_time},
+    decoders={"completed_at": decode_time},
+    defaults={"duration_seconds": None, "feedback": ""},
+    nested={"responses": CompactSchema(
+        {"question_id": "q", "selected_proposition_id": "p", "answer_text": "t", "is_correct": "k"},
+        defaults={"selected_proposition_id": None, "answer_text": None, "is_correct": False},
+    )},
+)
+
+
+# A student sees active questionnaires targeting one of their filières or their year
+def targeting_query(user_filieres, user_years):
+    return {"is_active": True,
+        "$or": [
+            {"filieres": {"$in": user_filieres}},
+            {"years": {"$in": user_years}}
+        ]
+    }
+
+
+def matches_targeting(questionnaire, user_filieres, user_years):
+    return bool(questionnaire.get("is_active")) and (
+        not set(questionnaire.get("filieres", [])).isdisjoint(user_filieres)
+        or not set(questionnaire.get("years", [])).isdisjoint(user_years)
+    )
+
 
 class QuestionnaireRepository:
-    def __init__(self, mongo_db):
+    def __init__(self, mongo_db, tombstone_repository=None, stale_cache=None, response_encoding=FULL):
+        if response_encoding not in ENCODINGS:
+            raise ValueError(f"Unknown document encoding: {response_encoding}")
+        self.response_encoding = response_encoding
         self.questionnaires_collection = mongo_db["questionnaires"]
         self.questions_collection = mongo_db["questions"]
         self.questionnaire_responses_collection = mongo_db["questionnaire_responses"]
+        self.tombstone_repository = tombstone_repository
+        # Listings fall back to their last good result while Mongo is unavailable
+        self.stale_cache = stale_cache
+        self._change_listeners = []
+
+    # Callbacks run after every questionnaire write made through this process
+    def add_change_listener(self, listener):
+        self._change_listeners.append(listener)
+
+    def _notify_change(self):
+        for listener in self._change_listeners:
+            unit_of_work.after_write(listener)
+
+    def ensure_indexes(self):
+        self.questionnaires_collection.create_index([("updated_at", ASCENDING)])
+        if self.response_encoding != COMPACT:
+            self.questionnaire_responses_collection.create_index([("user_id", ASCENDING), ("completed_at", ASCENDING)])
+        if self.response_encoding != FULL:
+            self.questionnaire_responses_collection.create_index([("user_id", ASCENDING), ("c", ASCENDING)])
+        self.questionnaire_responses_collection.create_index([("questionnaire_id", ASCENDING)])
 
     def create_questionnaire(self, questionnaire):
-        result = self.questionnaires_collection.insert_one(questionnaire)
-        return result.inserted_id
+        questionnaire_id = unit_of_work.insert(self.questionnaires_collection, questionnaire)
+        self._notify_change()
+        return questionnaire_id
 
     def update_questionnaire(self, questionnaire_id, updated_data):
         try:
@@ -16,49 +98,42 @@ class QuestionnaireRepository:
                 {"_id": ObjectId(questionnaire_id)},
                 {"$set": updated_data}
             )
+            self._notify_change()
             return result
         except Exception as e:
             print(f"DEBUG: Error updating questionnaire {questionnaire_id}: {str(e)}")
             return None
 
     def get_questionnaires(self, user_id=None, user_filieres=None, user_years=None, fetch_all=False):
+        key = ("questionnaires", user_id, tuple(user_filieres or ()), tuple(user_years or ()), fetch_all)
+        return read_through(self.stale_cache, key, self._get_questionnaires, user_id, user_filieres, user_years,
+                            fetch_all)
+
+    def _get_questionnaires(self, user_id, user_filieres, user_years, fetch_all):
         query = {}
         if not fetch_all and user_filieres and user_years:
-            query.update({"is_active": True ,
-                "$or": [
-                    {"filieres": {"$in": user_filieres}},
-                    {"years": {"$in": user_years}}
-                ]
-            })
+            query.update(targeting_query(user_filieres, user_years))
 
-        questionnaires = self.questionnaires_collection.find(query)
+        questionnaires = list(self.questionnaires_collection.find(query, QUESTIONNAIRE_SUMMARY_PROJECTION))
 
-        answered_questionnaire_ids = []
+        answered_questionnaire_ids = set()
         if user_id:
             try:
-                answered_responses = self.questionnaire_responses_collection.find({"user_id": ObjectId(user_id)})
-                answered_questionnaire_ids = [str(response["questionnaire_id"]) for response in answered_responses]
+                answered_responses = self.questionnaire_responses_collection.find(
+                    {"user_id": ObjectId(user_id)}, {"_id": 0, "questionnaire_id": 1}
+                )
+                answered_questionnaire_ids = {response["questionnaire_id"] for response in answered_responses}
             except Exception as e:
                 print(f"DEBUG: Error fetching answered questionnaires for user {user_id}: {str(e)}")
 
-        return [
-            {
-                "_id": str(q["_id"]),
-                "title": q["title"],
-                "description": q["description"],
-                "category": q["category"],
-                "filieres": q["filieres"],
-                "years": q["years"],
-                "created_at": q["created_at"].isoformat(),
-                "is_active": q["is_active"],
-                "is_answered": str(q["_id"]) in answered_questionnaire_ids if user_id else False
-            }
-            for q in questionnaires
-        ]
+        for q in questionnaires:
+            q["is_answered"] = q["_id"] in answered_questionnaire_ids if user_id else False
+        return questionnaires
 
     def get_questionnaire_by_id(self, questionnaire_id):
         try:
-            return self.questionnaires_collection.find_one({"_id": ObjectId(questionnaire_id)})
+            return read_through(self.stale_cache, ("questionnaire", questionnaire_id),
+                                self.questionnaires_collection.find_one, {"_id": ObjectId(questionnaire_id)})
         except Exception as e:
             print(f"DEBUG: Error fetching questionnaire {questionnaire_id}: {str(e)}")
             return None
@@ -76,72 +151,114 @@ class QuestionnaireRepository:
             if not valid_ids:
                 return []
 
-            questionnaires = self.questionnaires_collection.find({"_id": {"$in": valid_ids}})
-            return [
-                {
-                    "_id": str(q["_id"]),
-                    "title": q["title"],
-                    "description": q["description"],
-                    "category": q["category"],
-                    "filieres": q["filieres"],
-                    "years": q["years"],
-                    "created_at": q["created_at"].isoformat(),
-                    "is_active": q["is_active"]
-                }
-                for q in questionnaires
-            ]
+            return list(self.questionnaires_collection.find(
+                {"_id": {"$in": valid_ids}}, QUESTIONNAIRE_SUMMARY_PROJECTION
+            ))
         except Exception as e:
             print(f"DEBUG: Error fetching questionnaires by IDs: {str(e)}")
             return []
 
+    def get_active_questionnaires(self):
+        return read_through(self.stale_cache, ("active_questionnaires",), self._get_active_questionnaires)
+
+    def _get_active_questionnaires(self):
+        return list(self.questionnaires_collection.find({"is_active": True}, QUESTIONNAIRE_SUMMARY_PROJECTION))
+
+    def get_answered_questionnaire_ids(self, user_id):
+        return read_through(self.stale_cache, ("answered", user_id), self._get_answered_questionnaire_ids, user_id)
+
+    def _get_answered_questionnaire_ids(self, user_id):
+        return {response["questionnaire_id"] for response in self.questionnaire_responses_collection.find(
+            {"user_id": ObjectId(user_id)}, {"_id": 0, "questionnaire_id": 1}
+        )}
+
+    def get_assigned_questionnaires(self, user_filieres, user_years, fetch_all=False):
+        key = ("assigned_questionnaires", tuple(user_filieres or ()), tuple(user_years or ()), fetch_all)
+        return read_through(self.stale_cache, key, self._get_assigned_questionnaires, user_filieres, user_years,
+                            fetch_all)
+
+    def _get_assigned_questionnaires(self, user_filieres, user_years, fetch_all):
+        query = {} if fetch_all else targeting_query(user_filieres, user_years)
+        return list(self.questionnaires_collection.find(query, QUESTIONNAIRE_SUMMARY_PROJECTION))
+
+    # Every questionnaire, active or not, for the admin search index
+    def get_questionnaires_for_search(self):
+        return list(self.questionnaires_collection.find({}, QUESTIONNAIRE_SUMMARY_PROJECTION))
+
+    def get_questionnaires_changed_since(self, since):
+        return list(self.questionnaires_collection.find(
+            {"updated_at": {"$gt": since}}, QUESTIONNAIRE_SUMMARY_PROJECTION
+        ))
+
+    def get_user_responses_since(self, user_id, since=None):
+        query = {"user_id": ObjectId(user_id)}
+        if since is not None:
+            # Responses are never modified after submission
+            query["completed_at"] = {"$gt": since}
+        return self._find_responses(query, RESPONSE_PROJECTION)
+
+    # In the mixed encoding a filter on an encoded field matches either layout
+    def _response_query(self, query):
+        if self.response_encoding == FULL:
+            return query
+        encoded = COMPACT_RESPONSE_SCHEMA.encode_query(query)
+        if self.response_encoding == COMPACT or encoded == query:
+            return encoded
+        return {"$or": [query, encoded]}
+
+    def _response_projection(self, projection):
+        if self.response_encoding == FULL:
+            return projection
+        encoded = COMPACT_RESPONSE_SCHEMA.encode_projection(projection)
+        return encoded if self.response_encoding == COMPACT else {**projection, **encoded}
+
+    def _decode_response(self, response, projection):
+        if self.response_encoding == FULL or response is None:
+            return response
+        return COMPACT_RESPONSE_SCHEMA.decode_document(response, projection)
+
+    def _find_responses(self, query, projection):
+        return [self._decode_response(response, projection) for response in self.questionnaire_responses_collection.find(
+            self._response_query(query), self._response_projection(projection))]
+
+    # Every stored response in insertion order, for tools/rebuild_scores.py
+    def iter_responses(self, projection):
+        cursor = self.questionnaire_responses_collection.find(
+            {}, self._response_projection(projection)).sort("_id", ASCENDING)
+        for response in cursor:
+            yield self._decode_response(response, projection)
+
+    def _record_deletions(self, collection, doc_ids, **fields):
+        if self.tombstone_repository is not None:
+            self.tombstone_repository.record_deletions(collection, doc_ids, **fields)
+
     def submit_response(self, response_doc):
-        self.questionnaire_responses_collection.insert_one(response_doc)
+        if self.response_encoding != FULL:
+            response_doc.setdefault("_id", ObjectId())
+            response_doc = COMPACT_RESPONSE_SCHEMA.encode_document(response_doc)
+        unit_of_work.insert(self.questionnaire_responses_collection, response_doc)
 
     def get_user_responses(self, user_id, questionnaire_id):
         try:
-            response = self.questionnaire_responses_collection.find_one({
+            return self._decode_response(self.questionnaire_responses_collection.find_one({
                 "user_id": ObjectId(user_id),
                 "questionnaire_id": ObjectId(questionnaire_id)
-            })
-            if not response:
-                return None
-            return {
-                "_id": str(response["_id"]),
-                "questionnaire_id": str(response["questionnaire_id"]),
-                "user_id": str(response["user_id"]),
-                "responses": [
-                    {
-                        "question_id": str(r["question_id"]),
-                        "selected_proposition_id": r.get("selected_proposition_id"),
-                        "answer_text": r.get("answer_text"),
-                        "is_correct": r.get("is_correct")
-                    }
-                    for r in response["responses"]
-                ],
-                "duration_seconds": response["duration_seconds"],
-                "feedback": response["feedback"],
-                "completed_at": response["completed_at"].isoformat()
-            }
+            }, self._response_projection(RESPONSE_PROJECTION)), RESPONSE_PROJECTION)
         except Exception as e:
             print(f"DEBUG: Error fetching user responses for user {user_id}, questionnaire {questionnaire_id}: {str(e)}")
             return None
 
     def get_user_answered_questionnaires(self, user_id):
         try:
-            responses = self.questionnaire_responses_collection.find({"user_id": ObjectId(user_id)})
-            return [
-                {
-                    "questionnaire_id": str(response["questionnaire_id"]),
-                    "completed_at": response["completed_at"].isoformat()
-                }
-                for response in responses
-            ]
+            return self._find_responses({"user_id": ObjectId(user_id)},
+                                        {"_id": 0, "questionnaire_id": 1, "completed_at": 1})
         except Exception as e:
             print(f"DEBUG: Error fetching answered questionnaires for user {user_id}: {str(e)}")
             return []
 
     def add_questionnaire(self, new_question):
         self.questionnaires_collection.insert_one(new_question)
+        self._notify_change()
 
     def delete_questionnaire(self, questionnaire_id):
         try:
@@ -149,9 +266,9 @@ class QuestionnaireRepository:
             questionnaire_result = self.questionnaires_collection.delete_one({"_id": questionnaire_obj_id})
             if questionnaire_result.deleted_count == 0:
                 return False
-
-            self.questions_collection.delete_many({"questionnaire_id": questionnaire_obj_id})
-            self.questionnaire_responses_collection.delete_many({"questionnaire_id": questionnaire_obj_id})
+            self._record_deletions("questionnaires", [questionnaire_obj_id])
+            self._notify_change()
+            # Questions and responses are purged in the background (services/deletion_service.py)
             return True
         except Exception as e:
             print(f"DEBUG: Error deleting questionnaire {questionnaire_id}: {str(e)}")
@@ -161,7 +278,11 @@ class QuestionnaireRepository:
 
     def delete_questions_by_questionnaire(self, questionnaire_id):
         try:
-            self.questions_collection.delete_many({"questionnaire_id": ObjectId(questionnaire_id)})
+            questionnaire_obj_id = ObjectId(questionnaire_id)
+            question_ids = [q["_id"] for q in self.questions_collection.find(
+                {"questionnaire_id": questionnaire_obj_id}, {"_id": 1})]
+            self.questions_collection.delete_many({"questionnaire_id": questionnaire_obj_id})
+            self._record_deletions("questions", question_ids, questionnaire_id=questionnaire_obj_id)
         except Exception as e:
             print(f"DEBUG: Error deleting questions for questionnaire {questionnaire_id}: {str(e)}")
 
@@ -0,0 +1,44 @@
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+# Token buckets shared by every worker: one document per key, refilled and debited
+# in a single atomic pipeline update so concurrent requests never double-spend a token
+class RateLimitRepository:
+    def __init__(self, mongo_db):
+        self.buckets_collection = mongo_db["rate_limit_buckets"]
+
+    def ensure_indexes(self):
+        self.buckets_collection.create_index([("expires_at", ASCENDING)], name="expires_at_ttl",
+                                             expireAfterSeconds=0)
+
+    def take(self, key, capacity, refill_per_second):
+        now = time.time()
+        refilled = {"$min": [capacity, {"$add": [
+            {"$ifNull": ["$tokens", capacity]},
+            {"$multiply": [{"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated", now]}]}]},
+                           refill_per_second]},
+        ]}]}
+        # An idle bucket is full again after capacity / rate seconds; the TTL index drops it then
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=capacity / refill_per_second)
+        pipeline = [
+            {"$set": {"tokens": refilled, "updated": now, "expires_at": expires_at}},
+            {"$set": {
+                "allowed": {"$gte": ["$tokens", 1]},
+                "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+            }},
+        ]
+        for attempt in range(2):
+            try:
+                bucket = self.buckets_collection.find_one_and_update(
+                    {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER,
+                    projection={"_id": 0, "tokens": 1, "allowed": 1}
+                )
+                break
+            except DuplicateKeyError:
+                # Two first requests for the same key raced on the upsert; the retry finds the document
+                if attempt:
+                    raise
+        return bucket["allowed"], bucket["tokens"]
@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+from pymongo import ASCENDING, ReturnDocument
+
+USER_SCORE_PROJECTION = {"pseudonym": 1, "total": 1, "filieres": 1, "years": 1, "updated_at": 1}
+
+
+class ScoreRepository:
+    def __init__(self, mongo_db):
+        # One entry per (user, questionnaire): the score of the latest submission
+        self.ledger_collection = mongo_db["score_ledger"]
+        # Running totals per user, kept in step with the ledger through deltas
+        self.user_scores_collection = mongo_db["user_scores"]
+
+    def ensure_indexes(self):
+        self.ledger_collection.create_index([("user_id", ASCENDING), ("questionnaire_id", ASCENDING)], unique=True)
+        self.user_scores_collection.create_index([("updated_at", ASCENDING)])
+
+    # Returns the previous entry (None on a first submission) so callers can apply the delta
+    def record_entry(self, user_id, questionnaire_id, category, points, max_points):
+        return self.ledger_collection.find_one_and_update(
+            {"user_id": user_id, "questionnaire_id": questionnaire_id},
+            {"$set": {"category": category, "points": points, "max_points": max_points,
+                      "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            projection={"_id": 0, "points": 1, "category": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+
+    def apply_delta(self, user_id, category_deltas, pseudonym, filieres, years):
+        inc = {"total": sum(category_deltas.values())}
+        inc.update({f"by_category.{category}": delta for category, delta in category_deltas.items()})
+        return self.user_scores_collection.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": inc, "$set": {"pseudonym": pseudonym, "filieres": filieres, "years": years,
+                                   "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            projection=USER_SCORE_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+
+    # Removes one ledger entry of a deleted questionnaire and takes its points back out of the
+    # owner's totals. The entry goes first: a crash in between loses one reversal, never repeats it.
+    def reverse_questionnaire_entry(self, questionnaire_id):
+        entry = self.ledger_collection.find_one_and_delete(
+            {"questionnaire_id": questionnaire_id}, projection={"user_id": 1, "category": 1, "points": 1})
+        if entry is None:
+            return None
+        points = entry.get("points", 0)
+        if points:
+            self.user_scores_collection.update_one(
+                {"_id": entry["user_id"]},
+                {"$inc": {"total": -points, f"by_category.{entry.get('category')}": -points},
+                 "$set": {"updated_at": datetime.now(timezone.utc)}}
+            )
+        return entry
+
+    def get_user_score(self, user_id):
+        return self.user_scores_collection.find_one({"_id": user_id})
+
+    def get_all_user_scores(self):
+        return list(self.user_scores_collection.find({}, USER_SCORE_PROJECTION))
+
+    def get_user_scores_changed_since(self, since):
+        return list(self.user_scores_collection.find({"updated_at": {"$gt": since}}, USER_SCORE_PROJECTION))
+
+    def get_user_ledger(self, user_id):
+        return list(self.ledger_collection.find({"user_id": user_id}, {"_id": 0, "user_id": 0})
+                    .sort("updated_at", -1))
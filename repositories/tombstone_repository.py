@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+from pymongo import ASCENDING
+
+
+class TombstoneRepository:
+    def __init__(self, mongo_db):
+        self.tombstones_collection = mongo_db["tombstones"]
+
+    def ensure_indexes(self, ttl_seconds):
+        self.tombstones_collection.create_index([("collection", ASCENDING), ("deleted_at", ASCENDING)])
+        self.tombstones_collection.create_index([("deleted_at", ASCENDING)], name="deleted_at_ttl",
+                                                expireAfterSeconds=ttl_seconds)
+
+    def record_deletions(self, collection, doc_ids, **fields):
+        if not doc_ids:
+            return
+        deleted_at = datetime.now(timezone.utc)
+        self.tombstones_collection.insert_many([
+            {"collection": collection, "doc_id": doc_id, "deleted_at": deleted_at, **fields}
+            for doc_id in doc_ids
+        ], ordered=False)
+
+    def get_deleted_ids_since(self, collection, since, **filters):
+        cursor = self.tombstones_collection.find(
+            {"collection": collection, "deleted_at": {"$gt": since}, **filters},
+            {"_id": 0, "doc_id": 1}
+        )
+        return [tombstone["doc_id"] for tombstone in cursor]
@@ -1,40 +1,136 @@
-from pymongo import MongoClient
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, MongoClient, UpdateOne
 from firebase_admin import firestore
 from bson.objectid import ObjectId
+from google.api_core.retry import Retry, if_transient_error
+
+import unit_of_work
+from circuit_breaker import read_through
+from models.user import PROFILE_FIELDS, user_targets
+
+MIRROR_PROJECTION = {"pseudonym": 1, "profile": 1}
 
 class UserRepository:
-    def __init__(self, mongo_db, firestore_db):
+    def __init__(self, mongo_db, firestore_db, analytics_read_preference=None, firestore_breaker=None,
+                 firestore_timeout=None, stale_cache=None, profile_mirror_reads=False):
         self.mongo_users_collection = mongo_db["users_objects"]
+        # Used by admin listings only; login and sync must see a user created a moment ago
+        self.analytics_mongo_users_collection = self.mongo_users_collection.with_options(
+            read_preference=analytics_read_preference) if analytics_read_preference else self.mongo_users_collection
+        self.firestore_db = firestore_db
         self.users_collection = firestore_db.collection("users_test")
+        self.firestore_breaker = firestore_breaker
+        # Deadline of each Firestore call, transient-error retries included
+        self._firestore_options = {
+            "timeout": firestore_timeout,
+            "retry": Retry(predicate=if_transient_error, initial=0.1, maximum=1, timeout=firestore_timeout),
+        } if firestore_timeout else {}
+        self.stale_cache = stale_cache
+        # Profile reads from users_objects.profile instead of Firestore (see ProfileMirrorService)
+        self.profile_mirror_reads = profile_mirror_reads
+
+    def ensure_indexes(self):
+        self.mongo_users_collection.create_index("pseudonym")
+        # Cohort lookups on the mirrored profile
+        self.mongo_users_collection.create_index([("profile.role", ASCENDING), ("profile.filieres", ASCENDING)])
+        self.mongo_users_collection.create_index([("profile.role", ASCENDING), ("profile.years", ASCENDING)])
+
+    # Every Firestore round trip goes through here: deadline, then the breaker
+    def _firestore(self, fn, *args, **kwargs):
+        kwargs.update(self._firestore_options)
+        if self.firestore_breaker is None:
+            return fn(*args, **kwargs)
+        return self.firestore_breaker.call(fn, *args, **kwargs)
+
+    # Credential checks pass allow_stale=False: the stale copy may hold an old password hash or pseudonym
+    def find_user_by_pseudonym(self, pseudonym, allow_stale=True):
+        if not allow_stale:
+            return self._find_user_by_pseudonym(pseudonym)
+        return read_through(self.stale_cache, ("profile", pseudonym), self._find_user_by_pseudonym, pseudonym)
 
-    def find_user_by_pseudonym(self, pseudonym):
-        user_query = self.users_collection.where("pseudonym", "==", pseudonym).limit(1).get()
+    def _find_user_by_pseudonym(self, pseudonym):
+        user_query = self._firestore(self.users_collection.where("pseudonym", "==", pseudonym).limit(1).get)
         return next(iter(user_query), None)
 
+    # Profile of a users_objects document: its mirror when enabled and filled, Firestore otherwise
+    def get_profile(self, mongo_user):
+        profile = mongo_user.get("profile") if self.profile_mirror_reads else None
+        if profile is not None:
+            return {**profile, "pseudonym": mongo_user["pseudonym"]}
+        user_query = self.find_user_by_pseudonym(mongo_user["pseudonym"])
+        return user_query.to_dict() if user_query else None
+
+    def get_user_document(self, doc_id):
+        return self._firestore(self.users_collection.document(doc_id).get)
+
+    def set_user_document(self, doc_id, user_data):
+        self._firestore(self.users_collection.document(doc_id).set, user_data)
+
     def find_mongo_user_by_pseudonym(self, pseudonym):
         return self.mongo_users_collection.find_one({"pseudonym": pseudonym})
 
+    def get_mongo_ids_by_pseudonym(self, pseudonyms):
+        return {u["pseudonym"]: u["_id"] for u in self.analytics_mongo_users_collection.find(
+            {"pseudonym": {"$in": list(pseudonyms)}}, {"pseudonym": 1})}
+
     def find_mongo_user_by_id(self, user_id):
-        return self.mongo_users_collection.find_one({"_id": ObjectId(user_id)})
+        return read_through(self.stale_cache, ("mongo_user", user_id), self.mongo_users_collection.find_one,
+                            {"_id": ObjectId(user_id)})
 
     def sync_user_to_mongo(self, pseudonym):
         existing_user = self.find_mongo_user_by_pseudonym(pseudonym)
         if not existing_user:
-            result = self.mongo_users_collection.insert_one({"pseudonym": pseudonym})
-            return result.inserted_id
+            return unit_of_work.insert(self.mongo_users_collection, {"pseudonym": pseudonym})
         return existing_user["_id"]
 
+    def sync_users_to_mongo(self, pseudonyms):
+        ids = {u["pseudonym"]: u["_id"] for u in self.mongo_users_collection.find(
+            {"pseudonym": {"$in": pseudonyms}}, {"pseudonym": 1})}
+        missing = [{"pseudonym": pseudonym} for pseudonym in pseudonyms if pseudonym not in ids]
+        if missing:
+            self.mongo_users_collection.insert_many(missing, ordered=False)
+            ids.update({doc["pseudonym"]: doc["_id"] for doc in missing})
+        return ids
+
+    def find_existing_pseudonyms(self, pseudonyms):
+        refs = [self.users_collection.document(pseudonym) for pseudonym in pseudonyms]
+
+        # get_all() streams: read it inside the guarded call
+        def existing(**options):
+            return {snapshot.id for snapshot in self.firestore_db.get_all(refs, **options) if snapshot.exists}
+        return self._firestore(existing)
+
+    # One batched commit (max 500 writes); create() makes the whole batch fail if any user exists
+    def create_users_in_firestore_batch(self, users):
+        batch = self.firestore_db.batch()
+        for pseudonym, user_data in users:
+            batch.create(self.users_collection.document(pseudonym), user_data)
+        self._firestore(batch.commit)
+
+    def create_user_in_firestore(self, pseudonym, user_data):
+        self._firestore(self.users_collection.document(pseudonym).create, user_data)
+
     def add_user_to_firestore(self, transaction, pseudonym, user_data):
         doc_ref = self.users_collection.document(pseudonym)
-        snapshot = doc_ref.get(transaction=transaction)
+        snapshot = self._firestore(doc_ref.get, transaction=transaction)
         if snapshot.exists:
             raise ValueError("Utilisateur existe déjà ")
         transaction.set(doc_ref, user_data)
         return True
 
-    def update_user(self, email, update_data):
-        user_ref = self.users_collection.document(email)
-        user_ref.update(update_data)
+    # `pseudonym` is the one stored before the update: profiles are cached by pseudonym, not doc id
+    def update_user(self, doc_id, update_data, pseudonym=None):
+        user_ref = self.users_collection.document(doc_id)
+        self._firestore(user_ref.update, update_data)
+        # A profile edited since, or its old pseudonym, must not come back from the stale cache
+        self._discard_profiles(pseudonym, update_data.get("pseudonym"))
+
+    def _discard_profiles(self, *pseudonyms):
+        if self.stale_cache is not None:
+            for pseudonym in pseudonyms:
+                if pseudonym:
+                    self.stale_cache.discard(("profile", pseudonym))
 
     def update_mongo_user_pseudonym(self, old_pseudonym, new_pseudonym):
         self.mongo_users_collection.update_one(
@@ -44,24 +140,65 @@ class UserRepository:
 
     def delete_user(self, username):
         doc_ref = self.users_collection.document(username)
-        doc = doc_ref.get()
+        doc = self._firestore(doc_ref.get)
         if doc.exists:
-            doc_ref.delete()
+            self._firestore(doc_ref.delete)
+            self._discard_profiles(username, doc.to_dict().get("pseudonym"))
             self.mongo_users_collection.delete_one({"pseudonym": username})
             return True
         return False
 
+    # Firestore profiles keyed like users_objects: by pseudonym, or by document id (the email) for
+    # Google accounts that have not chosen one yet
+    def get_firestore_profiles(self):
+        query = self.users_collection.select(PROFILE_FIELDS + ("pseudonym",))
+        profiles = {}
+        for snapshot in self._firestore(query.get):
+            user_data = snapshot.to_dict()
+            profiles[user_data.get("pseudonym") or snapshot.id] = user_data
+        return profiles
+
+    def get_profile_mirrors(self):
+        return {doc["pseudonym"]: doc["profile"] for doc in self.mongo_users_collection.find(
+            {"profile": {"$exists": True}}, MIRROR_PROJECTION)}
+
+    # {pseudonym: mirrored profile}; creates the users_objects document of a user never synced
+    def set_profile_mirrors(self, profiles):
+        now = datetime.now(timezone.utc)
+        requests = [UpdateOne({"pseudonym": pseudonym}, {"$set": {"profile": profile, "profile_synced_at": now}},
+                              upsert=True) for pseudonym, profile in profiles.items()]
+        if requests:
+            self.mongo_users_collection.bulk_write(requests, ordered=False)
+
+    def clear_profile_mirrors(self, pseudonyms):
+        self.mongo_users_collection.update_many({"pseudonym": {"$in": list(pseudonyms)}},
+                                                {"$unset": {"profile": "", "profile_synced_at": ""}})
+
+    @staticmethod
+    def _from_mirror(doc):
+        return {**doc["profile"], "pseudonym": doc["pseudonym"], "mongo_user_id": doc["_id"]}
+
     def get_all_users(self):
+        return read_through(self.stale_cache, ("all_users",), self._get_all_users)
+
+    def _get_all_users(self):
+        if self.profile_mirror_reads:
+            firestore_users = [self._from_mirror(doc) for doc in self.analytics_mongo_users_collection.find(
+                {"profile": {"$exists": True}}, MIRROR_PROJECTION)]
+        else:
+            firestore_users = [u.to_dict() for u in self._firestore(self.users_collection.get)]
+            mongo_ids = self.get_mongo_ids_by_pseudonym({u.get("pseudonym") for u in firestore_users})
+            for u_dict in firestore_users:
+                u_dict["mongo_user_id"] = mongo_ids.get(u_dict.get("pseudonym"))
         users = []
-        for u in self.users_collection.get():
-            u_dict = u.to_dict()
-            mongo_user = self.mongo_users_collection.find_one({"pseudonym": u_dict.get("pseudonym")})
+        for u_dict in firestore_users:
+            mongo_user_id = u_dict["mongo_user_id"]
             user = {
                 "pseudonym": u_dict.get("pseudonym", ""),
                 "role": u_dict.get("role", ""),
                 "email_address": u_dict.get("email_address", ""),
                 "gender": u_dict.get("gender", ""),
-                "mongo_user_id": str(mongo_user["_id"]) if mongo_user else None
+                "mongo_user_id": str(mongo_user_id) if mongo_user_id else None
             }
             if u_dict.get("role") == "student":
                 user.update({
@@ -74,4 +211,31 @@ class UserRepository:
         return users
 
     def get_students(self):
-        return [u.to_dict() for u in self.users_collection.where("role", "==", "student").get()]
\ No newline at end of file
+        return read_through(self.stale_cache, ("students",), self._get_students)
+
+    # Student profiles, each with its users_objects `_id` as mongo_user_id (None if never synced)
+    def _get_students(self):
+        if self.profile_mirror_reads:
+            return [self._from_mirror(doc) for doc in self.analytics_mongo_users_collection.find(
+                {"profile.role": "student"}, MIRROR_PROJECTION)]
+        students = [u.to_dict() for u in self._firestore(self.users_collection.where("role", "==", "student").get)]
+        mongo_ids = self.get_mongo_ids_by_pseudonym({student.get("pseudonym") for student in students})
+        for student in students:
+            student["mongo_user_id"] = mongo_ids.get(student.get("pseudonym"))
+        return students
+
+    # users_objects ids of the students of a filière and/or year
+    def find_student_ids(self, filiere=None, year=None):
+        if self.profile_mirror_reads:
+            query = {"profile.role": "student"}
+            if filiere:
+                query["profile.filieres"] = filiere
+            if year:
+                query["profile.years"] = year
+            return [doc["_id"] for doc in self.analytics_mongo_users_collection.find(query, {"_id": 1})]
+        student_ids = []
+        for student in self.get_students():
+            filieres, years = user_targets(student)
+            if student["mongo_user_id"] and (not filiere or filiere in filieres) and (not year or year in years):
+                student_ids.append(student["mongo_user_id"])
+        return student_ids
\ No newline at end of file
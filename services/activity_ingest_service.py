@@ -0,0 +1,88 @@
+import threading
+import uuid
+
+from models.activity import ActivityIn
+from models.fields import ModelError
+from services.activity_service import scoped_idempotency_key
+
+SYNC = "sync"
+QUEUED = "queued"
+INGEST_MODES = (SYNC, QUEUED)
+
+
+# Queued mode for /log_activity: the request only validates and appends to the local queue
+# (202); a background thread replays entries through ActivityService. Rejections (unknown user
+# or category) are parked as dead entries; any other failure is retried with backoff, forever,
+# so a database outage only delays ingestion.
+class ActivityIngestService:
+    def __init__(self, activity_queue_repository, activity_service, metrics=None, batch_size=100,
+                 max_backoff_seconds=300, lease_seconds=60, poll_seconds=1):
+        self.activity_queue_repository = activity_queue_repository
+        self.activity_service = activity_service
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        if metrics is not None:
+            metrics.describe("activity_queue_processed_total", "Queued activities replayed, by outcome")
+
+    def enqueue(self, data, idempotency_key=None):
+        try:
+            activity_in = ActivityIn.from_json(data)
+        except ModelError as e:
+            return {"message": "Missing data", "error": str(e)}, 400
+        idempotency_key = idempotency_key or data.get("idempotency_key") or uuid.uuid4().hex
+        self.activity_queue_repository.enqueue(scoped_idempotency_key(activity_in.username, idempotency_key), data)
+        self.ensure_worker()
+        self._wakeup.set()
+        return {"message": "Activité reçue", "idempotency_key": idempotency_key}, 202
+
+    def _count(self, outcome, value=1):
+        if self.metrics is not None and value:
+            self.metrics.inc("activity_queue_processed_total", {"outcome": outcome}, value)
+
+    def drain_once(self):
+        entries = self.activity_queue_repository.claim_batch(self.batch_size, self.lease_seconds)
+        done = []
+        for entry in entries:
+            try:
+                response, status = self.activity_service.log_activity(
+                    entry["payload"], idempotency_key=entry["idempotency_key"])
+            except Exception as e:
+                delay = min(2 ** entry["attempts"], self.max_backoff_seconds)
+                self.activity_queue_repository.retry_later(entry["id"], delay, str(e))
+                self._count("retried")
+                continue
+            if status < 400:
+                done.append(entry["id"])
+            else:
+                self.activity_queue_repository.mark_dead(entry["id"], response.get("message"))
+                self._count("rejected")
+        self.activity_queue_repository.delete(done)
+        self._count("stored", len(done))
+        return len(entries)
+
+    def ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="activity-ingest", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                # A full batch means more is probably waiting: keep going without sleeping
+                if self.drain_once() >= self.batch_size:
+                    continue
+            except Exception as e:
+                print(f"DEBUG: Activity queue drain failed: {str(e)}")
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+    def stats(self):
+        return self.activity_queue_repository.stats()
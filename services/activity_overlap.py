@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from sortedcontainers import SortedList
+
+OFF = "off"
+FLAG = "flag"
+REJECT = "reject"
+MERGE = "merge"
+OVERLAP_POLICIES = (OFF, FLAG, REJECT, MERGE)
+
+
+def overlap_clusters(intervals):
+    # Groups (start, end, id) intervals into chains of overlapping ones; singletons are dropped
+    clusters = []
+    current, current_end = [], None
+    for interval in sorted(intervals, key=lambda i: (i[0], i[1])):
+        if current and interval[0] < current_end:
+            current.append(interval)
+            current_end = max(current_end, interval[1])
+            continue
+        if len(current) > 1:
+            clusters.append(current)
+        current, current_end = [interval], interval[1]
+    if len(current) > 1:
+        clusters.append(current)
+    return clusters
+
+
+# One user's activities as (start, end, id) sorted by start. An interval overlapping
+# [start, end) starts before `end` and, being at most max_length long, no earlier than
+# start - max_length: a bisect on each bound then a scan of that slice answers the query.
+class _UserIntervals:
+    __slots__ = ("intervals", "max_length", "loaded_at")
+
+    def __init__(self, intervals, loaded_at):
+        self.intervals = SortedList(intervals)
+        self.max_length = max((end - start for start, end, _ in intervals), default=timedelta(0))
+        self.loaded_at = loaded_at
+
+    def add(self, start, end, activity_id):
+        self.intervals.add((start, end, activity_id))
+        self.max_length = max(self.max_length, end - start)
+
+    def discard(self, interval):
+        self.intervals.discard(interval)
+
+    def overlapping(self, start, end):
+        low = self.intervals.bisect_left((start - self.max_length,))
+        high = self.intervals.bisect_left((end,))
+        return [interval for interval in self.intervals.islice(low, high) if interval[1] > start]
+
+
+# Per-worker LRU of users' intervals, loaded from the {user_id, start_time, end_time} index on
+# first use and reloaded after ttl_seconds so activities written by other workers show up.
+# Times are naive UTC, as stored by Mongo and decoded by ActivityIn.
+class ActivityOverlapIndex:
+    def __init__(self, activity_repository, max_users=5000, ttl_seconds=60):
+        self.activity_repository = activity_repository
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None and now - user.loaded_at < self.ttl_seconds:
+                self._users.move_to_end(user_id)
+                return user
+        user = _UserIntervals(self.activity_repository.get_intervals(user_id), now)
+        with self._lock:
+            self._users[user_id] = user
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return user
+
+    def find_overlaps(self, user_id, start, end):
+        user = self._user(user_id)
+        with self._lock:
+            return user.overlapping(start, end)
+
+    def add(self, user_id, start, end, activity_id):
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                user.add(start, end, activity_id)
+
+    def replace(self, user_id, removed, added):
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                for interval in removed:
+                    user.discard(interval)
+                user.add(*added)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
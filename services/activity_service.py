@@ -1,25 +1,172 @@
-from datetime import datetime
+import base64
+import hashlib
+from datetime import datetime, timedelta
 from bson.objectid import ObjectId
 
+import unit_of_work
+from models.activity import ActivityIn
+from models.fields import ModelError, naive_utc, object_id
+from repositories.activity_repository import CLASSIC
+from services.activity_overlap import FLAG, MERGE, OFF, OVERLAP_POLICIES, REJECT, overlap_clusters
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_page_cursor(activity):
+    raw = f"{activity.start_time.isoformat()}|{activity._id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_page_cursor(cursor):
+    start_time, activity_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+    return datetime.fromisoformat(start_time), object_id(activity_id, "cursor")
+
+def scoped_idempotency_key(username, idempotency_key):
+    # Clients pick their keys (e.g. a per-device counter): two users may send the same one.
+    # The length prefix keeps ("a:b", "c") and ("a", "b:c") apart.
+    return f"{len(username)}:{username}:{idempotency_key}"
+
+
+def activity_id_for_key(idempotency_key):
+    # Same key, same _id: a replayed queue entry cannot insert the activity twice. Queued keys
+    # are scoped by user (scoped_idempotency_key), so users never share an _id.
+    return ObjectId(hashlib.sha256(idempotency_key.encode("utf-8")).digest()[:12])
+
+
 class ActivityService:
-    def __init__(self, user_repository, diary_repository, activity_repository, category_repository, log_service):
+    def __init__(self, user_repository, diary_repository, activity_repository, category_repository, log_service,
+                 overlap_index=None, overlap_policy=OFF, metrics=None):
+        if overlap_policy not in OVERLAP_POLICIES:
+            raise ValueError(f"Unknown activity overlap policy: {overlap_policy}")
         self.user_repository = user_repository
         self.diary_repository = diary_repository
         self.activity_repository = activity_repository
         self.category_repository = category_repository
         self.log_service = log_service
+        self.overlap_index = overlap_index if overlap_policy != OFF else None
+        self.overlap_policy = overlap_policy
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.describe("activity_overlaps_total", "New activities overlapping a stored one, by action")
+
+    # Returns (ActivityIn, None) or (None, (error, status))
+    @staticmethod
+    def _parse_activity(data):
+        try:
+            return ActivityIn.from_json(data), None
+        except ModelError as e:
+            return None, ({"message": "Missing data", "error": str(e)}, 400)
 
-    def log_activity(self, data):
-        username = data.get("username")
-        activity_name = data.get("activity")
-        start_time = data.get("start_time")
-        end_time = data.get("end_time")
-        duration = data.get("duration_seconds")
-        category_name = data.get("category")
+    # Validates /activities query parameters; returns (params, None) or (None, (error, status))
+    @staticmethod
+    def _parse_page_request(args, category_map):
+        user_id = args.get("mongo_user_id")
+        if not user_id:
+            return None, ({"message": "mongo_user_id requis"}, 400)
+        try:
+            params = {"user_id": object_id(user_id, "mongo_user_id")}
+            if args.get("start"):
+                params["start"] = naive_utc(datetime.fromisoformat(args["start"]))
+            else:
+                today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+                params["start"] = today - timedelta(days=today.weekday())
+            params["end"] = naive_utc(datetime.fromisoformat(args["end"])) if args.get("end") \
+                else params["start"] + timedelta(days=7)
+            params["limit"] = min(int(args.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            params["after"] = decode_page_cursor(args["cursor"]) if args.get("cursor") else None
+        except (ValueError, TypeError, UnicodeDecodeError) as e:
+            return None, ({"message": "Paramètres invalides", "error": str(e)}, 400)
+        if params["end"] <= params["start"] or params["limit"] < 1:
+            return None, ({"message": "Paramètres invalides"}, 400)
 
-        if not all([username, activity_name, start_time, end_time]) or duration is None:
-            self.log_service.log_event("log_activity_fail", "Missing data", username)
-            return {"message": "Missing data"}, 400
+        params["category_id"] = None
+        category_name = args.get("category")
+        if category_name:
+            if category_name not in category_map:
+                return None, ({"message": f"Catégorie '{category_name}' non trouvée"}, 404)
+            params["category_id"] = category_map[category_name]
+        return params, None
+
+    @staticmethod
+    def _page_response(activities, has_more):
+        return {
+            "activities": activities,
+            "next_cursor": encode_page_cursor(activities[-1]) if has_more and activities else None
+        }
+
+    def get_activities(self, args):
+        category_map = self.category_repository.get_category_map() if args.get("category") else {}
+        params, error = self._parse_page_request(args, category_map)
+        if error:
+            return error
+        activities, has_more = self.activity_repository.get_activities_page(**params)
+        return self._page_response(activities, has_more), 200
+
+    # Stored activities overlapping the new one, as (start, end, _id); a replay of the same
+    # activity (same preset _id) does not count
+    def _find_overlaps(self, mongo_user_id, activity_in, activity_id):
+        if self.overlap_index is None:
+            return []
+        overlaps = self.overlap_index.find_overlaps(mongo_user_id, activity_in.start_time, activity_in.end_time)
+        return [interval for interval in overlaps if interval[2] != activity_id]
+
+    def _count_overlap(self, action):
+        if self.metrics is not None:
+            self.metrics.inc("activity_overlaps_total", {"action": action})
+
+    # The earliest overlapping activity is stretched over the union; the others are deleted
+    def _merge_activity(self, mongo_user_id, activity_in, overlaps, username):
+        keep = min(overlaps)
+        start = min(activity_in.start_time, *(interval[0] for interval in overlaps))
+        end = max(activity_in.end_time, *(interval[1] for interval in overlaps))
+        removed = [interval[2] for interval in overlaps if interval is not keep]
+        self.activity_repository.merge_activities(mongo_user_id, keep[2], start, end, removed)
+        unit_of_work.after_write(lambda: self.overlap_index.replace(mongo_user_id, overlaps, (start, end, keep[2])))
+        self._count_overlap(MERGE)
+        self.log_service.log_event("activity_merge", f"Activité '{activity_in.activity}' fusionnée avec {keep[2]}",
+                                   username)
+        return {"message": "Activité fusionnée avec une activité existante", "activity_id": str(keep[2])}, 200
+
+    # Batch cleanup of activities stored before the policy was enforced (tools/fix_overlaps.py).
+    # Each chain of overlapping activities is merged into its earliest one, or each member is
+    # flagged with the others' ids; dry_run only counts.
+    def resolve_overlaps(self, action, user_ids=None, dry_run=False):
+        if action not in (MERGE, FLAG):
+            raise ValueError(f"Unknown overlap action: {action}")
+        summary = {"users_scanned": 0, "users_with_overlaps": 0, "clusters": 0, "activities": 0}
+        for user_id in user_ids if user_ids is not None else self.activity_repository.get_activity_user_ids():
+            summary["users_scanned"] += 1
+            clusters = overlap_clusters(self.activity_repository.get_intervals(user_id))
+            if not clusters:
+                continue
+            summary["users_with_overlaps"] += 1
+            summary["clusters"] += len(clusters)
+            summary["activities"] += sum(len(cluster) for cluster in clusters)
+            if dry_run:
+                continue
+            for cluster in clusters:
+                ids = [interval[2] for interval in cluster]
+                if action == MERGE:
+                    self.activity_repository.merge_activities(
+                        user_id, ids[0], cluster[0][0], max(interval[1] for interval in cluster), ids[1:])
+                else:
+                    for activity_id in ids:
+                        self.activity_repository.flag_overlaps(activity_id, [i for i in ids if i != activity_id])
+            if self.overlap_index is not None:
+                self.overlap_index.invalidate(user_id)
+            self.log_service.log_event("activity_overlap_fix",
+                                       f"{len(clusters)} chevauchement(s) traité(s) ({action}) pour {user_id}")
+        return summary
+
+    def log_activity(self, data, idempotency_key=None):
+        activity_in, error = self._parse_activity(data)
+        if error:
+            self.log_service.log_event("log_activity_fail", "Missing data",
+                                       data.get("username") if isinstance(data, dict) else None)
+            return error
+        username = activity_in.username
+        category_name = activity_in.category
 
         user = self.user_repository.find_user_by_pseudonym(username)
         if not user:
@@ -40,20 +187,30 @@ class ActivityService:
             self.log_service.log_event("log_activity_fail", f"Catégorie '{category_name}' non trouvée", username)
             return {"message": f"Catégorie '{category_name}' non trouvée"}, 404
 
+        activity_id = activity_id_for_key(idempotency_key) if idempotency_key else ObjectId()
+        overlaps = self._find_overlaps(mongo_user_id, activity_in, activity_id)
+        if overlaps and self.overlap_policy == REJECT:
+            self._count_overlap(REJECT)
+            self.log_service.log_event("log_activity_fail", "Activité en chevauchement", username)
+            return {"message": "Activité en chevauchement avec une activité existante",
+                    "overlaps": [str(interval[2]) for interval in overlaps]}, 409
+        if overlaps and self.overlap_policy == MERGE and self.activity_repository.storage_mode == CLASSIC:
+            return self._merge_activity(mongo_user_id, activity_in, overlaps, username)
+
         diary_id = self.diary_repository.find_open_diary(mongo_user_id)
         if not diary_id:
             diary_id = self.diary_repository.create_diary(mongo_user_id)
 
-        activity_doc = {
-            "user_id": ObjectId(mongo_user_id),
-            "diary_id": diary_id,
-            "activity": activity_name,
-            "start_time": datetime.fromisoformat(start_time),
-            "end_time": datetime.fromisoformat(end_time),
-            "duration_seconds": duration,
-            "category_id": ObjectId(category_id) if category_id else None,
-        }
+        activity_doc = activity_in.to_document(mongo_user_id, diary_id, category_id, activity_id)
+        if overlaps:
+            # Flag policy, or merge where measurements cannot be rewritten (time-series storage)
+            activity_doc["overlaps_with"] = [interval[2] for interval in overlaps]
+            self._count_overlap("flagged")
 
-        self.activity_repository.log_activity(activity_doc)
-        self.log_service.log_event("activity_log", f"Activité '{activity_name}' enregistrée avec catégorie '{category_name}'", username)
-        return {"message": "Activity logged successfully"}, 200
\ No newline at end of file
+        if not self.activity_repository.log_activity(activity_doc, replay=idempotency_key is not None):
+            return {"message": "Activity already logged"}, 200
+        if self.overlap_index is not None:
+            unit_of_work.after_write(lambda: self.overlap_index.add(
+                mongo_user_id, activity_in.start_time, activity_in.end_time, activity_id))
+        self.log_service.log_event("activity_log", f"Activité '{activity_in.activity}' enregistrée avec catégorie '{category_name}'", username)
+        return {"message": "Activity logged successfully"}, 200
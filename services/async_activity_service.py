@@ -0,0 +1,83 @@
+import asyncio
+from repositories.activity_repository import CLASSIC
+from services.activity_overlap import MERGE, OFF, REJECT
+from services.activity_service import ActivityService
+
+class AsyncActivityService(ActivityService):
+    async def get_activities(self, args):
+        category_map = await self.category_repository.get_category_map() if args.get("category") else {}
+        params, error = self._parse_page_request(args, category_map)
+        if error:
+            return error
+        activities, has_more = await self.activity_repository.get_activities_page(**params)
+        return self._page_response(activities, has_more), 200
+
+    async def log_activity(self, data):
+        activity_in, error = self._parse_activity(data)
+        if error:
+            await self.log_service.log_event("log_activity_fail", "Missing data",
+                                             data.get("username") if isinstance(data, dict) else None)
+            return error
+        username = activity_in.username
+        category_name = activity_in.category
+
+        # Firestore profile, Mongo user and category map do not depend on each other
+        user, mongo_user, category_map = await asyncio.gather(
+            self.user_repository.find_user_by_pseudonym(username),
+            self.user_repository.find_mongo_user_by_pseudonym(username),
+            self.category_repository.get_category_map()
+        )
+        if not user:
+            await self.log_service.log_event("log_activity_fail", "Utilisateur non trouvé", username)
+            return {"message": "Utilisateur non trouvé"}, 404
+
+        if not mongo_user:
+            mongo_user_id = await self.user_repository.sync_user_to_mongo(username)
+        else:
+            mongo_user_id = mongo_user["_id"]
+
+        category_id = None
+        if category_name and category_name in category_map:
+            category_id = category_map[category_name]
+        elif category_name:
+            await self.log_service.log_event("log_activity_fail", f"Catégorie '{category_name}' non trouvée", username)
+            return {"message": f"Catégorie '{category_name}' non trouvée"}, 404
+
+        # Same ACTIVITY_OVERLAP_POLICY as the Flask app, looked up in Mongo on each request
+        overlaps = []
+        if self.overlap_policy != OFF:
+            overlaps = await self.activity_repository.get_overlapping_intervals(
+                mongo_user_id, activity_in.start_time, activity_in.end_time)
+        if overlaps and self.overlap_policy == REJECT:
+            self._count_overlap(REJECT)
+            await self.log_service.log_event("log_activity_fail", "Activité en chevauchement", username)
+            return {"message": "Activité en chevauchement avec une activité existante",
+                    "overlaps": [str(interval[2]) for interval in overlaps]}, 409
+        if overlaps and self.overlap_policy == MERGE and self.activity_repository.storage_mode == CLASSIC:
+            return await self._merge_activity(mongo_user_id, activity_in, overlaps, username)
+
+        diary_id = await self.diary_repository.find_open_diary(mongo_user_id)
+        if not diary_id:
+            diary_id = await self.diary_repository.create_diary(mongo_user_id)
+
+        activity_doc = activity_in.to_document(mongo_user_id, diary_id, category_id)
+        if overlaps:
+            activity_doc["overlaps_with"] = [interval[2] for interval in overlaps]
+            self._count_overlap("flagged")
+
+        await asyncio.gather(
+            self.activity_repository.log_activity(activity_doc),
+            self.log_service.log_event("activity_log", f"Activité '{activity_in.activity}' enregistrée avec catégorie '{category_name}'", username)
+        )
+        return {"message": "Activity logged successfully"}, 200
+
+    async def _merge_activity(self, mongo_user_id, activity_in, overlaps, username):
+        keep = min(overlaps)
+        start = min(activity_in.start_time, *(interval[0] for interval in overlaps))
+        end = max(activity_in.end_time, *(interval[1] for interval in overlaps))
+        removed = [interval[2] for interval in overlaps if interval is not keep]
+        await self.activity_repository.merge_activities(mongo_user_id, keep[2], start, end, removed)
+        self._count_overlap(MERGE)
+        await self.log_service.log_event("activity_merge", f"Activité '{activity_in.activity}' fusionnée avec {keep[2]}",
+                                         username)
+        return {"message": "Activité fusionnée avec une activité existante", "activity_id": str(keep[2])}, 200
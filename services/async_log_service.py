@@ -0,0 +1,13 @@
+from services.log_policy import DATABASE, LEVEL_NAMES
+from services.log_service import LogService
+
+class AsyncLogService(LogService):
+    async def log_event(self, event_type, message, user=None):
+        destination, severity = self.log_policy.route(event_type, user)
+        if destination == DATABASE:
+            await self.log_repository.log_event(event_type, message, user, LEVEL_NAMES.get(severity, "INFO"))
+        else:
+            self._write_to_file(event_type, message, user, severity)
+
+    async def get_logs(self):
+        return await self.log_repository.get_logs(), 200
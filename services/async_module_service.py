@@ -0,0 +1,13 @@
+from services.module_service import ModuleService
+
+class AsyncModuleService(ModuleService):
+    async def get_modules(self, data):
+        year = data.get("year")
+        studies = data.get("studies")
+        semester = data.get("semester")
+
+        if not all([year, studies, semester]):
+            return {"message": "Missing data"}, 400
+
+        modules = await self.module_repository.get_modules(year, studies, semester)
+        return modules, 200
@@ -0,0 +1,129 @@
+import asyncio
+from bson.objectid import ObjectId
+from models.fields import ModelError
+from models.response import SubmissionIn
+from models.user import UserProfile
+from services.questionnaire_service import QuestionnaireService
+
+
+class AsyncQuestionnaireService(QuestionnaireService):
+    async def get_questionnaires(self, data):
+        user_id = data.get("mongo_user_id")
+        if not user_id:
+            await self.log_service.log_event("get_questionnaires_fail", "mongo_user_id manquant")
+            return {"message": "mongo_user_id requis"}, 400
+
+        user = await self.user_repository.find_mongo_user_by_id(user_id)
+        if not user:
+            await self.log_service.log_event("get_questionnaires_fail",
+                                             f"Utilisateur non trouvé pour mongo_user_id: {user_id}")
+            return {"message": "Utilisateur non trouvé"}, 404
+
+        user_query = await self.user_repository.find_user_by_pseudonym(user["pseudonym"])
+        if not user_query:
+            await self.log_service.log_event("get_questionnaires_fail",
+                                             f"Utilisateur Firestore non trouvé pour pseudonym: {user['pseudonym']}")
+            return {"message": "Utilisateur Firestore non trouvé"}, 404
+
+        profile = UserProfile.from_firestore(user_query.to_dict())
+        if profile.role == "super_admin":
+            questionnaires = await self.questionnaire_repository.get_questionnaires(fetch_all=True)
+            return questionnaires, 200
+
+        user_filieres, user_years = profile.filieres, profile.years
+        if not user_years:
+            await self.log_service.log_event("get_questionnaires_fail", "Aucune année trouvée pour l'utilisateur",
+                                             user["pseudonym"])
+            return {"message": "Aucune année trouvée pour l'utilisateur"}, 400
+
+        try:
+            questionnaires = await self.questionnaire_repository.get_questionnaires(
+                user_id=user_id,
+                user_filieres=user_filieres,
+                user_years=user_years
+            )
+            unanswered_questionnaires = [q for q in questionnaires if not q["is_answered"]]
+            return unanswered_questionnaires, 200
+        except Exception as e:
+            await self.log_service.log_event("get_questionnaires_error",
+                                             f"Erreur lors de la récupération des questionnaires: {str(e)}",
+                                             user["pseudonym"])
+            return {"message": "Erreur lors de la récupération des questionnaires", "error": str(e)}, 500
+
+    async def get_questionnaire(self, questionnaire_id):
+        questionnaire, questions = await asyncio.gather(
+            self.questionnaire_repository.get_questionnaire_by_id(questionnaire_id),
+            self.question_repository.get_questions_by_questionnaire(questionnaire_id)
+        )
+        if not questionnaire:
+            return {"message": "Questionnaire non trouvé"}, 404
+        return self._questionnaire_detail(questionnaire, questions), 200
+
+    async def submit_questionnaire_response(self, data):
+        try:
+            submission = SubmissionIn.from_json(data)
+        except ModelError as e:
+            await self.log_service.log_event("submit_response_fail", f"Champs requis manquants ({e})")
+            return {"message": "Champs requis manquants", "error": str(e)}, 400
+        questionnaire_id = str(submission.questionnaire_id)
+        user_id = str(submission.user_id)
+
+        # One batched question lookup instead of one round trip per answer
+        questionnaire, questions = await asyncio.gather(
+            self.questionnaire_repository.get_questionnaire_by_id(submission.questionnaire_id),
+            self.question_repository.get_questions_for_grading(submission.question_ids())
+        )
+        if not questionnaire or not questionnaire.get("is_active"):
+            return {"message": "Questionnaire non trouvé ou désactivé"}, 404
+
+        processed_responses, points_by_question = self._grade_submission(submission, questions)
+
+        await asyncio.gather(
+            self.questionnaire_repository.submit_response(submission.to_document(processed_responses)),
+            self.log_service.log_event("submit_response", f"Réponses soumises pour le questionnaire {questionnaire_id}",
+                                       user_id)
+        )
+        if self.score_service is not None:
+            # Once the response is stored, as in the Flask app
+            await self._record_score(user_id, questionnaire, processed_responses, points_by_question)
+        return {"message": "Réponses enregistrées avec succès"}, 200
+
+    async def _record_score(self, user_id, questionnaire, processed_responses, points_by_question):
+        try:
+            points, max_points = self.score_service.score_submission(processed_responses, points_by_question)
+            await self.score_service.record_submission(user_id, questionnaire, points, max_points)
+        except Exception as e:
+            # The response is stored; tools/rebuild_scores.py can replay a missed ledger update
+            print(f"DEBUG: Score update failed for user {user_id}: {str(e)}")
+
+    async def get_user_responses(self, user_id, questionnaire_id):
+        response = await self.questionnaire_repository.get_user_responses(user_id, questionnaire_id)
+        if not response:
+            return {"message": "Aucune réponse trouvée"}, 404
+        return response, 200
+
+    async def get_user_answered_questionnaires(self, user_id):
+        try:
+            try:
+                ObjectId(user_id)
+            except Exception as e:
+                await self.log_service.log_event("get_answered_questionnaires_error", f"Invalid user_id {user_id}: {str(e)}")
+                return {"message": "Invalid user_id"}, 400
+
+            responses = await self.questionnaire_repository.get_user_answered_questionnaires(user_id)
+            if not responses:
+                return [], 200
+
+            questionnaire_ids = [response["questionnaire_id"] for response in responses]
+            questionnaires = await self.questionnaire_repository.get_questionnaires_by_ids(questionnaire_ids)
+
+            result, missing_ids = self._merge_answered(responses, questionnaires)
+            for q_id in missing_ids:
+                await self.log_service.log_event("get_answered_questionnaires_warning",
+                                                 f"Questionnaire {q_id} not found for user {user_id}")
+
+            return result, 200
+        except Exception as e:
+            await self.log_service.log_event("get_answered_questionnaires_error",
+                                             f"Erreur lors de la récupération des questionnaires répondus: {str(e)}", user_id)
+            return {"message": "Erreur lors de la récupération des questionnaires répondus", "error": str(e)}, 500
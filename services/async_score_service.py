@@ -0,0 +1,32 @@
+from bson.objectid import ObjectId
+
+from models.user import UserProfile
+from services.score_service import ScoreService, _category_key
+
+
+# Ledger updates for the ASGI app. It keeps no leaderboards: the Flask workers pick the new
+# totals up when they poll user_scores.
+class AsyncScoreService(ScoreService):
+    async def _user_profile(self, user_id, previous_total):
+        if previous_total is not None:
+            return previous_total.get("pseudonym"), previous_total.get("filieres", []), previous_total.get("years", [])
+        mongo_user = await self.user_repository.find_mongo_user_by_id(user_id)
+        pseudonym = mongo_user["pseudonym"] if mongo_user else None
+        user_query = await self.user_repository.find_user_by_pseudonym(pseudonym) if pseudonym else None
+        if not user_query:
+            return pseudonym, [], []
+        profile = UserProfile.from_firestore(user_query.to_dict())
+        return pseudonym, profile.filieres, profile.years
+
+    async def record_submission(self, user_id, questionnaire, points, max_points):
+        user_id = ObjectId(user_id)
+        category = _category_key(questionnaire.get("category"))
+        previous = await self.score_repository.record_entry(user_id, questionnaire["_id"], category, points,
+                                                            max_points)
+        deltas = self._deltas(category, points, previous)
+
+        previous_total = await self.score_repository.get_user_score(user_id)
+        if not deltas and previous_total is not None:
+            return previous_total
+        pseudonym, filieres, years = await self._user_profile(user_id, previous_total)
+        return await self.score_repository.apply_delta(user_id, deltas, pseudonym, filieres, years)
@@ -0,0 +1,22 @@
+import asyncio
+from services.user_service import UserService
+
+
+class AsyncUserService(UserService):
+    async def login(self, username, password):
+        user = await self.user_repository.find_user_by_pseudonym(username)
+        if not user:
+            await self.log_service.log_event("login_fail", "Utilisateur non trouvé", username)
+            return None, {"message": "Utilisateur non trouvé"}, 404
+
+        user_data = user.to_dict()
+        # bcrypt is CPU bound and releases the GIL, keep it off the event loop
+        if not await asyncio.to_thread(self._check_password, user_data, password):
+            await self.log_service.log_event("login_fail", "Mot de passe incorrect", username)
+            return None, {"message": "Mot de passe incorrect"}, 401
+
+        mongo_user_id, _ = await asyncio.gather(
+            self.user_repository.sync_user_to_mongo(username),
+            self.log_service.log_event("login_success", f"{username} s'est connecté avec succès", username)
+        )
+        return self._login_response(user_data, mongo_user_id), None, 200
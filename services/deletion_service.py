@@ -0,0 +1,193 @@
+import threading
+import time
+from bson.objectid import ObjectId
+
+from repositories.activity_repository import TIMESERIES_COLLECTION
+from repositories.deletion_job_repository import DONE, FAILED
+
+USER = "user"
+QUESTIONNAIRE = "questionnaire"
+
+
+# Dependent documents of each entity, purged after the entity itself is gone.
+# `tombstone` lists the fields copied into tombstones so /sync clients and leaderboards drop the rows too.
+def cascade_steps(entity, obj_id):
+    if entity == USER:
+        return [
+            {"collection": "activities", "filter": {"user_id": obj_id}},
+            {"collection": TIMESERIES_COLLECTION, "filter": {"meta.user_id": obj_id}, "batched": False},
+            {"collection": "diaries", "filter": {"user_id": obj_id}},
+            {"collection": "questionnaire_responses", "filter": {"user_id": obj_id}},
+            {"collection": "score_ledger", "filter": {"user_id": obj_id}},
+            # Tombstoned so every worker's leaderboards drop the user
+            {"collection": "user_scores", "filter": {"_id": obj_id}, "tombstone": []},
+            {"collection": "activity_watermarks", "filter": {"_id": obj_id}},
+        ]
+    if entity == QUESTIONNAIRE:
+        return [
+            {"collection": "questions", "filter": {"questionnaire_id": obj_id}, "tombstone": ["questionnaire_id"]},
+            {"collection": "questionnaire_responses", "filter": {"questionnaire_id": obj_id}, "tombstone": ["user_id"]},
+            # Each entry's points are taken back out of its user's totals
+            {"collection": "score_ledger", "filter": {"questionnaire_id": obj_id}, "reverse_scores": True},
+        ]
+    raise ValueError(f"Unknown entity: {entity}")
+
+
+# References checked by the orphan sweeper: (collection, field, entity, parent collection)
+ORPHAN_REFERENCES = (
+    ("activities", "user_id", USER, "users_objects"),
+    (TIMESERIES_COLLECTION, "meta.user_id", USER, "users_objects"),
+    ("diaries", "user_id", USER, "users_objects"),
+    ("questionnaire_responses", "user_id", USER, "users_objects"),
+    ("questions", "questionnaire_id", QUESTIONNAIRE, "questionnaires"),
+    ("questionnaire_responses", "questionnaire_id", QUESTIONNAIRE, "questionnaires"),
+    ("score_ledger", "questionnaire_id", QUESTIONNAIRE, "questionnaires"),
+)
+
+
+class DeletionService:
+    def __init__(self, user_repository, questionnaire_repository, deletion_job_repository, tombstone_repository,
+                 log_service, score_repository=None, batch_size=1000, batch_pause_ms=50, lease_seconds=300,
+                 poll_seconds=60):
+        self.user_repository = user_repository
+        self.questionnaire_repository = questionnaire_repository
+        self.deletion_job_repository = deletion_job_repository
+        self.tombstone_repository = tombstone_repository
+        self.log_service = log_service
+        self.score_repository = score_repository
+        self.batch_size = batch_size
+        self.batch_pause_ms = batch_pause_ms
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _schedule(self, entity, obj_id, origin="request"):
+        job = self.deletion_job_repository.create_job(entity, str(obj_id), cascade_steps(entity, obj_id), origin)
+        self._ensure_worker()
+        self._wakeup.set()
+        return job["_id"]
+
+    def delete_user(self, username):
+        mongo_user = self.user_repository.find_mongo_user_by_pseudonym(username)
+        if not self.user_repository.delete_user(username):
+            self.log_service.log_event("delete_user_fail", f"Utilisateur non trouvé : {username}", username)
+            return {"message": "Utilisateur non trouvé"}, 404
+        response = {"message": "Utilisateur supprimé"}
+        if mongo_user:
+            response["deletion_job_id"] = self._schedule(USER, mongo_user["_id"])
+        self.log_service.log_event("delete_user", f"Utilisateur supprimé : {username}", username)
+        return response, 200
+
+    def delete_questionnaire(self, questionnaire_id):
+        if not self.questionnaire_repository.delete_questionnaire(questionnaire_id):
+            self.log_service.log_event("delete_questionnaire_fail", f"Questionnaire non trouvé: {questionnaire_id}")
+            return {"message": "Questionnaire non trouvé"}, 404
+        job_id = self._schedule(QUESTIONNAIRE, ObjectId(questionnaire_id))
+        self.log_service.log_event("delete_questionnaire", f"Questionnaire supprimé: {questionnaire_id}")
+        return {"message": "Questionnaire supprimé avec succès", "deletion_job_id": job_id}, 200
+
+    def _reverse_scores(self, job_id, step):
+        questionnaire_id = step["filter"]["questionnaire_id"]
+        pending = 0
+        while self.score_repository.reverse_questionnaire_entry(questionnaire_id) is not None:
+            pending += 1
+            if pending == self.batch_size:
+                self.deletion_job_repository.record_progress(job_id, step["collection"], pending, self.lease_seconds)
+                pending = 0
+        self.deletion_job_repository.record_progress(job_id, step["collection"], pending, self.lease_seconds)
+
+    def _run_step(self, job_id, step):
+        collection = step["collection"]
+        if step.get("reverse_scores"):
+            self._reverse_scores(job_id, step)
+            return
+        if not step.get("batched", True):
+            deleted = self.deletion_job_repository.delete_all(collection, step["filter"])
+            self.deletion_job_repository.record_progress(job_id, collection, deleted, self.lease_seconds)
+            return
+        tombstone_fields = step.get("tombstone")
+        while True:
+            docs = self.deletion_job_repository.delete_batch(
+                collection, step["filter"], self.batch_size, tombstone_fields or ())
+            if not docs:
+                return
+            if tombstone_fields is not None:
+                by_fields = {}
+                for doc in docs:
+                    by_fields.setdefault(tuple(doc.get(field) for field in tombstone_fields), []).append(doc["_id"])
+                for values, doc_ids in by_fields.items():
+                    self.tombstone_repository.record_deletions(collection, doc_ids, **dict(zip(tombstone_fields, values)))
+            self.deletion_job_repository.record_progress(job_id, collection, len(docs), self.lease_seconds)
+            # Leave room for foreground traffic between batches
+            if self.batch_pause_ms:
+                time.sleep(self.batch_pause_ms / 1000)
+
+    def _process(self, job):
+        try:
+            # Steps are idempotent: a job resumed after a crash simply finds fewer documents
+            for step in job["steps"]:
+                self._run_step(job["_id"], step)
+            self.deletion_job_repository.finish_job(job["_id"], DONE)
+            return True
+        except Exception as e:
+            print(f"DEBUG: Deletion job {job['_id']} failed: {str(e)}")
+            self.deletion_job_repository.finish_job(job["_id"], FAILED, str(e))
+            return False
+
+    def run_pending(self):
+        processed = 0
+        while True:
+            job = self.deletion_job_repository.claim_next_job(self.lease_seconds)
+            if job is None:
+                return processed
+            self._process(job)
+            processed += 1
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="deletion-worker", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"DEBUG: Deletion worker error: {str(e)}")
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+    def sweep_orphans(self, dry_run=False):
+        orphans = {USER: set(), QUESTIONNAIRE: set()}
+        for collection, field, entity, parent_collection in ORPHAN_REFERENCES:
+            referenced = self.deletion_job_repository.distinct_references(collection, field)
+            existing = self.deletion_job_repository.existing_ids(parent_collection, referenced)
+            orphans[entity].update(referenced - existing)
+
+        scheduled = []
+        if not dry_run:
+            for entity, ids in orphans.items():
+                for obj_id in ids:
+                    if not self.deletion_job_repository.has_active_job(entity, str(obj_id)):
+                        scheduled.append(self._schedule(entity, obj_id, origin="sweep"))
+        return {
+            "orphan_users": sorted(str(obj_id) for obj_id in orphans[USER]),
+            "orphan_questionnaires": sorted(str(obj_id) for obj_id in orphans[QUESTIONNAIRE]),
+            "scheduled_jobs": scheduled
+        }
+
+    def get_job(self, job_id):
+        try:
+            job = self.deletion_job_repository.get_job(ObjectId(job_id))
+        except Exception:
+            return {"message": "Identifiant de tâche invalide"}, 400
+        if not job:
+            return {"message": "Tâche non trouvée"}, 404
+        return job, 200
+
+    def get_jobs(self, status=None):
+        return self.deletion_job_repository.get_jobs(status), 200
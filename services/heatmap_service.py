@@ -0,0 +1,195 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+from bson.objectid import ObjectId
+
+from services.leaderboard import FILIERE, YEAR
+
+HOUR = 3600
+DAY = 24 * HOUR
+BUCKETS = 7 * 24
+UNCATEGORIZED = "Autre"
+
+
+def _utc_offset(tz, second):
+    return int(datetime.fromtimestamp(second, tz).utcoffset().total_seconds())
+
+
+# UTC offset of `tz` at each of the given UTC epoch seconds. The offset is sampled once per day
+# over the data's range and each change is bisected to the second, so the per-row lookup is a
+# single searchsorted instead of one tz conversion per activity.
+def local_offsets(utc_seconds, tz):
+    if utc_seconds.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    first = int(utc_seconds.min()) // DAY * DAY
+    points, offsets = [first], [_utc_offset(tz, first)]
+    for day in range(first + DAY, int(utc_seconds.max()) + DAY, DAY):
+        offset = _utc_offset(tz, day)
+        if offset == offsets[-1]:
+            continue
+        low, high = day - DAY, day
+        while high - low > 1:
+            middle = (low + high) // 2
+            if _utc_offset(tz, middle) == offsets[-1]:
+                low = middle
+            else:
+                high = middle
+        points.append(high)
+        offsets.append(offset)
+    return np.asarray(offsets, dtype=np.int64)[np.searchsorted(points, utc_seconds, side="right") - 1]
+
+
+# Minutes per (category, weekday, hour) for intervals given as local epoch seconds. Each interval
+# is expanded into one piece per hour it touches (np.repeat), pieces are clipped to their hour
+# and summed into the grid with a single bincount: no Python loop over activities.
+def heatmap_minutes(starts, ends, category_index, category_count):
+    keep = ends > starts
+    starts, ends, category_index = starts[keep], ends[keep], category_index[keep]
+    first_hour = starts // HOUR
+    pieces = (ends - 1) // HOUR - first_hour + 1
+    owner = np.repeat(np.arange(starts.size), pieces)
+    piece_offsets = np.arange(owner.size) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    hour = first_hour[owner] + piece_offsets
+    seconds = np.minimum(ends[owner], (hour + 1) * HOUR) - np.maximum(starts[owner], hour * HOUR)
+    # 1970-01-01 was a Thursday: shift by 3 so Monday is 0
+    bucket = (hour // 24 + 3) % 7 * 24 + hour % 24
+    flat = np.bincount(category_index[owner] * BUCKETS + bucket, weights=seconds,
+                       minlength=category_count * BUCKETS)
+    return (flat / 60).reshape(category_count, 7, 24)
+
+
+def _epoch_seconds(values):
+    # Naive datetimes are UTC, as returned by Mongo
+    return np.array(values, dtype="datetime64[s]").astype(np.int64)
+
+
+# "When do I study" grids: minutes per weekday and hour, per category, for one student or a
+# filière/year cohort. Results are cached per scope and range, keyed by the members' activity
+# watermarks, so a grid is recomputed only after one of them logs something.
+class HeatmapService:
+    def __init__(self, activity_repository, category_repository, user_repository, tz_name="Europe/Paris",
+                 default_weeks=12, max_activity_hours=24, cache_size=256, cohort_ttl_seconds=300):
+        self.activity_repository = activity_repository
+        self.category_repository = category_repository
+        self.user_repository = user_repository
+        try:
+            self.tz = ZoneInfo(tz_name)
+        except ZoneInfoNotFoundError:
+            raise ValueError(f"Unknown heatmap time zone: {tz_name}")
+        self.default_weeks = default_weeks
+        self.max_span = timedelta(hours=max_activity_hours)
+        self.cache_size = cache_size
+        self.cohort_ttl_seconds = cohort_ttl_seconds
+        self._cache = OrderedDict()
+        self._cohorts = {}
+        self._lock = threading.Lock()
+
+    def _local_midnight_utc(self, day):
+        local = datetime(day.year, day.month, day.day, tzinfo=self.tz)
+        return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+    # Returns ((first_day, last_day_exclusive), None) or (None, (error, status))
+    def _parse_range(self, args):
+        try:
+            if args.get("end"):
+                end_day = datetime.fromisoformat(args["end"]).date()
+            else:
+                end_day = datetime.now(self.tz).date() + timedelta(days=1)
+            start_day = datetime.fromisoformat(args["start"]).date() if args.get("start") \
+                else end_day - timedelta(weeks=self.default_weeks)
+        except ValueError as e:
+            return None, ({"message": "Paramètres invalides", "error": str(e)}, 400)
+        if end_day <= start_day:
+            return None, ({"message": "Paramètres invalides"}, 400)
+        return (start_day, end_day), None
+
+    def _cohort_members(self, filiere, year):
+        key = (filiere, year)
+        now = time.monotonic()
+        cached = self._cohorts.get(key)
+        if cached is not None and now - cached[0] < self.cohort_ttl_seconds:
+            return cached[1]
+        members = sorted(self.user_repository.find_student_ids(filiere, year))
+        self._cohorts[key] = (now, members)
+        return members
+
+    def _watermark(self, user_ids):
+        versions = self.activity_repository.get_watermarks(user_ids)
+        digest = hashlib.blake2b(digest_size=12)
+        for user_id in user_ids:
+            digest.update(f"{user_id}:{versions.get(user_id, 0)};".encode("ascii"))
+        return digest.hexdigest()
+
+    def _compute(self, user_ids, start, end, analytics):
+        rows = self.activity_repository.get_heatmap_rows(user_ids, start, end, self.max_span, analytics=analytics)
+        names_by_id = {category_id: name for name, category_id in self.category_repository.get_category_map().items()}
+        names = sorted(set(names_by_id.values()) | {UNCATEGORIZED})
+        index_by_name = {name: i for i, name in enumerate(names)}
+        uncategorized = index_by_name[UNCATEGORIZED]
+
+        starts = _epoch_seconds([row[0] for row in rows])
+        ends = _epoch_seconds([row[1] for row in rows])
+        category_index = np.fromiter(
+            (index_by_name.get(names_by_id.get(row[2]), uncategorized) for row in rows), dtype=np.int64, count=len(rows))
+
+        # Clip to the requested range and to the longest plausible activity, then move to local time
+        range_start, range_end = _epoch_seconds([start, end])
+        ends = np.minimum(np.minimum(ends, range_end), starts + int(self.max_span.total_seconds()))
+        starts = np.maximum(starts, range_start)
+        offsets = local_offsets(starts, self.tz)
+        grid = heatmap_minutes(starts + offsets, ends + offsets, category_index, len(names))
+
+        totals = grid.sum(axis=(1, 2))
+        return {
+            "total": grid.sum(axis=0).round(1),
+            "categories": {name: grid[i].round(1) for i, name in enumerate(names) if totals[i] > 0},
+            "activities": len(rows),
+        }
+
+    def get_heatmap(self, args):
+        day_range, error = self._parse_range(args)
+        if error:
+            return error
+        if args.get("mongo_user_id"):
+            try:
+                user_ids = [ObjectId(args["mongo_user_id"])]
+            except Exception:
+                return {"message": "mongo_user_id invalide"}, 400
+            scope = {"mongo_user_id": args["mongo_user_id"]}
+            analytics = False
+        elif args.get(FILIERE) or args.get(YEAR):
+            scope = {FILIERE: args.get(FILIERE), YEAR: args.get(YEAR)}
+            user_ids = self._cohort_members(args.get(FILIERE), args.get(YEAR))
+            # Cohort views are reports: a secondary may serve them
+            analytics = True
+        else:
+            return {"message": f"Paramètre mongo_user_id, {FILIERE} ou {YEAR} requis"}, 400
+
+        watermark = self._watermark(user_ids)
+        key = (tuple(sorted(scope.items(), key=lambda item: item[0])), day_range, watermark)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+        if result is None:
+            start, end = (self._local_midnight_utc(day) for day in day_range)
+            result = self._compute(user_ids, start, end, analytics) if user_ids else \
+                {"total": np.zeros((7, 24)), "categories": {}, "activities": 0}
+            result.update({
+                "scope": scope,
+                "start": day_range[0].isoformat(),
+                "end": day_range[1].isoformat(),
+                "timezone": str(self.tz),
+                "users": len(user_ids),
+                "watermark": watermark,
+            })
+            with self._lock:
+                self._cache[key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result, 200
@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sortedcontainers import SortedList
+
+FILIERE = "filiere"
+YEAR = "year"
+GROUP_TYPES = (FILIERE, YEAR)
+
+# Polls look back a little so totals committed late with an older updated_at are not missed
+POLL_SKEW = timedelta(seconds=5)
+
+
+def _groups(user_score):
+    return [(FILIERE, filiere) for filiere in user_score.get("filieres") or []] + \
+           [(YEAR, year) for year in user_score.get("years") or []]
+
+
+# Ranking of one filière or year. Entries are (-total, user_id) so the best score comes first
+# and ties are broken by id; rank and insertion are O(log n), top-K is O(log n + K).
+class _Board:
+    __slots__ = ("entries", "totals")
+
+    def __init__(self):
+        self.entries = SortedList()
+        self.totals = {}
+
+    def put(self, user_id, total):
+        previous = self.totals.get(user_id)
+        if previous is not None:
+            self.entries.remove((-previous, user_id))
+        self.totals[user_id] = total
+        self.entries.add((-total, user_id))
+
+    def discard(self, user_id):
+        previous = self.totals.pop(user_id, None)
+        if previous is not None:
+            self.entries.remove((-previous, user_id))
+
+    def rank(self, user_id):
+        total = self.totals.get(user_id)
+        if total is None:
+            return None
+        # Competition ranking: users with the same total share the same rank
+        return self.entries.bisect_left((-total,)) + 1
+
+    def top(self, k):
+        return list(self.entries.islice(0, k))
+
+
+# In-process leaderboards per filière and year, fed by ScoreService on local submissions and by
+# polling user_scores for submissions handled by other workers. Users whose totals were purged
+# are found through their user_scores tombstones.
+class Leaderboards:
+    def __init__(self, score_repository, tombstone_repository=None, refresh_seconds=10):
+        self.score_repository = score_repository
+        self.tombstone_repository = tombstone_repository
+        self.refresh_seconds = refresh_seconds
+        self._boards = {}
+        self._user_groups = {}
+        self._pseudonyms = {}
+        self._since = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._thread = None
+
+    def apply(self, user_score):
+        user_id = user_score["_id"]
+        groups = _groups(user_score)
+        with self._lock:
+            for group in set(self._user_groups.get(user_id, ())) - set(groups):
+                self._boards[group].discard(user_id)
+            for group in groups:
+                self._boards.setdefault(group, _Board()).put(user_id, user_score.get("total", 0))
+            self._user_groups[user_id] = groups
+            self._pseudonyms[user_id] = user_score.get("pseudonym")
+
+    def remove(self, user_id):
+        with self._lock:
+            for group in self._user_groups.pop(user_id, ()):
+                self._boards[group].discard(user_id)
+            self._pseudonyms.pop(user_id, None)
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            poll_started = datetime.now(timezone.utc)
+            for user_score in self.score_repository.get_all_user_scores():
+                self.apply(user_score)
+            self._since = poll_started - POLL_SKEW
+            self._loaded = True
+
+    def refresh(self):
+        if not self._loaded:
+            self._load()
+            return
+        poll_started = datetime.now(timezone.utc)
+        for user_score in self.score_repository.get_user_scores_changed_since(self._since):
+            self.apply(user_score)
+        if self.tombstone_repository is not None:
+            for user_id in self.tombstone_repository.get_deleted_ids_since("user_scores", self._since):
+                self.remove(user_id)
+        self._since = poll_started - POLL_SKEW
+
+    def _ensure_started(self):
+        if not self._loaded:
+            self._load()
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="leaderboards", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"DEBUG: Leaderboard refresh failed: {str(e)}")
+
+    def _entry(self, rank, user_id, total):
+        return {"rank": rank, "mongo_user_id": str(user_id), "pseudonym": self._pseudonyms.get(user_id),
+                "total": total}
+
+    def top(self, group_type, group, k):
+        self._ensure_started()
+        with self._lock:
+            board = self._boards.get((group_type, group))
+            if board is None:
+                return [], 0
+            result = []
+            for neg_total, user_id in board.top(k):
+                # Equal totals share a rank; only a lower total moves to the next position
+                rank = result[-1]["rank"] if result and result[-1]["total"] == -neg_total else len(result) + 1
+                result.append(self._entry(rank, user_id, -neg_total))
+            return result, len(board.totals)
+
+    def rank(self, group_type, group, user_id):
+        self._ensure_started()
+        with self._lock:
+            board = self._boards.get((group_type, group))
+            rank = board.rank(user_id) if board is not None else None
+            if rank is None:
+                return None
+            return self._entry(rank, user_id, board.totals[user_id])
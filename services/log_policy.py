@@ -0,0 +1,120 @@
+import random
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+AUDIT = 50
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR, "AUDIT": AUDIT}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+
+class EventPolicy:
+    __slots__ = ("severity", "sample_rate")
+
+    def __init__(self, severity, sample_rate=1.0):
+        self.severity = severity
+        self.sample_rate = sample_rate
+
+
+# Security and data-changing events are AUDIT: always written to Mongo, never sampled or rate limited
+DEFAULT_POLICIES = {
+    "login_success": EventPolicy(AUDIT),
+    "login_fail": EventPolicy(AUDIT),
+    "google_login": EventPolicy(AUDIT),
+    "google_login_fail": EventPolicy(AUDIT),
+    "add_user": EventPolicy(AUDIT),
+    "bulk_add_user": EventPolicy(AUDIT),
+    "delete_user": EventPolicy(AUDIT),
+    "update_user_info": EventPolicy(AUDIT),
+    "change_password_success": EventPolicy(AUDIT),
+    "change_password_fail": EventPolicy(AUDIT),
+    "forgot_password_request": EventPolicy(AUDIT),
+    "create_questionnaire": EventPolicy(AUDIT),
+    "update_questionnaire": EventPolicy(AUDIT),
+    "delete_questionnaire": EventPolicy(AUDIT),
+    "duplicate_questionnaire": EventPolicy(AUDIT),
+    "toggle_status": EventPolicy(AUDIT),
+    "add_question": EventPolicy(AUDIT),
+    "upload_csv": EventPolicy(AUDIT),
+    "activity_merge": EventPolicy(AUDIT),
+    "activity_overlap_fix": EventPolicy(AUDIT),
+    # High volume, low value: keep a sample in Mongo, the rest goes to the local file
+    "activity_log": EventPolicy(INFO, 0.1),
+    "submit_response": EventPolicy(INFO, 0.25),
+    "upload_csv_debug": EventPolicy(DEBUG),
+    "upload_csv_warning": EventPolicy(WARNING),
+}
+
+# Fallback by naming convention for event types missing from the table
+SUFFIX_POLICIES = (
+    ("_debug", EventPolicy(DEBUG)),
+    ("_warning", EventPolicy(WARNING)),
+    ("_fail", EventPolicy(WARNING)),
+    ("_error", EventPolicy(ERROR)),
+)
+
+DATABASE = "database"
+FILE = "file"
+
+
+class LogPolicy:
+    def __init__(self, min_level=INFO, policies=None, user_rate_limit_per_minute=0):
+        self.min_level = min_level
+        self.policies = dict(DEFAULT_POLICIES)
+        self.policies.update(policies or {})
+        self.user_rate_limit_per_minute = user_rate_limit_per_minute
+        self._window_start = time.monotonic()
+        self._user_counts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        overrides = {
+            event_type: EventPolicy(LEVELS[spec.get("severity", "INFO").upper()], spec.get("sample_rate", 1.0))
+            for event_type, spec in (config.get("LOG_POLICY_OVERRIDES") or {}).items()
+        }
+        return cls(
+            min_level=LEVELS[config["LOG_MIN_LEVEL"].upper()],
+            policies=overrides,
+            user_rate_limit_per_minute=config["LOG_USER_RATE_LIMIT_PER_MINUTE"]
+        )
+
+    def policy_for(self, event_type):
+        policy = self.policies.get(event_type)
+        if policy is not None:
+            return policy
+        if event_type == "error":
+            return EventPolicy(ERROR)
+        for suffix, suffix_policy in SUFFIX_POLICIES:
+            if event_type.endswith(suffix):
+                return suffix_policy
+        return EventPolicy(INFO)
+
+    def _within_user_limit(self, user):
+        if not self.user_rate_limit_per_minute or not user:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._user_counts = {}
+            count = self._user_counts.get(user, 0) + 1
+            self._user_counts[user] = count
+        return count <= self.user_rate_limit_per_minute
+
+    # Returns (destination, severity) for one event
+    def route(self, event_type, user=None):
+        policy = self.policy_for(event_type)
+        if policy.severity >= AUDIT:
+            return DATABASE, policy.severity
+        if policy.severity < self.min_level:
+            return FILE, policy.severity
+        if policy.sample_rate < 1.0 and random.random() >= policy.sample_rate:
+            return FILE, policy.severity
+        if not self._within_user_limit(user):
+            return FILE, policy.severity
+        return DATABASE, policy.severity
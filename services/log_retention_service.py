@@ -0,0 +1,89 @@
+import glob
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from json_provider import dumps_bytes
+
+ARCHIVE_PREFIX = "logs-"
+ARCHIVE_SUFFIX = ".ndjson.gz"
+
+
+# Mongo hands back naive UTC datetimes; compare everything on that basis
+def _naive_utc(value):
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class LogRetentionService:
+    def __init__(self, log_repository, archive_dir, retention_days, batch_size=5000):
+        self.log_repository = log_repository
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+
+    def _archive_path(self, day):
+        return os.path.join(self.archive_dir, f"{ARCHIVE_PREFIX}{day}{ARCHIVE_SUFFIX}")
+
+    def _write_batch(self, batch):
+        by_day = {}
+        for log in batch:
+            by_day.setdefault(log["timestamp"].strftime("%Y-%m-%d"), []).append(log)
+        for day, logs in by_day.items():
+            # Appending produces a multi-member gzip file, which gzip readers handle transparently
+            with open(self._archive_path(day), "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+                    for log in logs:
+                        archive.write(dumps_bytes(log) + b"\n")
+                raw.flush()
+                os.fsync(raw.fileno())
+
+    def archive_expired(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        cutoff = now - timedelta(days=self.retention_days)
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        archived = 0
+        batch = []
+        # Rows are only deleted once their archive file is on disk; a crash in between
+        # re-archives the batch on the next run (at-least-once, deduplicated on query)
+        for log in self.log_repository.find_logs_before(cutoff, self.batch_size):
+            batch.append(log)
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                archived += self.log_repository.delete_logs_by_ids([l["_id"] for l in batch])
+                batch = []
+        if batch:
+            self._write_batch(batch)
+            archived += self.log_repository.delete_logs_by_ids([l["_id"] for l in batch])
+        return {"archived": archived, "cutoff": cutoff.isoformat()}
+
+    def query_archives(self, start=None, end=None, event_type=None, user=None, contains=None):
+        start, end = _naive_utc(start), _naive_utc(end)
+        start_day = start.strftime("%Y-%m-%d") if start else None
+        end_day = end.strftime("%Y-%m-%d") if end else None
+        seen_ids = set()
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, f"{ARCHIVE_PREFIX}*{ARCHIVE_SUFFIX}"))):
+            day = os.path.basename(path)[len(ARCHIVE_PREFIX):-len(ARCHIVE_SUFFIX)]
+            if (start_day and day < start_day) or (end_day and day > end_day):
+                continue
+            with gzip.open(path, "rt", encoding="utf-8") as archive:
+                for line in archive:
+                    log = json.loads(line)
+                    if log["_id"] in seen_ids:
+                        continue
+                    seen_ids.add(log["_id"])
+                    timestamp = _naive_utc(datetime.fromisoformat(log["timestamp"]))
+                    if start and timestamp < start:
+                        continue
+                    if end and timestamp > end:
+                        continue
+                    if event_type and log.get("event_type") != event_type:
+                        continue
+                    if user and log.get("user") != user:
+                        continue
+                    if contains and contains.lower() not in (log.get("message") or "").lower():
+                        continue
+                    yield log
@@ -1,9 +1,49 @@
+import logging
+import os
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from json_provider import dumps_bytes
+from services.log_policy import DATABASE, LEVEL_NAMES, LogPolicy
+
+
+def create_event_file_logger(path, max_bytes, backup_count):
+    logger = logging.getLogger("activity_tracker.events")
+    if not logger.handlers:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+    return logger
+
+
 class LogService:
-    def __init__(self, log_repository):
+    def __init__(self, log_repository, log_policy=None, file_logger=None):
         self.log_repository = log_repository
+        self.log_policy = log_policy or LogPolicy()
+        self.file_logger = file_logger
+
+    def _write_to_file(self, event_type, message, user, severity):
+        if self.file_logger is None:
+            return
+        self.file_logger.log(min(severity, logging.CRITICAL), dumps_bytes({
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "severity": LEVEL_NAMES.get(severity, "INFO"),
+            "event_type": event_type,
+            "message": message,
+            "user": user
+        }).decode("utf-8"))
 
     def log_event(self, event_type, message, user=None):
-        self.log_repository.log_event(event_type, message, user)
+        destination, severity = self.log_policy.route(event_type, user)
+        if destination == DATABASE:
+            self.log_repository.log_event(event_type, message, user, LEVEL_NAMES.get(severity, "INFO"))
+        else:
+            self._write_to_file(event_type, message, user, severity)
 
     def get_logs(self):
-        return self.log_repository.get_logs(), 200
\ No newline at end of file
+        return self.log_repository.get_logs(), 200
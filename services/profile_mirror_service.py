@@ -0,0 +1,49 @@
+from models.user import profile_mirror
+
+
+# Keeps users_objects.profile in step with the Firestore profile (users_test), so profile and
+# cohort reads can stay in Mongo. UserService and ProvisioningService write through after each
+# Firestore write; reconcile() diffs both sides and repairs what a failed write-through or a
+# change made outside the API left behind. Firestore remains the source of truth.
+class ProfileMirrorService:
+    def __init__(self, user_repository, log_service):
+        self.user_repository = user_repository
+        self.log_service = log_service
+
+    def mirror(self, pseudonym, user_data):
+        self.mirror_many({pseudonym: user_data})
+
+    # A failed write-through is not the caller's problem: the next reconcile catches up
+    def mirror_many(self, users):
+        try:
+            self.user_repository.set_profile_mirrors(
+                {pseudonym: profile_mirror(user_data) for pseudonym, user_data in users.items()})
+        except Exception as e:
+            print(f"DEBUG: Profile mirror write failed for {len(users)} user(s): {str(e)}")
+
+    def reconcile(self, dry_run=False):
+        # Mongo is read first: a write-through landing in between is then either seen as up to
+        # date or overwritten with the same Firestore data, never with an older one
+        mirrored = self.user_repository.get_profile_mirrors()
+        expected = {pseudonym: profile_mirror(user_data)
+                    for pseudonym, user_data in self.user_repository.get_firestore_profiles().items()}
+        changed = {pseudonym: profile for pseudonym, profile in expected.items() if mirrored.get(pseudonym) != profile}
+        # Profiles left on users_objects whose Firestore user is gone
+        orphaned = [pseudonym for pseudonym in mirrored if pseudonym not in expected]
+
+        summary = {
+            "firestore_users": len(expected),
+            "mirrored": len(mirrored),
+            "missing": sum(1 for pseudonym in changed if pseudonym not in mirrored),
+            "outdated": sum(1 for pseudonym in changed if pseudonym in mirrored),
+            "orphaned": len(orphaned),
+            "dry_run": dry_run,
+        }
+        if dry_run or not (changed or orphaned):
+            return summary
+        self.user_repository.set_profile_mirrors(changed)
+        if orphaned:
+            self.user_repository.clear_profile_mirrors(orphaned)
+        self.log_service.log_event("reconcile_profiles",
+                                   f"Miroir des profils: {len(changed)} mis à jour, {len(orphaned)} retirés")
+        return summary
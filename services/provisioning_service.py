@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from firebase_admin import firestore
+
+REQUIRED_FIELDS = ("username", "password", "role", "email", "gender")
+STUDENT_FIELDS = ("age", "year", "semester")
+# Firestore rejects batches of more than 500 writes
+MAX_FIRESTORE_BATCH = 500
+
+
+def _hash_password(password):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+def parse_roster(content, filename=""):
+    text = content.decode("utf-8-sig") if isinstance(content, bytes) else content
+    if filename.endswith(".json") or text.lstrip().startswith(("[", "{")):
+        rows = json.loads(text)
+        rows = rows.get("users", []) if isinstance(rows, dict) else rows
+        if not isinstance(rows, list):
+            raise ValueError("liste d'utilisateurs attendue")
+        return rows
+    return [{key.strip(): (value or "").strip() for key, value in row.items() if key}
+            for row in csv.DictReader(io.StringIO(text))]
+
+
+class ProvisioningService:
+    def __init__(self, user_repository, auth_service, log_service, hash_workers=0, batch_size=400,
+                 profile_mirror=None):
+        self.user_repository = user_repository
+        self.auth_service = auth_service
+        self.log_service = log_service
+        self.profile_mirror = profile_mirror
+        self.hash_workers = hash_workers or os.cpu_count() or 1
+        self.batch_size = min(batch_size, MAX_FIRESTORE_BATCH)
+
+    # Same rules as /add_user; returns an error message or None
+    def _validate_row(self, row):
+        if not all(row.get(field) for field in REQUIRED_FIELDS):
+            return "Champs manquants"
+        is_valid, error = self.auth_service.validate_email(row["email"])
+        if not is_valid:
+            return error["message"]
+        is_valid, error = self.auth_service.validate_password(row["password"])
+        if not is_valid:
+            return error["message"]
+        if row["role"] == "student" and not all(row.get(field) for field in STUDENT_FIELDS):
+            return "Champs étudiants manquants"
+        return None
+
+    @staticmethod
+    def _user_data(row, hashed_password):
+        user_data = {
+            "pseudonym": row["username"],
+            "password": hashed_password,
+            "role": row["role"],
+            "email_address": row["email"],
+            "gender": row["gender"],
+            "created_at": firestore.SERVER_TIMESTAMP
+        }
+        if row["role"] == "student":
+            user_data.update({
+                "age": row.get("age"),
+                "studies": row.get("studies"),
+                "year": row.get("year"),
+                "semester": row.get("semester")
+            })
+        return user_data
+
+    def _hash_passwords(self, passwords):
+        if len(passwords) < 2 or self.hash_workers < 2:
+            return [_hash_password(password) for password in passwords]
+        # spawn: forking a threaded server process (gunicorn gthread, gRPC) is not safe
+        context = multiprocessing.get_context("spawn")
+        workers = min(self.hash_workers, len(passwords))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            return list(pool.map(_hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+    def _write_firestore(self, users, results):
+        created = []
+        for start in range(0, len(users), self.batch_size):
+            chunk = users[start:start + self.batch_size]
+            try:
+                self.user_repository.create_users_in_firestore_batch(
+                    [(results[index]["username"], user_data) for index, user_data in chunk])
+                created.extend(index for index, _ in chunk)
+                continue
+            except Exception as e:
+                print(f"DEBUG: Firestore batch failed, retrying row by row: {str(e)}")
+            # A user created concurrently fails the whole batch; find out which one row by row
+            for index, user_data in chunk:
+                try:
+                    self.user_repository.create_user_in_firestore(results[index]["username"], user_data)
+                    created.append(index)
+                except Exception as e:
+                    results[index].update({"status": "error", "message": f"Écriture Firestore échouée: {str(e)}"})
+        return created
+
+    def provision(self, rows, dry_run=False):
+        if not rows:
+            return {"message": "Aucun utilisateur à importer"}, 400
+        if not isinstance(rows, list):
+            return {"message": "Liste d'utilisateurs attendue"}, 400
+
+        results, valid = [], []
+        seen = set()
+        for row_number, row in enumerate(rows, start=1):
+            # JSON rosters may hold anything; only objects are rows
+            if not isinstance(row, dict):
+                results.append({"row": row_number, "username": "", "status": "error",
+                                "message": "Ligne invalide : objet attendu"})
+                continue
+            row = {key: str(value).strip() if value is not None else "" for key, value in row.items()}
+            result = {"row": row_number, "username": row.get("username", ""), "status": "valid"}
+            error = self._validate_row(row)
+            if not error and row["username"] in seen:
+                error = "Doublon dans le fichier"
+            if error:
+                result.update({"status": "error", "message": error})
+            else:
+                seen.add(row["username"])
+                valid.append((len(results), row))
+            results.append(result)
+
+        # One batched Firestore read instead of a transaction per user
+        existing = self.user_repository.find_existing_pseudonyms([row["username"] for _, row in valid]) \
+            if valid else set()
+        for index, row in valid:
+            if row["username"] in existing:
+                results[index].update({"status": "error", "message": "Utilisateur existe déjà"})
+        valid = [(index, row) for index, row in valid if row["username"] not in existing]
+
+        if not dry_run and valid:
+            hashes = self._hash_passwords([row["password"] for _, row in valid])
+            users = [(index, self._user_data(row, hashed)) for (index, row), hashed in zip(valid, hashes)]
+            created = self._write_firestore(users, results)
+            if created:
+                mongo_ids = self.user_repository.sync_users_to_mongo([results[index]["username"] for index in created])
+                if self.profile_mirror is not None:
+                    user_data_by_index = dict(users)
+                    self.profile_mirror.mirror_many(
+                        {results[index]["username"]: user_data_by_index[index] for index in created})
+                for index in created:
+                    results[index].update({"status": "created",
+                                           "mongo_user_id": str(mongo_ids[results[index]["username"]])})
+
+        summary = {status: sum(1 for r in results if r["status"] == status) for status in ("created", "valid", "error")}
+        if not dry_run:
+            self.log_service.log_event(
+                "bulk_add_user", f"Import de {len(results)} utilisateurs: {summary['created']} créés, "
+                                 f"{summary['error']} en erreur")
+        return {"summary": summary, "results": results}, 200
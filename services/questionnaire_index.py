@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+# Polls look back a little so documents committed late with an older updated_at are not missed
+POLL_SKEW = timedelta(seconds=5)
+
+
+class _IndexState:
+    __slots__ = ("docs", "by_filiere", "by_year")
+
+    def __init__(self, docs, by_filiere, by_year):
+        self.docs = docs
+        self.by_filiere = by_filiere
+        self.by_year = by_year
+
+
+def _build_state(docs):
+    by_filiere, by_year = {}, {}
+    for questionnaire_id, questionnaire in docs.items():
+        for filiere in questionnaire.get("filieres", []):
+            by_filiere.setdefault(filiere, set()).add(questionnaire_id)
+        for year in questionnaire.get("years", []):
+            by_year.setdefault(year, set()).add(questionnaire_id)
+    return _IndexState(docs, by_filiere, by_year)
+
+
+# In-process map of filière/year -> active questionnaire ids. Readers only touch an immutable
+# snapshot; a background thread applies changes (polling updated_at + tombstones, or a change
+# stream on a replica set) and swaps the snapshot in.
+class QuestionnaireTargetingIndex:
+    def __init__(self, questionnaire_repository, tombstone_repository, refresh_seconds=5, use_change_stream=False):
+        self.questionnaire_repository = questionnaire_repository
+        self.tombstone_repository = tombstone_repository
+        self.refresh_seconds = refresh_seconds
+        self.use_change_stream = use_change_stream
+        self._state = None
+        self._since = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _load(self):
+        with self._lock:
+            if self._state is not None:
+                return
+            poll_started = datetime.now(timezone.utc)
+            docs = {q["_id"]: q for q in self.questionnaire_repository.get_active_questionnaires()}
+            self._state = _build_state(docs)
+            self._since = poll_started - POLL_SKEW
+
+    def refresh(self):
+        if self._state is None:
+            self._load()
+            return
+        with self._lock:
+            poll_started = datetime.now(timezone.utc)
+            changed = self.questionnaire_repository.get_questionnaires_changed_since(self._since)
+            deleted_ids = self.tombstone_repository.get_deleted_ids_since("questionnaires", self._since) \
+                if self.tombstone_repository is not None else []
+            if changed or deleted_ids:
+                docs = dict(self._state.docs)
+                for questionnaire in changed:
+                    if questionnaire.get("is_active"):
+                        docs[questionnaire["_id"]] = questionnaire
+                    else:
+                        docs.pop(questionnaire["_id"], None)
+                for questionnaire_id in deleted_ids:
+                    docs.pop(questionnaire_id, None)
+                self._state = _build_state(docs)
+            self._since = poll_started - POLL_SKEW
+
+    def mark_stale(self):
+        self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._state is None:
+            self._load()
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="questionnaire-index", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        if self.use_change_stream:
+            threading.Thread(target=self._watch, name="questionnaire-index-watch", daemon=True).start()
+        while True:
+            self._wakeup.wait(self.refresh_seconds)
+            self._wakeup.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"DEBUG: Questionnaire index refresh failed: {str(e)}")
+
+    def _watch(self):
+        # Change streams need a replica set; each event just wakes the poller, which
+        # reads the changes (including deletions) the same way as a timed poll
+        while True:
+            try:
+                with self.questionnaire_repository.questionnaires_collection.watch() as stream:
+                    for _ in stream:
+                        self._wakeup.set()
+            except Exception as e:
+                print(f"DEBUG: Questionnaire change stream interrupted: {str(e)}")
+                time.sleep(self.refresh_seconds)
+
+    def warm_up(self):
+        self._ensure_started()
+        return len(self._state.docs)
+
+    def assigned(self, user_filieres, user_years):
+        self._ensure_started()
+        state = self._state
+        ids = set()
+        for filiere in user_filieres:
+            ids |= state.by_filiere.get(filiere, set())
+        for year in user_years:
+            ids |= state.by_year.get(year, set())
+        return [state.docs[questionnaire_id] for questionnaire_id in sorted(ids)]
+
+    def unanswered(self, user_filieres, user_years, answered_ids):
+        return [
+            {**questionnaire, "is_answered": False}
+            for questionnaire in self.assigned(user_filieres, user_years)
+            if questionnaire["_id"] not in answered_ids
+        ]
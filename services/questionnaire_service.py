@@ -1,96 +1,56 @@
 from datetime import datetime
 from bson.objectid import ObjectId
 
+import unit_of_work
+from models.fields import ModelError
+from models.questionnaire import QuestionnaireIn
+from models.response import SubmissionIn
+from models.user import UserProfile
+
 
 class QuestionnaireService:
-    def __init__(self, user_repository, questionnaire_repository, question_repository, log_service):
+    def __init__(self, user_repository, questionnaire_repository, question_repository, log_service,
+                 questionnaire_index=None, score_service=None):
         self.user_repository = user_repository
         self.questionnaire_repository = questionnaire_repository
         self.question_repository = question_repository
         self.log_service = log_service
+        self.questionnaire_index = questionnaire_index
+        self.score_service = score_service
 
     def create_questionnaire(self, data):
-        title = data.get("title")
-        description = data.get("description", "")
-        category = data.get("category", "Autre")
-        activity_id = data.get("activity_id")
-        filieres = data.get("filieres", [])
-        years = data.get("years", [])
-        questions = data.get("questions", [])
-
-        if not title or not filieres or not years:
-            self.log_service.log_event("create_questionnaire_fail", "Champs requis manquants")
-            return {"message": "Champs requis manquants"}, 400
-
-        questionnaire = {
-            "title": title,
-            "description": description,
-            "category": category,
-            "activity_id": ObjectId(activity_id) if activity_id else None,
-            "filieres": filieres,
-            "years": years,
-            "is_active": True,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-
+        try:
+            questionnaire_in = QuestionnaireIn.from_json(data)
+        except ModelError as e:
+            self.log_service.log_event("create_questionnaire_fail", f"Champs requis manquants ({e})")
+            return {"message": "Champs requis manquants", "error": str(e)}, 400
+
+        now = datetime.utcnow()
+        questionnaire = questionnaire_in.to_document(now)
+        questionnaire.update({"is_active": True, "created_at": now})
         questionnaire_id = self.questionnaire_repository.create_questionnaire(questionnaire)
 
-        # Process and save questions
-        for question in questions:
-            question_doc = {
-                "questionnaire_id": ObjectId(questionnaire_id),
-                "text": question["text"],
-                "type": question["type"],
-                "propositions": question.get("propositions", []),
-                "order": question.get("order", 1),
-                "points": question.get("points", 1),  # Include points if provided
-                "created_at": datetime.utcnow()
-            }
-            self.question_repository.add_question(question_doc)
+        for question in questionnaire_in.questions:
+            self.question_repository.add_question(question.to_document(questionnaire_id, now))
 
-        self.log_service.log_event("create_questionnaire", f"Questionnaire créé: {title}")
+        self.log_service.log_event("create_questionnaire", f"Questionnaire créé: {questionnaire_in.title}")
         return {"message": "Questionnaire créé", "questionnaire_id": str(questionnaire_id)}, 200
 
     def update_questionnaire(self, questionnaire_id, data):
-        title = data.get("title")
-        description = data.get("description", "")
-        category = data.get("category", "Autre")
-        activity_id = data.get("activity_id")
-        filieres = data.get("filieres", [])
-        years = data.get("years", [])
-        questions = data.get("questions", [])
-
-        if not title or not filieres or not years:
-            self.log_service.log_event("update_questionnaire_fail", "Champs requis manquants")
-            return {"message": "Champs requis manquants"}, 400
-
-        updated_data = {
-            "title": title,
-            "description": description,
-            "category": category,
-            "activity_id": ObjectId(activity_id) if activity_id else None,
-            "filieres": filieres,
-            "years": years,
-            "updated_at": datetime.utcnow()
-        }
+        try:
+            questionnaire_in = QuestionnaireIn.from_json(data)
+        except ModelError as e:
+            self.log_service.log_event("update_questionnaire_fail", f"Champs requis manquants ({e})")
+            return {"message": "Champs requis manquants", "error": str(e)}, 400
 
-        result = self.questionnaire_repository.update_questionnaire(questionnaire_id, updated_data)
+        now = datetime.utcnow()
+        result = self.questionnaire_repository.update_questionnaire(questionnaire_id, questionnaire_in.to_document(now))
         if result.modified_count > 0:
             # Update or add questions
             self.questionnaire_repository.delete_questions_by_questionnaire(questionnaire_id)
-            for question in questions:
-                question_doc = {
-                    "questionnaire_id": ObjectId(questionnaire_id),
-                    "text": question["text"],
-                    "type": question["type"],
-                    "propositions": question.get("propositions", []),
-                    "order": question.get("order", 1),
-                    "points": question.get("points", 1),  # Include points if provided
-                    "created_at": datetime.utcnow()
-                }
-                self.question_repository.add_question(question_doc)
-            self.log_service.log_event("update_questionnaire", f"Questionnaire mis à jour: {title}")
+            for question in questionnaire_in.questions:
+                self.question_repository.add_question(question.to_document(questionnaire_id, now))
+            self.log_service.log_event("update_questionnaire", f"Questionnaire mis à jour: {questionnaire_in.title}")
             return {"message": "Questionnaire mis à jour"}, 200
         return {"message": "Questionnaire non trouvé"}, 404
 
@@ -179,30 +139,28 @@ class QuestionnaireService:
                                        f"Utilisateur non trouvé pour mongo_user_id: {user_id}")
             return {"message": "Utilisateur non trouvé"}, 404
 
-        user_query = self.user_repository.find_user_by_pseudonym(user["pseudonym"])
-        if not user_query:
+        user_data = self.user_repository.get_profile(user)
+        if not user_data:
             self.log_service.log_event("get_questionnaires_fail",
                                        f"Utilisateur Firestore non trouvé pour pseudonym: {user['pseudonym']}")
             return {"message": "Utilisateur Firestore non trouvé"}, 404
 
-        user_data = user_query.to_dict()
-        role = user_data.get("role", "student")
-
-        if role == "super_admin":
+        profile = UserProfile.from_firestore(user_data)
+        if profile.role == "super_admin":
             questionnaires = self.questionnaire_repository.get_questionnaires(fetch_all=True)
             return questionnaires, 200
 
-        studies = user_data.get("studies", "")
-        user_filieres = [f.strip() for f in studies.split(",") if f.strip()] if isinstance(studies, str) else []
-
-        user_year = user_data.get("year", "")
-        user_years = [str(user_year)] if user_year else []
+        user_filieres, user_years = profile.filieres, profile.years
         if not user_years:
             self.log_service.log_event("get_questionnaires_fail", "Aucune année trouvée pour l'utilisateur",
                                        user["pseudonym"])
             return {"message": "Aucune année trouvée pour l'utilisateur"}, 400
 
         try:
+            if self.questionnaire_index is not None and user_filieres:
+                answered_ids = self.questionnaire_repository.get_answered_questionnaire_ids(user_id)
+                return self.questionnaire_index.unanswered(user_filieres, user_years, answered_ids), 200
+
             questionnaires = self.questionnaire_repository.get_questionnaires(
                 user_id=user_id,
                 user_filieres=user_filieres,
@@ -222,7 +180,11 @@ class QuestionnaireService:
             return {"message": "Questionnaire non trouvé"}, 404
 
         questions = self.question_repository.get_questions_by_questionnaire(questionnaire_id)
-        result = {
+        return self._questionnaire_detail(questionnaire, questions), 200
+
+    @staticmethod
+    def _questionnaire_detail(questionnaire, questions):
+        return {
             "_id": str(questionnaire["_id"]),
             "title": questionnaire["title"],
             "description": questionnaire["description"],
@@ -232,60 +194,83 @@ class QuestionnaireService:
             "questions": questions,
             "is_active": questionnaire["is_active"]
         }
-        return result, 200
-
-    def submit_questionnaire_response(self, data):
-        questionnaire_id = data.get("questionnaire_id")
-        user_id = data.get("mongo_user_id")
-        responses = data.get("responses")
-        duration_seconds = data.get("duration_seconds")
-        feedback = data.get("feedback", "")
 
-        if not questionnaire_id or not user_id or not responses:
-            self.log_service.log_event("submit_response_fail", "Champs requis manquants")
-            return {"message": "Champs requis manquants"}, 400
+    # Answers to questions that no longer exist are dropped, as before
+    @staticmethod
+    def _grade_submission(submission, questions):
+        graded = []
+        points_by_question = {}
+        for answer in submission.answers:
+            question = questions.get(answer.question_id)
+            if question is None:
+                continue
+            graded.append(question.grade(answer))
+            points_by_question[question._id] = question.points
+        return graded, points_by_question
 
-        questionnaire = self.questionnaire_repository.get_questionnaire_by_id(questionnaire_id)
+    def submit_questionnaire_response(self, data):
+        try:
+            submission = SubmissionIn.from_json(data)
+        except ModelError as e:
+            self.log_service.log_event("submit_response_fail", f"Champs requis manquants ({e})")
+            return {"message": "Champs requis manquants", "error": str(e)}, 400
+        questionnaire_id = str(submission.questionnaire_id)
+        user_id = str(submission.user_id)
+
+        questionnaire = self.questionnaire_repository.get_questionnaire_by_id(submission.questionnaire_id)
         if not questionnaire or not questionnaire.get("is_active"):
             return {"message": "Questionnaire non trouvé ou désactivé"}, 404
 
-        processed_responses = []
-        for response in responses:
-            question = self.question_repository.get_question_by_id(response["question_id"])
-            if not question:
-                continue
-            is_correct = False
-            if question["type"] == "multiple_choice" and response.get("selected_proposition_id"):
-                selected = next((p for p in question["propositions"] if p["id"] == response["selected_proposition_id"]),
-                                None)
-                is_correct = selected["is_correct"] if selected else False
-            processed_responses.append({
-                "question_id": ObjectId(response["question_id"]),
-                "selected_proposition_id": response.get("selected_proposition_id"),
-                "answer_text": response.get("answer_text"),
-                "is_correct": is_correct
-            })
-
-        response_doc = {
-            "questionnaire_id": ObjectId(questionnaire_id),
-            "user_id": ObjectId(user_id),
-            "responses": processed_responses,
-            "duration_seconds": duration_seconds,
-            "feedback": feedback,
-            "completed_at": datetime.utcnow()
-        }
+        questions = self.question_repository.get_questions_for_grading(submission.question_ids())
+        processed_responses, points_by_question = self._grade_submission(submission, questions)
 
-        self.questionnaire_repository.submit_response(response_doc)
+        self.questionnaire_repository.submit_response(submission.to_document(processed_responses))
+        if self.score_service is not None:
+            # Ledger writes need their result back and cannot be queued: they run once the response is stored
+            unit_of_work.after_write(lambda: self._record_score(user_id, questionnaire, processed_responses,
+                                                                points_by_question))
         self.log_service.log_event("submit_response", f"Réponses soumises pour le questionnaire {questionnaire_id}",
                                    user_id)
         return {"message": "Réponses enregistrées avec succès"}, 200
 
+    def _record_score(self, user_id, questionnaire, processed_responses, points_by_question):
+        try:
+            points, max_points = self.score_service.score_submission(processed_responses, points_by_question)
+            self.score_service.record_submission(user_id, questionnaire, points, max_points)
+        except Exception as e:
+            # The response is stored; tools/rebuild_scores.py can replay a missed ledger update
+            print(f"DEBUG: Score update failed for user {user_id}: {str(e)}")
+
     def get_user_responses(self, user_id, questionnaire_id):
         response = self.questionnaire_repository.get_user_responses(user_id, questionnaire_id)
         if not response:
             return {"message": "Aucune réponse trouvée"}, 404
         return response, 200
 
+    @staticmethod
+    def _merge_answered(responses, questionnaires):
+        questionnaire_map = {q["_id"]: q for q in questionnaires}
+
+        result = []
+        missing_ids = []
+        for response in responses:
+            q_id = response["questionnaire_id"]
+            if q_id in questionnaire_map:
+                q = questionnaire_map[q_id]
+                result.append({
+                    "_id": q["_id"],
+                    "title": q["title"],
+                    "description": q["description"],
+                    "category": q["category"],
+                    "filieres": q["filieres"],
+                    "years": q["years"],
+                    "created_at": q["created_at"],
+                    "completed_at": response["completed_at"]
+                })
+            else:
+                missing_ids.append(q_id)
+        return result, missing_ids
+
     def get_user_answered_questionnaires(self, user_id):
         try:
             try:
@@ -301,26 +286,10 @@ class QuestionnaireService:
             questionnaire_ids = [response["questionnaire_id"] for response in responses]
             questionnaires = self.questionnaire_repository.get_questionnaires_by_ids(questionnaire_ids)
 
-            questionnaire_map = {q["_id"]: q for q in questionnaires}
-
-            result = []
-            for response in responses:
-                q_id = response["questionnaire_id"]
-                if q_id in questionnaire_map:
-                    q = questionnaire_map[q_id]
-                    result.append({
-                        "_id": q["_id"],
-                        "title": q["title"],
-                        "description": q["description"],
-                        "category": q["category"],
-                        "filieres": q["filieres"],
-                        "years": q["years"],
-                        "created_at": q["created_at"],
-                        "completed_at": response["completed_at"]
-                    })
-                else:
-                    self.log_service.log_event("get_answered_questionnaires_warning",
-                                               f"Questionnaire {q_id} not found for user {user_id}")
+            result, missing_ids = self._merge_answered(responses, questionnaires)
+            for q_id in missing_ids:
+                self.log_service.log_event("get_answered_questionnaires_warning",
+                                           f"Questionnaire {q_id} not found for user {user_id}")
 
             return result, 200
         except Exception as e:
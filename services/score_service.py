@@ -0,0 +1,97 @@
+from bson.objectid import ObjectId
+
+from models.user import UserProfile
+from services.leaderboard import FILIERE, GROUP_TYPES, YEAR
+
+DEFAULT_LEADERBOARD_SIZE = 10
+
+
+def _category_key(category):
+    # Used as a field name under by_category
+    return (category or "Autre").replace(".", "_").replace("$", "_")
+
+
+class ScoreService:
+    def __init__(self, score_repository, user_repository, leaderboards, log_service, max_leaderboard_size=100):
+        self.score_repository = score_repository
+        self.user_repository = user_repository
+        self.leaderboards = leaderboards
+        self.log_service = log_service
+        self.max_leaderboard_size = max_leaderboard_size
+
+    @staticmethod
+    def score_submission(graded_responses, points_by_question):
+        # Questions stored without points are worth 0, as in the questionnaire detail
+        points = sum(points_by_question.get(r["question_id"], 0) for r in graded_responses if r["is_correct"])
+        max_points = sum(points_by_question.get(r["question_id"], 0) for r in graded_responses)
+        return points, max_points
+
+    def _user_profile(self, user_id, previous_total):
+        if previous_total is not None:
+            # Filière and year were resolved on the first submission; avoid a Firestore read per submit
+            return previous_total.get("pseudonym"), previous_total.get("filieres", []), previous_total.get("years", [])
+        mongo_user = self.user_repository.find_mongo_user_by_id(user_id)
+        pseudonym = mongo_user["pseudonym"] if mongo_user else None
+        user_data = self.user_repository.get_profile(mongo_user) if pseudonym else None
+        if not user_data:
+            return pseudonym, [], []
+        profile = UserProfile.from_firestore(user_data)
+        return pseudonym, profile.filieres, profile.years
+
+    # Per-category change of the user's totals when `previous` is replaced by a new entry
+    @staticmethod
+    def _deltas(category, points, previous):
+        deltas = {category: points}
+        if previous is not None:
+            previous_category = previous.get("category", category)
+            deltas[previous_category] = deltas.get(previous_category, 0) - previous.get("points", 0)
+        return {key: delta for key, delta in deltas.items() if delta}
+
+    # Called after each stored submission: the ledger keeps the latest score per questionnaire
+    # and the user's totals move by the difference
+    def record_submission(self, user_id, questionnaire, points, max_points):
+        user_id = ObjectId(user_id)
+        category = _category_key(questionnaire.get("category"))
+        previous = self.score_repository.record_entry(user_id, questionnaire["_id"], category, points, max_points)
+        deltas = self._deltas(category, points, previous)
+
+        previous_total = self.score_repository.get_user_score(user_id)
+        if not deltas and previous_total is not None:
+            return previous_total
+        pseudonym, filieres, years = self._user_profile(user_id, previous_total)
+        user_score = self.score_repository.apply_delta(user_id, deltas, pseudonym, filieres, years)
+        if self.leaderboards is not None:
+            self.leaderboards.apply(user_score)
+        return user_score
+
+    def get_leaderboard(self, args):
+        group_type = next((g for g in GROUP_TYPES if args.get(g)), None)
+        if group_type is None:
+            return {"message": f"Paramètre {FILIERE} ou {YEAR} requis"}, 400
+        group = args.get(group_type)
+        try:
+            size = min(int(args.get("limit", DEFAULT_LEADERBOARD_SIZE)), self.max_leaderboard_size)
+        except ValueError:
+            return {"message": "limit invalide"}, 400
+
+        top, participants = self.leaderboards.top(group_type, group, max(size, 0))
+        response = {group_type: group, "participants": participants, "top": top}
+
+        user_id = args.get("mongo_user_id")
+        if user_id:
+            try:
+                response["me"] = self.leaderboards.rank(group_type, group, ObjectId(user_id))
+            except Exception:
+                return {"message": "mongo_user_id invalide"}, 400
+        return response, 200
+
+    def get_user_scores(self, user_id):
+        try:
+            user_obj_id = ObjectId(user_id)
+        except Exception:
+            return {"message": "mongo_user_id invalide"}, 400
+        user_score = self.score_repository.get_user_score(user_obj_id)
+        if not user_score:
+            return {"message": "Aucun score trouvé"}, 404
+        user_score["questionnaires"] = self.score_repository.get_user_ledger(user_obj_id)
+        return user_score, 200
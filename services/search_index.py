@@ -0,0 +1,139 @@
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+# Word forms too common to rank anything
+STOPWORDS = frozenset((
+    "a au aux avec ce ces dans de des du elle en est et il ils la le les leur lui ma mais me mes mon ne nos "
+    "notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes ton tu un une vos votre vous y "
+    "the of and or to in is"
+).split())
+WORD = re.compile(r"[a-z0-9]+")
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# A word completed from a prefix ranks below the same word typed in full
+PREFIX_WEIGHT = 0.7
+MAX_PREFIX_TERMS = 64
+
+
+def fold(text):
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return [word for word in WORD.findall(fold(text or "")) if word not in STOPWORDS]
+
+
+# Term -> {document position: weighted term frequency}, ranked with BM25. Fields are weighted
+# by repeating their terms (a title word counts `weight` times), which keeps a single posting list.
+class _InvertedIndex:
+    def __init__(self, documents, weights):
+        self.documents = documents
+        self.postings = {}
+        lengths = []
+        for position, document in enumerate(documents):
+            length = 0
+            for field, weight in weights.items():
+                for term in tokenize(document.get(field)):
+                    postings = self.postings.setdefault(term, {})
+                    postings[position] = postings.get(position, 0) + weight
+                    length += weight
+            lengths.append(length)
+        self.lengths = lengths
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0
+        self.vocabulary = sorted(self.postings)
+
+    def _expand(self, word, prefix):
+        if not prefix:
+            return {word: 1.0} if word in self.postings else {}
+        terms = {}
+        start = bisect_left(self.vocabulary, word)
+        for term in self.vocabulary[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(word):
+                break
+            terms[term] = 1.0 if term == word else PREFIX_WEIGHT
+        return terms
+
+    def _bm25(self, term, position):
+        postings = self.postings[term]
+        idf = math.log(1 + (len(self.documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+        frequency = postings[position]
+        norm = K1 * (1 - B + B * self.lengths[position] / self.average_length)
+        return idf * frequency * (K1 + 1) / (frequency + norm)
+
+    # Every query word must match; returns [(score, position)] best first
+    def search(self, words, prefix):
+        scores = None
+        for word in words:
+            word_scores = {}
+            for term, term_weight in self._expand(word, prefix).items():
+                for position in self.postings[term]:
+                    score = term_weight * self._bm25(term, position)
+                    if score > word_scores.get(position, 0):
+                        word_scores[position] = score
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {position: score + word_scores[position]
+                          for position, score in scores.items() if position in word_scores}
+            if not scores:
+                return []
+        return sorted(((score, position) for position, score in (scores or {}).items()),
+                      key=lambda hit: (-hit[0], hit[1]))
+
+
+# In-process search over questionnaire titles/descriptions and question text. The catalog is
+# small and admin-written, so the index is rebuilt whole: lazily on the next search after a local
+# write (change listeners) or after refresh_seconds, which bounds staleness for other workers.
+class CatalogSearchIndex:
+    QUESTIONNAIRE_WEIGHTS = {"title": 3, "description": 1}
+    QUESTION_WEIGHTS = {"text": 1}
+
+    def __init__(self, questionnaire_repository, question_repository, refresh_seconds=30):
+        self.questionnaire_repository = questionnaire_repository
+        self.question_repository = question_repository
+        self.refresh_seconds = refresh_seconds
+        self._indexes = None
+        self._built_at = 0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def mark_stale(self):
+        self._stale = True
+
+    def _build(self):
+        questionnaires = self.questionnaire_repository.get_questionnaires_for_search()
+        titles = {questionnaire["_id"]: questionnaire.get("title") for questionnaire in questionnaires}
+        # Questions of a deleted questionnaire linger until the cascade purges them
+        questions = [{**question, "questionnaire_title": titles[question["questionnaire_id"]]}
+                     for question in self.question_repository.get_questions_for_search()
+                     if question.get("questionnaire_id") in titles]
+        return {
+            "questionnaires": _InvertedIndex(questionnaires, self.QUESTIONNAIRE_WEIGHTS),
+            "questions": _InvertedIndex(questions, self.QUESTION_WEIGHTS),
+        }
+
+    def _current(self):
+        if self._stale or time.monotonic() - self._built_at >= self.refresh_seconds:
+            with self._lock:
+                if self._stale or time.monotonic() - self._built_at >= self.refresh_seconds:
+                    # Cleared first: a write landing during the build marks the new index stale again
+                    self._stale = False
+                    built_at = time.monotonic()
+                    self._indexes = self._build()
+                    self._built_at = built_at
+        return self._indexes
+
+    def warm_up(self):
+        return {kind: len(index.documents) for kind, index in self._current().items()}
+
+    # Returns (total, [(score, document)]) for one page of `kind` matches
+    def search(self, kind, query, prefix=True, offset=0, limit=20):
+        index = self._current()[kind]
+        hits = index.search(tokenize(query), prefix)
+        return len(hits), [(score, index.documents[position]) for score, position in hits[offset:offset + limit]]
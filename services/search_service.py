@@ -0,0 +1,86 @@
+import time
+
+QUESTIONNAIRES = "questionnaires"
+QUESTIONS = "questions"
+LOGS = "logs"
+SEARCH_TYPES = (QUESTIONNAIRES, QUESTIONS, LOGS)
+PREFIX = "prefix"
+FULL_TEXT = "text"
+
+
+def _questionnaire_hit(score, questionnaire):
+    return {
+        "_id": questionnaire["_id"],
+        "title": questionnaire.get("title"),
+        "description": questionnaire.get("description"),
+        "category": questionnaire.get("category"),
+        "is_active": questionnaire.get("is_active"),
+        "score": round(score, 3),
+    }
+
+
+def _question_hit(score, question):
+    return {
+        "_id": question["_id"],
+        "questionnaire_id": question["questionnaire_id"],
+        "questionnaire_title": question.get("questionnaire_title"),
+        "text": question.get("text"),
+        "type": question.get("type"),
+        "score": round(score, 3),
+    }
+
+
+# Admin search: questionnaires and questions through the in-process catalog index (prefix or
+# whole-word matching), logs through the Mongo text index on `message`, optionally narrowed to
+# one event_type. Results are ranked and paginated with page/page_size.
+class SearchService:
+    def __init__(self, search_index, log_repository, page_size=20, max_page_size=100):
+        self.search_index = search_index
+        self.log_repository = log_repository
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    def _page(self, args):
+        try:
+            page = int(args.get("page", 1))
+            page_size = min(int(args.get("page_size", self.page_size)), self.max_page_size)
+        except ValueError:
+            return None
+        if page < 1 or page_size < 1:
+            return None
+        return page, page_size
+
+    def search(self, args):
+        started = time.perf_counter()
+        search_type = args.get("type", QUESTIONNAIRES)
+        query = (args.get("q") or "").strip()
+        match = args.get("match", PREFIX)
+        paging = self._page(args)
+        if search_type not in SEARCH_TYPES or match not in (PREFIX, FULL_TEXT) or paging is None:
+            return {"message": "Paramètres invalides"}, 400
+        page, page_size = paging
+        offset = (page - 1) * page_size
+
+        if search_type == LOGS:
+            event_type = args.get("event_type")
+            if not query and not event_type:
+                return {"message": "Paramètre q ou event_type requis"}, 400
+            logs = self.log_repository.search_logs(query, event_type, skip=offset, limit=page_size)
+            response = {"results": logs[:page_size], "has_more": len(logs) > page_size}
+        else:
+            if not query:
+                return {"message": "Paramètre q requis"}, 400
+            total, hits = self.search_index.search(search_type, query, prefix=match == PREFIX,
+                                                   offset=offset, limit=page_size)
+            to_hit = _questionnaire_hit if search_type == QUESTIONNAIRES else _question_hit
+            response = {"results": [to_hit(score, doc) for score, doc in hits], "total": total,
+                        "has_more": offset + len(hits) < total}
+
+        response.update({
+            "type": search_type,
+            "q": query,
+            "page": page,
+            "page_size": page_size,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+        return response, 200
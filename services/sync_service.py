@@ -0,0 +1,143 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+
+from json_provider import dumps_bytes
+from models.user import user_targets
+from repositories.questionnaire_repository import matches_targeting
+
+# Tokens are taken slightly in the past so a write that committed late is sent again
+# rather than missed; clients apply changes as idempotent upserts
+SYNC_SKEW = timedelta(seconds=5)
+
+
+def _parse_time_token(token, horizon):
+    if not token:
+        return None
+    try:
+        since = datetime.fromisoformat(token)
+    except (TypeError, ValueError):
+        return None
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # Older than the tombstone retention: deletions may have been forgotten, resend everything
+    return since if since >= horizon else None
+
+
+def _content_token(items):
+    return hashlib.sha1(dumps_bytes(items)).hexdigest()
+
+
+class SyncService:
+    def __init__(self, user_repository, questionnaire_repository, question_repository, category_repository,
+                 module_repository, tombstone_repository, log_service, tombstone_retention_days,
+                 questionnaire_index=None):
+        self.user_repository = user_repository
+        self.questionnaire_repository = questionnaire_repository
+        self.question_repository = question_repository
+        self.category_repository = category_repository
+        self.module_repository = module_repository
+        self.tombstone_repository = tombstone_repository
+        self.log_service = log_service
+        self.tombstone_retention_days = tombstone_retention_days
+        self.questionnaire_index = questionnaire_index
+
+    def _assigned_questionnaires(self, user_filieres, user_years, fetch_all):
+        if self.questionnaire_index is not None and not fetch_all:
+            return self.questionnaire_index.assigned(user_filieres, user_years)
+        return self.questionnaire_repository.get_assigned_questionnaires(user_filieres, user_years, fetch_all)
+
+    def sync(self, data):
+        user_id = data.get("mongo_user_id")
+        if not user_id:
+            return {"message": "mongo_user_id requis"}, 400
+
+        user = self.user_repository.find_mongo_user_by_id(user_id)
+        if not user:
+            self.log_service.log_event("sync_fail", f"Utilisateur non trouvé pour mongo_user_id: {user_id}")
+            return {"message": "Utilisateur non trouvé"}, 404
+
+        user_data = self.user_repository.get_profile(user)
+        if not user_data:
+            self.log_service.log_event("sync_fail",
+                                       f"Utilisateur Firestore non trouvé pour pseudonym: {user['pseudonym']}")
+            return {"message": "Utilisateur Firestore non trouvé"}, 404
+
+        tokens = data.get("tokens") or {}
+        now = datetime.now(timezone.utc)
+        horizon = now - timedelta(days=self.tombstone_retention_days)
+        as_of = (now - SYNC_SKEW).isoformat()
+
+        fetch_all = user_data.get("role") == "super_admin"
+        user_filieres, user_years = user_targets(user_data)
+
+        questionnaires = self._sync_questionnaires(
+            _parse_time_token(tokens.get("questionnaires"), horizon), user_filieres, user_years, fetch_all)
+        questionnaires["token"] = as_of
+
+        questions = self._sync_questions(
+            _parse_time_token(tokens.get("questions"), horizon), user_filieres, user_years, fetch_all,
+            [q["_id"] for q in questionnaires["upserted"]])
+        questions["token"] = as_of
+
+        responses = self._sync_responses(_parse_time_token(tokens.get("responses"), horizon), user_id)
+        responses["token"] = as_of
+
+        categories = [{"name": name, "_id": category_id}
+                      for name, category_id in sorted(self.category_repository.get_category_map().items())]
+        modules = []
+        if user_data.get("year") and user_data.get("studies") and user_data.get("semester"):
+            modules = self.module_repository.get_modules(
+                user_data.get("year"), user_data.get("studies"), user_data.get("semester"))
+
+        return {
+            "questionnaires": questionnaires,
+            "questions": questions,
+            "responses": responses,
+            "categories": self._sync_reference(categories, tokens.get("categories")),
+            "modules": self._sync_reference(modules, tokens.get("modules")),
+        }, 200
+
+    def _sync_questionnaires(self, since, user_filieres, user_years, fetch_all):
+        if since is None:
+            upserted = self._assigned_questionnaires(user_filieres, user_years, fetch_all)
+            return {"full": True, "upserted": upserted, "deleted": []}
+
+        upserted, deleted = [], []
+        for questionnaire in self.questionnaire_repository.get_questionnaires_changed_since(since):
+            if fetch_all or matches_targeting(questionnaire, user_filieres, user_years):
+                upserted.append(questionnaire)
+            else:
+                # Deactivated or retargeted: no longer assigned to this user
+                deleted.append(questionnaire["_id"])
+        deleted.extend(self.tombstone_repository.get_deleted_ids_since("questionnaires", since))
+        return {"full": False, "upserted": upserted, "deleted": deleted}
+
+    def _sync_questions(self, since, user_filieres, user_years, fetch_all, upserted_questionnaire_ids):
+        assigned_ids = [q["_id"] for q in self._assigned_questionnaires(user_filieres, user_years, fetch_all)]
+        if since is None:
+            return {"full": True, "upserted": self.question_repository.get_questions_for_sync(assigned_ids),
+                    "deleted": []}
+
+        upserted = self.question_repository.get_questions_for_sync(assigned_ids, since)
+        if upserted_questionnaire_ids:
+            # Newly assigned questionnaires bring all of their questions, whatever their age
+            seen_ids = {q["_id"] for q in upserted}
+            upserted.extend(q for q in self.question_repository.get_questions_for_sync(upserted_questionnaire_ids)
+                            if q["_id"] not in seen_ids)
+        deleted = self.tombstone_repository.get_deleted_ids_since("questions", since)
+        return {"full": False, "upserted": upserted, "deleted": deleted}
+
+    def _sync_responses(self, since, user_id):
+        upserted = self.questionnaire_repository.get_user_responses_since(user_id, since)
+        if since is None:
+            return {"full": True, "upserted": upserted, "deleted": []}
+        deleted = self.tombstone_repository.get_deleted_ids_since(
+            "questionnaire_responses", since, user_id=ObjectId(user_id))
+        return {"full": False, "upserted": upserted, "deleted": deleted}
+
+    @staticmethod
+    def _sync_reference(items, token):
+        # Reference data is small and has no updated_at: resend it whole when its content hash changes
+        content_token = _content_token(items)
+        return {"replace": items if token != content_token else None, "token": content_token}
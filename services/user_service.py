@@ -4,27 +4,24 @@ from firebase_admin import  firestore
 
 
 class UserService:
-    def __init__(self, user_repository, log_service):
+    def __init__(self, user_repository, log_service, profile_mirror=None):
         self.user_repository = user_repository
         self.log_service = log_service
+        self.profile_mirror = profile_mirror
 
-    def login(self, username, password):
-        user = self.user_repository.find_user_by_pseudonym(username)
-        if not user:
-            self.log_service.log_event("login_fail", "Utilisateur non trouvé", username)
-            return None, {"message": "Utilisateur non trouvé"}, 404
+    def _mirror_profile(self, pseudonym, user_data):
+        if self.profile_mirror is not None:
+            self.profile_mirror.mirror(pseudonym, user_data)
 
-        user_data = user.to_dict()
+    @staticmethod
+    def _check_password(user_data, password):
         stored_hash = user_data.get("password")
         if isinstance(stored_hash, str):
             stored_hash = stored_hash.encode('utf-8')
+        return bcrypt.checkpw(password.encode('utf-8'), stored_hash)
 
-        if not bcrypt.checkpw(password.encode('utf-8'), stored_hash):
-            self.log_service.log_event("login_fail", "Mot de passe incorrect", username)
-            return None, {"message": "Mot de passe incorrect"}, 401
-
-        mongo_user_id = self.user_repository.sync_user_to_mongo(username)
-        self.log_service.log_event("login_success", f"{username} s'est connecté avec succès", username)
+    @staticmethod
+    def _login_response(user_data, mongo_user_id):
         response_data = {
             "message": "Login successful",
             "role": user_data.get("role"),
@@ -39,10 +36,26 @@ class UserService:
                 "studies": user_data.get("studies", ""),
                 "semester": user_data.get("semester", "")
             })
-        return response_data, None, 200
+        return response_data
+
+    # Credential checks never fall back to the stale cache: it may hold an old password hash
+    def login(self, username, password):
+        user = self.user_repository.find_user_by_pseudonym(username, allow_stale=False)
+        if not user:
+            self.log_service.log_event("login_fail", "Utilisateur non trouvé", username)
+            return None, {"message": "Utilisateur non trouvé"}, 404
+
+        user_data = user.to_dict()
+        if not self._check_password(user_data, password):
+            self.log_service.log_event("login_fail", "Mot de passe incorrect", username)
+            return None, {"message": "Mot de passe incorrect"}, 401
+
+        mongo_user_id = self.user_repository.sync_user_to_mongo(username)
+        self.log_service.log_event("login_success", f"{username} s'est connecté avec succès", username)
+        return self._login_response(user_data, mongo_user_id), None, 200
 
     def google_login(self, email, uid, custom_token):
-        user_doc = self.user_repository.users_collection.document(email).get()
+        user_doc = self.user_repository.get_user_document(email)
         if not user_doc.exists:
             user_data = {
                 "custom_token": custom_token,
@@ -57,11 +70,13 @@ class UserService:
                 "gender": "",
                 "created_at": firestore.SERVER_TIMESTAMP
             }
-            self.user_repository.users_collection.document(email).set(user_data)
+            self.user_repository.set_user_document(email, user_data)
         else:
             user_data = user_doc.to_dict()
 
         mongo_user_id = self.user_repository.sync_user_to_mongo(email)
+        if not user_doc.exists:
+            self._mirror_profile(email, user_data)
         role = user_data.get("role", "student")
         needs_profile_completion = not all([
             user_data.get("password", ""),
@@ -93,7 +108,7 @@ class UserService:
             self.log_service.log_event("update_user_info_fail", "Email requis")
             return {"message": "Email requis"}, 400
 
-        user_doc = self.user_repository.users_collection.document(email).get()
+        user_doc = self.user_repository.get_user_document(email)
         if not user_doc.exists:
             self.log_service.log_event("update_user_info_fail", "Utilisateur non trouvé", email)
             return {"message": "Utilisateur non trouvé"}, 404
@@ -107,8 +122,9 @@ class UserService:
             "semester": data.get("semester", ""),
             "gender": data.get("gender", "")
         }
-        self.user_repository.update_user(email, update_data)
+        self.user_repository.update_user(email, update_data, pseudonym=user_doc.to_dict().get("pseudonym"))
         self.user_repository.update_mongo_user_pseudonym(email, data.get("pseudonym", ""))
+        self._mirror_profile(data.get("pseudonym", ""), {**user_doc.to_dict(), **update_data})
         self.log_service.log_event("update_user_info", f"Profil mis à jour pour {email}", email)
         return {"message": "Profil mis à jour"}, 200
 
@@ -117,7 +133,7 @@ class UserService:
             self.log_service.log_event("change_password_fail", "Champs manquants", username)
             return {"message": "Champs manquants"}, 400
 
-        user = self.user_repository.find_user_by_pseudonym(username)
+        user = self.user_repository.find_user_by_pseudonym(username, allow_stale=False)
         if not user:
             self.log_service.log_event("change_password_fail", "Utilisateur non trouvé", username)
             return {"message": "Utilisateur non trouvé"}, 404
@@ -132,7 +148,8 @@ class UserService:
             return {"message": "Mot de passe actuel incorrect"}, 401
 
         hashed_new_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        self.user_repository.users_collection.document(user.id).update({"password": hashed_new_password})
+        self.user_repository.update_user(user.id, {"password": hashed_new_password},
+                                         pseudonym=user_data.get("pseudonym"))
         self.log_service.log_event("change_password_success", f"Mot de passe modifié pour {username}", username)
         return {"message": "Mot de passe modifié avec succès"}, 200
 
@@ -186,32 +203,20 @@ class UserService:
 
         self.user_repository.add_user_to_firestore(transaction, pseudonym, user_data)
         mongo_user_id = self.user_repository.sync_user_to_mongo(pseudonym)
+        self._mirror_profile(pseudonym, user_data)
         self.log_service.log_event("add_user", f"Ajout utilisateur {pseudonym}", pseudonym)
         return {"message": "Utilisateur ajouté", "pseudonym": pseudonym}, 200
 
-    def delete_user(self, username):
-        if self.user_repository.delete_user(username):
-            self.log_service.log_event("delete_user", f"Utilisateur supprimé : {username}", username)
-            return {"message": "Utilisateur supprimé"}, 200
-        else:
-            self.log_service.log_event("delete_user_fail", f"Utilisateur non trouvé : {username}", username)
-            return {"message": "Utilisateur non trouvé"}, 404
-
     def get_students_with_activities(self, activity_repository):
-        users = self.user_repository.get_students()
+        users = [user for user in self.user_repository.get_students() if user["mongo_user_id"]]
+        # One query for every student instead of one per student
+        activities = activity_repository.get_activities_by_users([user["mongo_user_id"] for user in users])
         result = []
 
         for user in users:
             username = user.get("pseudonym")
-            mongo_user = self.user_repository.find_mongo_user_by_pseudonym(username)
-            if not mongo_user:
-                continue
-            mongo_user_id = mongo_user["_id"]
-
-            all_activities = []
-
-            activities = activity_repository.get_activities_by_user(mongo_user_id)
-            all_activities.extend(activities)
+            mongo_user_id = user["mongo_user_id"]
+            all_activities = activities.get(mongo_user_id, [])
 
             result.append({
                 "pseudonym": username,
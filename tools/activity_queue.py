@@ -0,0 +1,42 @@
+import argparse
+import json
+
+from config import Config
+from container import ServiceContainer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and drain the local /log_activity queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Pending and dead entries with the age of the oldest")
+    dead = subparsers.add_parser("dead", help="List entries rejected by ActivityService")
+    dead.add_argument("--limit", type=int, default=100)
+    subparsers.add_parser("requeue-dead", help="Retry rejected entries (e.g. after creating a missing category)")
+    subparsers.add_parser("drain", help="Store every ready entry now, in this process")
+
+    args = parser.parse_args()
+    container = ServiceContainer(Config.from_env().to_dict())
+    queue = container.activity_queue_repository
+
+    if args.command == "stats":
+        print(json.dumps(queue.stats()))
+    elif args.command == "dead":
+        for entry in queue.get_dead(args.limit):
+            print(json.dumps(entry, ensure_ascii=False))
+    elif args.command == "requeue-dead":
+        print(json.dumps({"requeued": queue.requeue_dead()}))
+    else:
+        ingest_service = container.activity_ingest_service
+        drained = 0
+        while True:
+            count = ingest_service.drain_once()
+            drained += count
+            if count < ingest_service.batch_size:
+                break
+        print(json.dumps({"processed": drained, "remaining": queue.stats()}))
+
+
+# Usage: python -m tools.activity_queue stats
+#        python -m tools.activity_queue drain
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+import json
+
+from config import Config
+from container import ServiceContainer
+
+ROUTED_COLLECTIONS = {
+    "user_repository": lambda c: c.user_repository.analytics_mongo_users_collection,
+    "activity_repository": lambda c: c.activity_repository.analytics_collections[0],
+    "log_repository": lambda c: c.log_repository.analytics_logs_collection,
+}
+
+
+# Reports which replica set member answers each repository's admin reads, next to the primary.
+# Run it against the replica set from docker-compose.replicaset.yml.
+def main():
+    container = ServiceContainer(Config.from_env().to_dict())
+    db = container.mongo_db
+    report = {"primary": db.command("hello")["me"]}
+    for repository, collection_of in ROUTED_COLLECTIONS.items():
+        collection = collection_of(container)
+        report[repository] = {
+            "read_preference": collection.read_preference.document,
+            "served_by": db.command("hello", read_preference=collection.read_preference)["me"],
+        }
+    print(json.dumps(report, indent=2))
+
+
+# Usage: python -m tools.check_read_routing
+if __name__ == '__main__':
+    main()
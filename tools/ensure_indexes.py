@@ -0,0 +1,8 @@
+from config import Config
+from container import ServiceContainer
+
+# Usage: python -m tools.ensure_indexes  (idempotent, run on every deploy)
+if __name__ == '__main__':
+    container = ServiceContainer(Config.from_env().to_dict())
+    container.ensure_indexes()
+    print("Index creation done")
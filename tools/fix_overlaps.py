@@ -0,0 +1,37 @@
+import argparse
+
+from bson import ObjectId
+
+from config import Config
+from container import ServiceContainer
+from json_provider import dumps_bytes
+from services.activity_overlap import FLAG, MERGE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and clean up overlapping activities of each user")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("report", help="Count users and activities involved in overlaps")
+
+    fix = subparsers.add_parser("fix", help="Merge or flag overlapping activities (classic storage only)")
+    fix.add_argument("--action", choices=(MERGE, FLAG), default=MERGE)
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("--user", action="append", help="Mongo user id (repeatable); default: all users")
+
+    args = parser.parse_args()
+    container = ServiceContainer(Config.from_env().to_dict())
+    user_ids = [ObjectId(user_id) for user_id in args.user] if args.user else None
+
+    if args.command == "report":
+        summary = container.activity_service.resolve_overlaps(MERGE, user_ids, dry_run=True)
+    else:
+        summary = container.activity_service.resolve_overlaps(args.action, user_ids)
+    print(dumps_bytes(summary).decode("utf-8"))
+
+
+# Usage: python -m tools.fix_overlaps report
+#        python -m tools.fix_overlaps fix --action merge [--user <id>]
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import json
+from datetime import datetime
+
+from config import Config
+from container import ServiceContainer
+from services.log_retention_service import LogRetentionService
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive expired logs and query the archives")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("archive", help="Move logs older than LOG_RETENTION_DAYS to compressed NDJSON files")
+
+    query = subparsers.add_parser("query", help="Search archived logs")
+    query.add_argument("--start", type=_parse_datetime, help="ISO date/datetime, UTC")
+    query.add_argument("--end", type=_parse_datetime, help="ISO date/datetime, UTC")
+    query.add_argument("--event-type")
+    query.add_argument("--user")
+    query.add_argument("--contains", help="Case-insensitive substring of the message")
+    query.add_argument("--limit", type=int, default=0)
+
+    args = parser.parse_args()
+    config = Config.from_env().to_dict()
+
+    if args.command == "archive":
+        container = ServiceContainer(config)
+        print(json.dumps(container.log_retention_service.archive_expired()))
+        return
+
+    # Reading archives never touches Mongo
+    retention_service = LogRetentionService(None, config["LOG_ARCHIVE_DIR"], config["LOG_RETENTION_DAYS"])
+    for count, log in enumerate(retention_service.query_archives(
+            start=args.start, end=args.end, event_type=args.event_type,
+            user=args.user, contains=args.contains), start=1):
+        print(json.dumps(log, ensure_ascii=False))
+        if args.limit and count >= args.limit:
+            break
+
+
+# Usage: python -m tools.log_archive archive
+#        python -m tools.log_archive query --event-type login_fail --start 2025-01-01
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import time
+
+from pymongo import ASCENDING
+
+from config import Config
+from container import ServiceContainer
+from repositories.activity_repository import ActivityRepository, DUAL, to_timeseries_doc
+
+MIGRATION_ID = "activities_timeseries"
+
+
+def migrate(mongo_db, batch_size, delete_source):
+    repository = ActivityRepository(mongo_db, storage_mode=DUAL)
+    repository.ensure_indexes()
+    migrations = mongo_db["migrations"]
+
+    # Time-series collections do not enforce unique _id, so progress is checkpointed
+    # after every batch, a rerun resumes after the last copied _id, and each batch skips
+    # the activities a crashed run copied before its checkpoint
+    state = migrations.find_one({"_id": MIGRATION_ID}) or {}
+    query = {"_id": {"$gt": state["last_id"]}} if state.get("last_id") else {}
+
+    copied = 0
+    started = time.perf_counter()
+    batch = []
+    for activity in repository.activities_collection.find(query).sort("_id", ASCENDING).batch_size(batch_size):
+        batch.append(activity)
+        if len(batch) >= batch_size:
+            copied += _copy_batch(repository, migrations, batch, delete_source)
+            batch = []
+    if batch:
+        copied += _copy_batch(repository, migrations, batch, delete_source)
+
+    return {"copied": copied, "seconds": round(time.perf_counter() - started, 1)}
+
+
+# _ids of the batch already in the time-series collection: a crash between insert_many and the
+# checkpoint leaves the whole batch copied. The user and time bounds let the lookup use the
+# (meta.user_id, start_time) index.
+def _already_copied(repository, batch):
+    start_times = [a["start_time"] for a in batch if a.get("start_time")]
+    query = {"_id": {"$in": [a["_id"] for a in batch]},
+             "meta.user_id": {"$in": list({a.get("user_id") for a in batch})}}
+    if len(start_times) == len(batch):
+        query["start_time"] = {"$gte": min(start_times), "$lte": max(start_times)}
+    return {doc["_id"] for doc in repository.timeseries_collection.find(query, {"_id": 1})}
+
+
+def _copy_batch(repository, migrations, batch, delete_source):
+    copied_ids = _already_copied(repository, batch)
+    documents = [to_timeseries_doc(a) for a in batch if a["_id"] not in copied_ids]
+    if documents:
+        repository.timeseries_collection.insert_many(documents, ordered=False)
+    migrations.update_one({"_id": MIGRATION_ID}, {"$set": {"last_id": batch[-1]["_id"]}}, upsert=True)
+    if delete_source:
+        repository.activities_collection.delete_many({"_id": {"$in": [a["_id"] for a in batch]}})
+    return len(batch)
+
+
+# Usage: set ACTIVITY_STORAGE_MODE=dual, deploy, then
+#        python -m tools.migrate_activities_timeseries [--delete-source]
+#        and switch to ACTIVITY_STORAGE_MODE=timeseries once it reports nothing left to copy.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Copy activities into the time-series collection")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--delete-source", action="store_true",
+                        help="Remove each batch from `activities` once it is copied")
+    args = parser.parse_args()
+
+    container = ServiceContainer(Config.from_env().to_dict())
+    print(migrate(container.mongo_db, args.batch_size, args.delete_source))
@@ -0,0 +1,62 @@
+import argparse
+import time
+
+from pymongo import ASCENDING, ReplaceOne
+
+from config import Config
+from container import ServiceContainer
+from models.compact import MIXED
+from repositories.activity_repository import COMPACT_ACTIVITY_FIELDS, ActivityRepository
+from repositories.dictionary_repository import DictionaryRepository
+from repositories.questionnaire_repository import COMPACT_RESPONSE_SCHEMA, QuestionnaireRepository
+
+
+def migrate(mongo_db, batch_size, reverse):
+    dictionary_repository = DictionaryRepository(mongo_db)
+    dictionary_repository.ensure_indexes()
+    activity_repository = ActivityRepository(mongo_db, encoding=MIXED, dictionary_repository=dictionary_repository)
+    activity_repository.ensure_indexes()
+    questionnaire_repository = QuestionnaireRepository(mongo_db, response_encoding=MIXED)
+    questionnaire_repository.ensure_indexes()
+
+    started = time.perf_counter()
+    # Each layout is recognised by its time field: a rerun only picks up what is left to rewrite
+    rewritten = {
+        "activities": _rewrite(activity_repository.activities_collection, activity_repository.compact_schema,
+                               "start_time", COMPACT_ACTIVITY_FIELDS["start_time"], batch_size, reverse),
+        "questionnaire_responses": _rewrite(questionnaire_repository.questionnaire_responses_collection,
+                                            COMPACT_RESPONSE_SCHEMA, "completed_at",
+                                            COMPACT_RESPONSE_SCHEMA.fields["completed_at"], batch_size, reverse),
+    }
+    return {"rewritten": rewritten, "seconds": round(time.perf_counter() - started, 1)}
+
+
+def _rewrite(collection, schema, full_marker, compact_marker, batch_size, reverse):
+    source_marker = compact_marker if reverse else full_marker
+    convert = schema.decode_document if reverse else schema.encode_document
+    rewritten = 0
+    batch = []
+    cursor = collection.find({source_marker: {"$exists": True}}).sort("_id", ASCENDING).batch_size(batch_size)
+    for doc in cursor:
+        # Only replaced while still in the source layout (a concurrent write may have won)
+        batch.append(ReplaceOne({"_id": doc["_id"], source_marker: {"$exists": True}}, convert(doc)))
+        if len(batch) >= batch_size:
+            rewritten += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        rewritten += collection.bulk_write(batch, ordered=False).modified_count
+    return rewritten
+
+
+# Usage: set DOCUMENT_ENCODING=mixed, deploy, then
+#        python -m tools.migrate_compact
+#        and switch to DOCUMENT_ENCODING=compact once it reports nothing left to rewrite.
+#        --reverse expands documents back to the full layout (run it under mixed too).
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rewrite activities and responses in the compact layout")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--reverse", action="store_true", help="Rewrite compact documents in the full layout")
+    args = parser.parse_args()
+
+    container = ServiceContainer(Config.from_env().to_dict())
+    print(migrate(container.mongo_db, args.batch_size, args.reverse))
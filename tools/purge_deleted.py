@@ -0,0 +1,32 @@
+import argparse
+import json
+
+from config import Config
+from container import ServiceContainer
+from json_provider import dumps_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run cascading delete jobs and sweep orphaned documents")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("run", help="Process pending (or stalled) deletion jobs until none is left")
+
+    sweep = subparsers.add_parser("sweep", help="Find documents whose user or questionnaire no longer exists")
+    sweep.add_argument("--dry-run", action="store_true", help="Only report orphans, do not schedule purges")
+
+    args = parser.parse_args()
+    container = ServiceContainer(Config.from_env().to_dict())
+    deletion_service = container.deletion_service
+
+    if args.command == "sweep":
+        print(dumps_bytes(deletion_service.sweep_orphans(dry_run=args.dry_run)).decode("utf-8"))
+        if args.dry_run:
+            return
+    print(json.dumps({"processed_jobs": deletion_service.run_pending()}))
+
+
+# Usage: python -m tools.purge_deleted run
+#        python -m tools.purge_deleted sweep --dry-run
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import json
+
+from config import Config
+from container import ServiceContainer
+
+
+# Replays every stored response into the score ledger. Safe to re-run: the ledger keeps one
+# entry per (user, questionnaire) and totals only move by the difference.
+def main():
+    container = ServiceContainer(Config.from_env().to_dict())
+    questionnaire_repository = container.questionnaire_repository
+    question_repository = container.question_repository
+    score_service = container.score_service
+
+    questionnaires, points = {}, {}
+    replayed = skipped = 0
+    # _id order is submission order, in either document encoding
+    for response in questionnaire_repository.iter_responses({"questionnaire_id": 1, "user_id": 1, "responses": 1}):
+        questionnaire_id = response["questionnaire_id"]
+        if questionnaire_id not in questionnaires:
+            questionnaires[questionnaire_id] = questionnaire_repository.get_questionnaire_by_id(questionnaire_id)
+            points[questionnaire_id] = {q["_id"]: q["points"]
+                                        for q in question_repository.get_questions_by_questionnaire(questionnaire_id)}
+        questionnaire = questionnaires[questionnaire_id]
+        if questionnaire is None:
+            skipped += 1
+            continue
+        score, max_score = score_service.score_submission(response.get("responses", []), points[questionnaire_id])
+        score_service.record_submission(response["user_id"], questionnaire, score, max_score)
+        replayed += 1
+    print(json.dumps({"replayed": replayed, "skipped_missing_questionnaire": skipped}))
+
+
+# Usage: python -m tools.rebuild_scores
+if __name__ == '__main__':
+    main()
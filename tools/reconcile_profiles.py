@@ -0,0 +1,18 @@
+import argparse
+import json
+
+from config import Config
+from container import ServiceContainer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff Firestore profiles against their users_objects mirror and repair it")
+    parser.add_argument("--dry-run", action="store_true", help="Only count missing, outdated and orphaned profiles")
+    args = parser.parse_args()
+    container = ServiceContainer(Config.from_env().to_dict())
+    print(json.dumps(container.profile_mirror_service.reconcile(dry_run=args.dry_run)))
+
+
+# Usage: python -m tools.reconcile_profiles [--dry-run]
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import contextvars
+from collections import OrderedDict
+from functools import wraps
+
+from bson import ObjectId
+from flask import current_app
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+# Routes whose writes are coalesced (see init_unit_of_work)
+DEFAULT_UNIT_OF_WORK_ROUTES = ("/log_activity", "/submit_questionnaire_response", "/create_questionnaire")
+# Topologies that support multi-document transactions
+TRANSACTION_TOPOLOGIES = ("ReplicaSetWithPrimary", "Sharded")
+
+_current = contextvars.ContextVar("unit_of_work", default=None)
+
+
+def current():
+    return _current.get()
+
+
+# Writes made while a unit of work is active are queued per collection and sent on exit as one
+# bulk_write per collection, in a transaction when the deployment supports it. Nothing is written
+# if the block raises. Queued inserts get their _id up front, so callers still get it back at once.
+# Collections queued with transactional=False (time-series collections, which MongoDB refuses in
+# multi-document transactions) are written after the transaction commits. Without a transaction,
+# or if a later bulk_write fails, some collections can end up written and others not.
+class UnitOfWork:
+    def __init__(self, client=None, transactions=True, metrics=None):
+        self.client = client
+        self.transactions = transactions
+        self.metrics = metrics
+        # collection full name -> (collection, [operations], transactional), in first-write order
+        self._writes = OrderedDict()
+        self._after_flush = []
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def add(self, collection, operation, transactional=True):
+        self._writes.setdefault(collection.full_name, (collection, [], transactional))[1].append(operation)
+
+    def insert(self, collection, document, transactional=True):
+        document.setdefault("_id", ObjectId())
+        self.add(collection, InsertOne(document), transactional=transactional)
+        return document["_id"]
+
+    def update(self, collection, filter, update, upsert=False):
+        self.add(collection, UpdateOne(filter, update, upsert=upsert))
+
+    # Caches and indexes reading the written documents back must wait for them to be stored
+    def after_flush(self, callback):
+        self._after_flush.append(callback)
+
+    def _use_transaction(self):
+        if not self.transactions or self.client is None:
+            return False
+        if sum(len(operations) for _, operations, transactional in self._writes.values() if transactional) < 2:
+            return False
+        topology = getattr(self.client, "topology_description", None)
+        return topology is not None and topology.topology_type_name in TRANSACTION_TOPOLOGIES
+
+    def _write(self, session=None, transactional=None):
+        for collection, operations, in_transaction in self._writes.values():
+            if transactional is None or in_transaction == transactional:
+                collection.bulk_write(operations, ordered=True, session=session)
+
+    def flush(self):
+        if self._writes:
+            if self._use_transaction():
+                with self.client.start_session() as session:
+                    session.with_transaction(lambda session: self._write(session, transactional=True))
+                self._write(transactional=False)
+            else:
+                self._write()
+            if self.metrics is not None:
+                self.metrics.inc("unit_of_work_round_trips_total", value=len(self._writes))
+                self.metrics.inc("unit_of_work_writes_total",
+                                 value=sum(len(operations) for _, operations, _ in self._writes.values()))
+            self._writes.clear()
+        # Run outside the unit of work: whatever they write goes out directly
+        callbacks, self._after_flush = self._after_flush, []
+        for callback in callbacks:
+            callback()
+
+
+# Repository helpers: queue the write in the active unit of work, or write at once without one
+
+def insert(collection, document, transactional=True):
+    unit_of_work = current()
+    if unit_of_work is None:
+        return collection.insert_one(document).inserted_id
+    return unit_of_work.insert(collection, document, transactional=transactional)
+
+
+def update(collection, filter, update, upsert=False):
+    unit_of_work = current()
+    if unit_of_work is None:
+        collection.update_one(filter, update, upsert=upsert)
+    else:
+        unit_of_work.update(collection, filter, update, upsert=upsert)
+
+
+def delete(collection, filter):
+    unit_of_work = current()
+    if unit_of_work is None:
+        collection.delete_many(filter)
+    else:
+        unit_of_work.add(collection, DeleteMany(filter))
+
+
+# Several operations on one collection: one bulk_write now, or queued in order
+def bulk_write(collection, operations):
+    unit_of_work = current()
+    if unit_of_work is None:
+        collection.bulk_write(operations, ordered=True)
+    else:
+        for operation in operations:
+            unit_of_work.add(collection, operation)
+
+
+def after_write(callback):
+    unit_of_work = current()
+    if unit_of_work is None:
+        callback()
+    else:
+        unit_of_work.after_flush(callback)
+
+
+def _coalescing(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        with current_app.extensions["container"].unit_of_work():
+            return view(*args, **kwargs)
+    return wrapped
+
+
+# Flushes inside the view, so a failed flush still goes through the API error handlers (503...)
+def init_unit_of_work(app):
+    if not app.config["UNIT_OF_WORK_ENABLED"]:
+        return
+    routes = set(app.config["UNIT_OF_WORK_ROUTES"])
+    for rule in app.url_map.iter_rules():
+        if rule.rule in routes:
+            app.view_functions[rule.endpoint] = _coalescing(app.view_functions[rule.endpoint])
+    metrics = app.extensions["container"].metrics
+    metrics.describe("unit_of_work_round_trips_total", "bulk_write calls sent by request units of work")
+    metrics.describe("unit_of_work_writes_total", "Write operations coalesced into those calls")
@@ -0,0 +1,4 @@
+from app import create_app
+
+# Building the app does not connect to Mongo or Firestore; each worker opens its own clients on first use
+app = create_app()